@@ -11,6 +11,8 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import config
+from app.core.blob_store import storage_stats
+from app.api.documents import get_formatted_size
 from app.models.user import User
 from app.schemas.user import UserCreate, UserRead
 from app.db.async_db import get_async_db
@@ -25,8 +27,10 @@ router = APIRouter()
 
 @router.get("/admin/sysinfo", response_class=JSONResponse)
 async def get_system_info(
-    admin: User = Depends(current_active_superuser)
+    admin: User = Depends(current_active_superuser),
+    db: AsyncSession = Depends(get_async_db),
 ):
+    storage = await storage_stats(db)
     return {
         "Python": platform.python_version(),
         "Node": platform.node(),
@@ -35,6 +39,9 @@ async def get_system_info(
         "CPU": platform.processor(),
         "OS Name": platform.platform(),
         "OS Version": platform.version(),
+        "Documents": f"{storage['documents']} files, {get_formatted_size(storage['logical_bytes'])}",
+        "Document Storage": f"{storage['blobs']} unique blobs, {get_formatted_size(storage['stored_bytes'])}",
+        "Dedup Savings": f"{get_formatted_size(storage['saved_bytes'])} ({storage['saved_ratio']:.1%})",
     }
 
 @router.get("/admin/appconfig", response_class=JSONResponse)
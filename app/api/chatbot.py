@@ -1,28 +1,57 @@
+import json
+import time
 import asyncio
-from typing import Dict
-from fastapi import APIRouter, HTTPException, Depends
+from contextlib import aclosing
+from typing import Awaitable, Callable, Optional, Union
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi import WebSocket, WebSocketDisconnect, status
 from fastapi.responses import StreamingResponse
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.chat_history import InMemoryChatMessageHistory
+from pydantic import ValidationError
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_core.runnables.history import RunnableWithMessageHistory
 
-from app.core.users import current_active_user
+from app.core.users import current_active_user, current_active_superuser, current_websocket_user
+from app.core.config import config as app_config
+from app.core.chain_cache import chain_cache, prompt_hash
+from app.core.chat_history import history_summarizer, window_history
+from app.core.chat_sessions import chat_session_registry, chat_session_store
+from app.core.chat_stream import (
+    StreamFlushPolicy, coalesce_chunks, fan_out, format_sse_event,
+    stream_counters, stream_until_disconnect,
+)
 from app.core.llm_cache import LlmProvider, llm_cache
+from app.core.llm_failover import failover_router
+from app.core.llm_telemetry import RequestTrace, llm_telemetry
+from app.core.stream_resume import Generation, ReplayGapError, format_event_id, stream_resume
+from app.core.llm_scheduler import (
+    LlmQueueFullError, LlmQueueTimeoutError, LlmSlot, llm_scheduler,
+)
+from app.core.response_cache import ask_response_cache, make_cache_key
 from app.models.user import User
 from app.schemas.chatbot import (
-    ChatRequest, ChatResponse,
-    HistoryResponse
+    ChatRequest, ChatResponse, ChatSocketFrame,
+    HistoryResponse, MultiAskRequest, BatchAskRequest
 )
 
 
 router = APIRouter()
-chat_sessions: Dict[str, InMemoryChatMessageHistory] = {}
+MAX_FAN_OUT_MODELS = 8
+ASK_STREAM_FLUSH = StreamFlushPolicy(
+    max_bytes=app_config.ask_stream_flush_bytes,
+    max_delay_ms=app_config.ask_stream_flush_ms,
+)
+CHAT_STREAM_FLUSH = StreamFlushPolicy(
+    max_bytes=app_config.chat_stream_flush_bytes,
+    max_delay_ms=app_config.chat_stream_flush_ms,
+)
 
 
 def get_llm_instance(llm_id: int) -> LlmProvider:
-    """Get LLM instance from cache by ID"""
-    llm = llm_cache.get_llm_instance(llm_id)
+    """Get LLM instance from cache by ID, a failover group for group primaries"""
+    llm = failover_router.get_llm_instance(llm_id)
     if llm is None:
         # Check if the LLM config exists but is inactive
         llm_config = llm_cache.get_llm_config(llm_id)
@@ -34,40 +63,55 @@ def get_llm_instance(llm_id: int) -> LlmProvider:
             raise HTTPException(500, f"LLM '{llm_config.title}' (id={llm_id}) failed to initialize")
     return llm
 
+async def acquire_llm_slot(llm_id: int, user: User) -> LlmSlot:
+    """Wait for a free slot on the LLM, fair across users"""
+    try:
+        return await llm_scheduler.acquire(llm_id, str(user.id))
+    except LlmQueueFullError as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": str(e.retry_after)})
+    except LlmQueueTimeoutError as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": str(e.retry_after)})
+
 def create_user_chat_session(user: User) -> str:
     username = user.email.split("@")[0]
-    last_id = 0
-    for session_id in chat_sessions:
-        if session_id.startswith(username):
-            last_id = max(last_id, int(session_id.split("_")[-1]))
-    
-    session_id = f"{username}_{last_id + 1:02d}"
-    chat_sessions[session_id] = InMemoryChatMessageHistory()
-    return session_id
+    return chat_session_registry.create_session(str(user.id), username)
 
 def get_user_chat_sessions(user: User) -> list[str]:
-    username = user.email.split("@")[0]
-    user_sessions = [session_id for session_id in chat_sessions if session_id.startswith(username)]
+    user_sessions = chat_session_registry.user_sessions(str(user.id))
     if not user_sessions:  # create a default session
         session_id = create_user_chat_session(user)
         user_sessions.append(session_id)
     return user_sessions
 
-def get_session_history(session_id: str) -> InMemoryChatMessageHistory:
-    if session_id not in chat_sessions:
-        chat_sessions[session_id] = InMemoryChatMessageHistory()
-    return chat_sessions[session_id]
+def check_session_owner(session_id: str, user: User):
+    """Sessions created for another user are reported as missing, unowned ones like "default" stay shared"""
+    owner = chat_session_registry.owner(session_id)
+    if owner is not None and owner != str(user.id):
+        raise HTTPException(status_code=404, detail="Session not found")
 
-def create_chain(request: ChatRequest):
-    """Create a conversational chain with history"""
-    llm = get_llm_instance(request.llm_id)
+def session_summaries(session_ids: list[str]) -> list[dict]:
+    return [
+        {
+            "session_id": session_id,
+            "message_count": chat_session_store.message_count(session_id)
+        }
+        for session_id in session_ids
+    ]
+
+def get_session_history(session_id: str) -> BaseChatMessageHistory:
+    return chat_session_store.get_or_create(session_id)
+
+def build_chain(llm: LlmProvider, system_prompt: str, max_tokens: int):
+    """Compile the conversational chain with history"""
     prompt = ChatPromptTemplate.from_messages([
-        ("system", request.system_prompt),
+        ("system", system_prompt),
         MessagesPlaceholder(variable_name="history"),
         ("human", "{input}")
     ])
-    
-    chain = prompt | llm   
+
+    # only the most recent turns within the token budget are sent to the LLM
+    window = RunnablePassthrough.assign(history=lambda x: window_history(x["history"], max_tokens))
+    chain = window | prompt | llm
     chain_with_history = RunnableWithMessageHistory(
         chain,
         get_session_history,
@@ -76,47 +120,389 @@ def create_chain(request: ChatRequest):
     )
     return chain_with_history
 
-def generate_prompt(request: ChatRequest):
+def create_chain(request: ChatRequest):
+    """Get the cached conversational chain for the LLM and system prompt"""
+    llm = get_llm_instance(request.llm_id)
+    max_tokens = request.history_max_tokens
+    if max_tokens is None:
+        max_tokens = app_config.chat_history_max_tokens
+    if request.session_id:
+        history_summarizer.maybe_schedule(
+            request.session_id, get_session_history(request.session_id), llm, request.llm_id)
+
+    key = (request.llm_id, prompt_hash(request.system_prompt), max_tokens)
+    return chain_cache.get_or_build(
+        key, llm, lambda: build_chain(llm, request.system_prompt, max_tokens))
+
+def ask_cache_key(request: ChatRequest, llm: LlmProvider) -> Optional[str]:
+    """Cache key of a stateless ask, None when the reply must not be cached"""
+    if not app_config.ask_cache_enable or request.use_cache is False:
+        return None
+    llm_config = llm_cache.get_llm_config(request.llm_id)
+    temperature = llm_config.temperature if llm_config else getattr(llm, "temperature", None)
+    if not request.use_cache and temperature != 0:
+        return None
+    # editing the LLM config bumps updated_at, so old replies are never served for it
+    version = str(llm_config.updated_at) if llm_config else ""
+    return make_cache_key(request.llm_id, version, request.system_prompt, request.message, temperature)
+
+def generate_prompt(request: Union[ChatRequest, MultiAskRequest]):
     return [
         SystemMessage(content=request.system_prompt),
         HumanMessage(content=request.message),
     ]
 
-async def chat_stream_callback(llm: LlmProvider, prompt, config=None, event_stream=False):
-    async for chunk in llm.astream(prompt, config):
-        if chunk.content:
-            if event_stream:
-                yield f"data: {chunk.content}\n\n"
+def start_trace(llm_id: int, user: User) -> RequestTrace:
+    return llm_telemetry.start(llm_id, user.email)
+
+async def traced_ainvoke(llm: LlmProvider, prompt, trace: RequestTrace, config=None):
+    """Invoke the LLM or chain and record the call in the per model telemetry"""
+    status = "cancelled"
+    try:
+        resp = await llm.ainvoke(prompt, config)
+        trace.on_message(resp)
+        status = "completed"
+        return resp
+    except Exception:
+        status = "failed"
+        raise
+    finally:
+        trace.finish(status)
+
+async def llm_text_chunks(llm: LlmProvider, prompt, config=None, trace: Optional[RequestTrace] = None):
+    status = "cancelled"
+    try:
+        async for chunk in llm.astream(prompt, config):
+            if trace is not None:
+                trace.on_usage(getattr(chunk, "usage_metadata", None))
+            if chunk.content:
+                if trace is not None:
+                    trace.on_chunk()
+                yield chunk.content
+        status = "completed"
+    except Exception:
+        status = "failed"
+        raise
+    finally:
+        if trace is not None:
+            trace.finish(status)
+
+async def record_partial_reply(chunks, session_id: str, message: str):
+    """Keep the session history consistent when a streamed chat turn is cut short"""
+    parts = []
+    finish_reason = "cancelled"
+    try:
+        async for text in chunks:
+            parts.append(text)
+            yield text
+        finish_reason = None
+    except Exception:
+        finish_reason = "error"
+        raise
+    finally:
+        # RunnableWithMessageHistory only saves the turn when the stream completes
+        if finish_reason is not None:
+            get_session_history(session_id).add_messages([
+                HumanMessage(content=message),
+                AIMessage(content="".join(parts), response_metadata={"finish_reason": finish_reason}),
+            ])
+
+async def release_slot_after(chunks, slot: LlmSlot):
+    try:
+        async for text in chunks:
+            yield text
+    finally:
+        slot.release()
+
+def chat_text_chunks(llm: LlmProvider, prompt, config=None,
+                     flush_policy: StreamFlushPolicy = CHAT_STREAM_FLUSH,
+                     session_id: Optional[str] = None,
+                     slot: Optional[LlmSlot] = None,
+                     trace: Optional[RequestTrace] = None):
+    """The coalesced reply text of a streamed LLM or chain call"""
+    chunks = llm_text_chunks(llm, prompt, config, trace)
+    if session_id:
+        chunks = record_partial_reply(chunks, session_id, prompt["input"])
+    chunks = coalesce_chunks(chunks, flush_policy)
+    if slot is not None:
+        chunks = release_slot_after(chunks, slot)
+    return chunks
+
+async def chat_stream_callback(llm: LlmProvider, prompt, config=None, event_stream=False,
+                               flush_policy: StreamFlushPolicy = CHAT_STREAM_FLUSH,
+                               http_request: Optional[Request] = None,
+                               session_id: Optional[str] = None,
+                               slot: Optional[LlmSlot] = None,
+                               trace: Optional[RequestTrace] = None):
+    chunks = chat_text_chunks(llm, prompt, config, flush_policy, session_id, slot, trace)
+    if http_request is not None:
+        chunks = stream_until_disconnect(http_request, chunks)
+    async for text in chunks:
+        if event_stream:
+            yield format_sse_event(text)
+        else:
+            yield text # plain fetch-stream
+
+async def generation_sse_events(generation: Generation, after_seq: int):
+    async for seq, text in generation.subscribe(after_seq):
+        yield format_sse_event(text, event_id=format_event_id(generation.id, seq))
+
+def generation_stream_response(generation: Generation, after_seq: int, http_request: Request) -> StreamingResponse:
+    """Stream a generation from after_seq, a disconnect only detaches from it"""
+    return StreamingResponse(
+        stream_until_disconnect(http_request, generation_sse_events(generation, after_seq)),
+        media_type="text/event-stream",
+        headers={"X-Generation-Id": generation.id},
+    )
+
+async def fan_out_model_chunks(llm_id: int, llm: LlmProvider, prompt, user: User):
+    async with await acquire_llm_slot(llm_id, user):
+        chunks = llm_text_chunks(llm, prompt, trace=start_trace(llm_id, user))
+        async for text in coalesce_chunks(chunks, ASK_STREAM_FLUSH):
+            yield text
+
+async def fan_out_stream_callback(streams: dict, first_n: Optional[int] = None):
+    """Multiplex the model streams into server-sent events tagged by llm_id"""
+    first_chunk_ms = {}
+    finished = []
+    async for item in fan_out(streams, first_n):
+        payload = {"llm_id": item.key}
+        if item.event == "chunk":
+            first_chunk_ms.setdefault(item.key, item.elapsed_ms)
+            payload["text"] = item.text
+        else:
+            payload["latency_ms"] = round(item.elapsed_ms, 1)
+        if item.event == "done":
+            payload["ttft_ms"] = round(first_chunk_ms.get(item.key, item.elapsed_ms), 1)
+            finished.append(item.key)
+        elif item.event == "error":
+            payload["detail"] = item.text
+        yield format_sse_event(json.dumps(payload), event=item.event)
+    yield format_sse_event(json.dumps({"completed": finished}), event="end")
+
+async def batch_stream_callback(llm_id: int, llm: LlmProvider, prompts: list,
+                                user: User, max_concurrency: int):
+    """Run the prompts with bounded concurrency and yield NDJSON lines as they complete"""
+    running: set[asyncio.Task] = set()
+    closed = False
+
+    async def ask_one(prompt):
+        if closed:
+            raise asyncio.CancelledError()
+        task = asyncio.current_task()
+        running.add(task)
+        start = time.perf_counter()
+        try:
+            # every item queues for its own slot, interactive users are not starved
+            async with await acquire_llm_slot(llm_id, user):
+                resp = await traced_ainvoke(llm, prompt, start_trace(llm_id, user))
+            return resp.content, (time.perf_counter() - start) * 1000
+        finally:
+            running.discard(task)
+
+    batch = RunnableLambda(ask_one).abatch_as_completed(
+        prompts, config={"max_concurrency": max_concurrency}, return_exceptions=True)
+    try:
+        async for index, result in batch:
+            if isinstance(result, Exception):
+                item = {"index": index, "error": str(result)}
             else:
-                yield chunk.content # plain fetch-stream
-        await asyncio.sleep(0)  # allows other awaiting tasks to run
+                content, latency_ms = result
+                item = {"index": index, "response": content, "latency_ms": round(latency_ms, 1)}
+            yield json.dumps(item) + "\n"
+    finally:
+        # abatch_as_completed leaves its tasks running when the consumer goes away
+        closed = True
+        for task in list(running):
+            task.cancel()
+
+async def chat_socket_turn(send: Callable[[dict], Awaitable[None]], turn_id: str,
+                           request: ChatRequest, user: User):
+    """One chat turn over the websocket, same chain and history as chat_stream"""
+    try:
+        check_session_owner(request.session_id, user)
+        await chat_session_store.restore(request.session_id)
+        chain = create_chain(request)
+        slot = await acquire_llm_slot(request.llm_id, user)
+        prompt = {"input": request.message}
+        config = {"configurable": {"session_id": request.session_id}}
+        chunks = chat_text_chunks(chain, prompt, config, CHAT_STREAM_FLUSH, session_id=request.session_id,
+                                  slot=slot, trace=start_trace(request.llm_id, user))
+        async with aclosing(chunks):
+            async for text in chunks:
+                await send({"type": "chunk", "id": turn_id, "text": text})
+    except HTTPException as e:
+        await send({"type": "error", "id": turn_id, "status": e.status_code, "detail": e.detail})
+        return
+    except Exception as e:
+        await send({"type": "error", "id": turn_id, "status": 500, "detail": str(e)})
+        return
+    await send({"type": "done", "id": turn_id, "finish_reason": "stop"})
+
+async def serve_chat_socket(websocket: WebSocket, user: User):
+    """Read request and cancel frames, each request runs as its own task"""
+    turns: dict[str, tuple[asyncio.Task, str]] = {}  # turn id -> (task, session id)
+    send_lock = asyncio.Lock()
+
+    async def send(frame: dict):
+        async with send_lock:
+            try:
+                await websocket.send_json(frame)
+            except (WebSocketDisconnect, RuntimeError):
+                pass  # the receive loop notices the closed socket
+
+    async def reject(turn_id: Optional[str], status_code: int, detail):
+        await send({"type": "error", "id": turn_id, "status": status_code, "detail": detail})
+
+    try:
+        while True:
+            try:
+                frame = ChatSocketFrame.model_validate_json(await websocket.receive_text())
+            except ValidationError as e:
+                await reject(None, 422, e.errors(include_url=False, include_context=False))
+                continue
+
+            if frame.type == "cancel":
+                if frame.id in turns:
+                    task = turns[frame.id][0]
+                    task.cancel()
+                    await asyncio.wait((task,))
+                    if task.cancelled():
+                        await send({"type": "done", "id": frame.id, "finish_reason": "cancelled"})
+                continue
+            if frame.request is None:
+                await reject(frame.id, 422, "request frame without request")
+                continue
+            request = frame.request
+            request.session_id = request.session_id or "default"
+            if frame.id in turns:
+                await reject(frame.id, 409, f"Turn {frame.id} is still running")
+            elif any(session_id == request.session_id for _, session_id in turns.values()):
+                await reject(frame.id, 409, f"Session {request.session_id} is busy with another turn")
+            elif len(turns) >= app_config.chat_ws_max_in_flight:
+                await reject(frame.id, 429, f"At most {app_config.chat_ws_max_in_flight} turns in flight per connection")
+            else:
+                task = asyncio.create_task(chat_socket_turn(send, frame.id, request, user))
+                turns[frame.id] = (task, request.session_id)
+                task.add_done_callback(lambda _, turn_id=frame.id: turns.pop(turn_id, None))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # like a closed stream, running turns are cancelled and kept as partial replies
+        pending = [task for task, _ in turns.values()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
 
 @router.post("/ask/simple", response_model=ChatResponse)
 async def ask_simple(
     request: ChatRequest,
+    response: Response,
     user: User = Depends(current_active_user),
 ):
     llm = get_llm_instance(request.llm_id)
     prompt = generate_prompt(request)
-    resp = llm.invoke(prompt)
+
+    async def generate():
+        async with await acquire_llm_slot(request.llm_id, user):
+            resp = await traced_ainvoke(llm, prompt, start_trace(request.llm_id, user))
+        return resp.content
+
+    cache_key = ask_cache_key(request, llm)
+    if cache_key is None:
+        content = await generate()
+    else:
+        # identical concurrent asks share one upstream call
+        content, status = await ask_response_cache.get_or_compute(cache_key, request.llm_id, generate)
+        response.headers["X-Cache"] = status.upper()
     return ChatResponse(
         llm_id=request.llm_id, 
-        response=resp.content,
+        response=content,
     )
 
 @router.post("/ask/stream")
 async def ask_stream(
     request: ChatRequest,
+    http_request: Request,
     event_stream: bool = False,
     user: User = Depends(current_active_user),
 ):    
     llm = get_llm_instance(request.llm_id)
     prompt = generate_prompt(request)
+    slot = await acquire_llm_slot(request.llm_id, user)
     return StreamingResponse(
-        chat_stream_callback(llm, prompt, event_stream=event_stream),
+        chat_stream_callback(llm, prompt, event_stream=event_stream, flush_policy=ASK_STREAM_FLUSH,
+                             http_request=http_request, slot=slot,
+                             trace=start_trace(request.llm_id, user)),
         media_type= "text/event-stream" if event_stream else "text/plain",
     )
 
+@router.post("/ask/multi")
+async def ask_multi(
+    request: MultiAskRequest,
+    http_request: Request,
+    user: User = Depends(current_active_user),
+):
+    """
+    Send one message to several LLMs concurrently and stream all replies
+    
+    - **llm_ids**: The LLMs to ask, answers are streamed as they arrive
+    - **first_n**: Optional, cancel the remaining LLMs once this many answered
+    
+    Server-sent events are chunk, done, error and cancelled, each with the
+    llm_id and per model latency, followed by one end event
+    """
+    llm_ids = list(dict.fromkeys(request.llm_ids))
+    if not llm_ids or len(llm_ids) > MAX_FAN_OUT_MODELS:
+        raise HTTPException(400, f"Between 1 and {MAX_FAN_OUT_MODELS} llm_ids are required")
+    if request.first_n is not None and not 1 <= request.first_n <= len(llm_ids):
+        raise HTTPException(400, "first_n must be between 1 and the number of llm_ids")
+
+    llms = {llm_id: get_llm_instance(llm_id) for llm_id in llm_ids}
+    prompt = generate_prompt(request)
+    streams = {
+        llm_id: fan_out_model_chunks(llm_id, llm, prompt, user)
+        for llm_id, llm in llms.items()
+    }
+    return StreamingResponse(
+        stream_until_disconnect(http_request, fan_out_stream_callback(streams, request.first_n)),
+        media_type="text/event-stream",
+    )
+
+@router.post("/ask/batch")
+async def ask_batch(
+    request: BatchAskRequest,
+    http_request: Request,
+    user: User = Depends(current_active_user),
+):
+    """
+    Send many independent messages to one LLM in a single request
+    
+    - **messages**: The prompts, each one is answered without history
+    - **max_concurrency**: Optional, how many prompts run at once
+    
+    Results stream back as NDJSON lines in completion order, each with the
+    index of its message and either a response or an error
+    """
+    max_items = app_config.ask_batch_max_items
+    if not request.messages or len(request.messages) > max_items:
+        raise HTTPException(400, f"Between 1 and {max_items} messages are required")
+    max_concurrency = app_config.ask_batch_max_concurrency
+    if request.max_concurrency is not None:
+        max_concurrency = max(1, min(request.max_concurrency, max_concurrency))
+
+    llm = get_llm_instance(request.llm_id)
+    prompts = [
+        [SystemMessage(content=request.system_prompt), HumanMessage(content=message)]
+        for message in request.messages
+    ]
+    return StreamingResponse(
+        stream_until_disconnect(http_request, batch_stream_callback(
+            request.llm_id, llm, prompts, user, max_concurrency)),
+        media_type="application/x-ndjson",
+    )
+
 @router.post("/chat/simple", response_model=ChatResponse)
 async def chat_simple(
     request: ChatRequest,
@@ -130,11 +516,16 @@ async def chat_simple(
     """
     if not request.session_id: 
         request.session_id = "default"
+    check_session_owner(request.session_id, user)
+    await chat_session_store.restore(request.session_id)
     chain = create_chain(request)
-    response = chain.invoke(
-        {"input": request.message},
-        config={"configurable": {"session_id": request.session_id}}
-    )
+    async with await acquire_llm_slot(request.llm_id, user):
+        response = await traced_ainvoke(
+            chain,
+            {"input": request.message},
+            start_trace(request.llm_id, user),
+            config={"configurable": {"session_id": request.session_id}}
+        )
     history = get_session_history(request.session_id)
     message_count = len(history.messages)
     return ChatResponse(
@@ -147,7 +538,9 @@ async def chat_simple(
 @router.post("/chat/stream")
 async def chat_stream(
     request: ChatRequest,
+    http_request: Request,
     event_stream: bool = False,
+    last_event_id: Optional[str] = None,
     user: User = Depends(current_active_user),
 ):
     """
@@ -157,22 +550,64 @@ async def chat_stream(
     - **session_id**: Unique identifier for the conversation session
     - **system_prompt**: Optional custom system prompt
     - **event_stream**: Optional streaming event type
+    - **last_event_id**: Optional, or the Last-Event-ID header, resume an
+      interrupted event stream without a new LLM call
     """
     request.session_id = request.session_id or "default"
+    check_session_owner(request.session_id, user)
+    last_event_id = http_request.headers.get("last-event-id") or last_event_id
+    if event_stream and last_event_id:
+        try:
+            generation, after_seq = stream_resume.resume(request.session_id, last_event_id)
+        except (KeyError, ReplayGapError):
+            raise HTTPException(410, f"Stream {last_event_id} can no longer be resumed")
+        return generation_stream_response(generation, after_seq, http_request)
+
+    await chat_session_store.restore(request.session_id)
     chain = create_chain(request)
     prompt = {"input": request.message}
     config = {"configurable": {"session_id": request.session_id}}
+    slot = await acquire_llm_slot(request.llm_id, user)
+    trace = start_trace(request.llm_id, user)
+    if event_stream and app_config.chat_resume_enable:
+        # generated in the background so a reconnecting client can catch up
+        chunks = chat_text_chunks(chain, prompt, config, CHAT_STREAM_FLUSH,
+                                  session_id=request.session_id, slot=slot, trace=trace)
+        generation = stream_resume.start(request.session_id, chunks)
+        return generation_stream_response(generation, 0, http_request)
+
     return StreamingResponse(
-        chat_stream_callback(chain, prompt, config, event_stream),
+        chat_stream_callback(chain, prompt, config, event_stream, CHAT_STREAM_FLUSH,
+                             http_request=http_request, session_id=request.session_id, slot=slot,
+                             trace=trace),
         media_type= "text/event-stream" if event_stream else "text/plain",
     )
 
+@router.websocket("/chat/ws")
+async def chat_socket(
+    websocket: WebSocket,
+    user: Optional[User] = Depends(current_websocket_user),
+):
+    """
+    Chat over one websocket, authenticated once, several sessions at a time
+
+    - client frames: {"type": "request", "id", "request": ChatRequest} and {"type": "cancel", "id"}
+    - server frames: {"type": "chunk", "id", "text"}, {"type": "done", "id", "finish_reason"}
+      and {"type": "error", "id", "status", "detail"}
+    """
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Unauthorized")
+        return
+    await websocket.accept()
+    await serve_chat_socket(websocket, user)
+
 @router.get("/chat/history/{session_id}", response_model=HistoryResponse)
 async def get_chat_history(
     session_id: str,
     user: User = Depends(current_active_user),
 ):
-    if session_id not in chat_sessions:
+    check_session_owner(session_id, user)
+    if not await chat_session_store.restore(session_id):
         raise HTTPException(status_code=404, detail="Session not found")
 
     history = get_session_history(session_id)
@@ -193,18 +628,15 @@ async def get_chat_history(
 
 @router.get("/chat/sessions")
 async def list_all_chat_sessions(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
     user: User = Depends(current_active_user),
 ):
-    sessions = [
-        {
-            "session_id": session_id,
-            "message_count": len(history.messages)
-        }
-        for session_id, history in chat_sessions.items()
-    ]
-    
+    sessions = session_summaries(chat_session_store.session_ids(offset, limit))
     return {
-        "total_sessions": len(sessions),
+        "total_sessions": chat_session_store.session_count(),
+        "offset": offset,
+        "limit": limit,
         "sessions": sessions
     }
 
@@ -212,14 +644,7 @@ async def list_all_chat_sessions(
 async def get_chat_sessions_me(
     user: User = Depends(current_active_user),
 ):
-    sessions = [
-        {
-            "session_id": session_id,
-            "message_count": len(chat_sessions[session_id].messages)
-        }
-        for session_id in get_user_chat_sessions(user)
-    ]
-    
+    sessions = session_summaries(get_user_chat_sessions(user))
     return {
         "total_sessions": len(sessions),
         "sessions": sessions
@@ -230,25 +655,70 @@ async def create_chat_session_me(
     user: User = Depends(current_active_user),
 ):
     create_user_chat_session(user)
-    sessions = [
-        {
-            "session_id": session_id,
-            "message_count": len(chat_sessions[session_id].messages)
-        }
-        for session_id in get_user_chat_sessions(user)
-    ]
-    
+    sessions = session_summaries(get_user_chat_sessions(user))
     return {
         "total_sessions": len(sessions),
         "sessions": sessions
     }
 
+@router.get("/chat/stream/stats")
+async def get_chat_stream_stats(
+    admin: User = Depends(current_active_superuser),
+):
+    """Started, completed, failed and client-cancelled stream counters"""
+    return {
+        **stream_counters,
+        "resumable": stream_resume.stats(),
+    }
+
+@router.get("/chat/scheduler/stats")
+async def get_chat_scheduler_stats(
+    admin: User = Depends(current_active_superuser),
+):
+    """Per LLM in-flight, queue depth and queue wait statistics"""
+    return llm_scheduler.stats()
+
+@router.get("/ask/cache/stats")
+async def get_ask_cache_stats(
+    admin: User = Depends(current_active_superuser),
+):
+    """Size, hit and miss counters of the ask response cache"""
+    return ask_response_cache.stats()
+
+@router.delete("/ask/cache")
+async def purge_ask_cache(
+    llm_id: Optional[int] = None,
+    admin: User = Depends(current_active_superuser),
+):
+    count = ask_response_cache.purge(llm_id)
+    return {
+        "purged_entries": count,
+        "detail": "Ask response cache purged",
+    }
+
+@router.get("/chat/failover/stats")
+async def get_chat_failover_stats(
+    admin: User = Depends(current_active_superuser),
+):
+    """Failover groups, circuit breaker state and time to first token per LLM"""
+    return failover_router.stats()
+
+@router.get("/chat/sessions/stats")
+async def get_chat_session_stats(
+    admin: User = Depends(current_active_superuser),
+):
+    """Memory usage and eviction counters of the chat session store"""
+    return {
+        **chat_session_store.stats(),
+        "summarizer": history_summarizer.stats(),
+        "chain_cache": chain_cache.stats(),
+    }
+
 @router.delete("/chat/sessions")
 async def delete_all_chat_sessions(
     user: User = Depends(current_active_user),
 ):
-    count = len(chat_sessions)
-    chat_sessions.clear()
+    count = chat_session_store.clear()
     return { 
         "deleted_sessions": count,
         "detail": "All chat sessions deleted",
@@ -259,10 +729,11 @@ async def delete_chat_session(
     session_id: str,
     user: User = Depends(current_active_user),
 ):
-    if session_id not in chat_sessions:
+    check_session_owner(session_id, user)
+    await chat_session_store.restore(session_id)
+    if not chat_session_store.delete(session_id):
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    del chat_sessions[session_id]
+
     return { 
         "session_id": session_id, 
         "detail": "Chat session deleted" 
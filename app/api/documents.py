@@ -1,22 +1,30 @@
-import io
-import shutil
+import asyncio
 import mimetypes
-from PIL import Image
-from typing import List
+from typing import List, Literal, Optional, Tuple
 from pathlib import Path
-from datetime import datetime
-from fastapi import APIRouter, HTTPException, UploadFile, Depends, File
+from datetime import datetime, timezone
+from email.utils import formatdate
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from fastapi.responses import FileResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import config
 from app.core.users import current_active_user
+from app.core.file_response import ByteRangesFileResponse, is_not_modified
+from app.core.blob_store import acquire_blob, blob_refcount, blob_store, release_blob
+from app.core.document_index import encode_cursor, get_active_document, list_query, unique_filename
+from app.core.uploads import InvalidUploadError, UploadTooLargeError, upload_receiver
+from app.core.thumbnails import (
+    THUMBNAIL_EXTENSIONS, THUMBNAIL_MEDIA_TYPES, snap_size, thumbnail_cache,
+)
 from app.db.async_db import get_async_db
 from app.models.user import User
+from app.models.document import Document
 from app.schemas.document import (
     DocumentRequest,
     DocumentSchema, 
     RenameRequest,
+    UpdateDocumentSchema,
 )
 
 ICON_MAP = [
@@ -31,9 +39,12 @@ ICON_MAP = [
 
 router = APIRouter()
 ICON_DIR = Path("app/static/icons")
+# files copied in here are moved into the blob store by the startup reconcile
 UPLOAD_DIR = Path(config.data_dir, "uploaded")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 FILE_NOT_FOUND_EXC = HTTPException(status_code=404, detail="File not found")
+THUMBNAIL_CACHE_CONTROL = f"private, max-age={config.thumbnail_max_age_sec}"
+DOCUMENT_CACHE_CONTROL = "private, no-cache"  # browsers revalidate with the ETag on every use
 
 def icon_filename(ext):
     for ext_list in ICON_MAP:
@@ -47,158 +58,253 @@ def get_formatted_size(size_bytes):
             return f"{size_bytes:.2f} {unit}"
         size_bytes /= 1024
 
-def get_unique_filename(file_path):
-    count = 1
-    unique_filename = file_path
-    while unique_filename.exists():
-        unique_filename = file_path.with_name(f"{file_path.stem} ({count}){file_path.suffix}")
-        count += 1
-    return unique_filename
+def document_file_response(request: Request, doc: Document, file_path: Path,
+                           headers: Optional[dict] = None) -> Response:
+    """
+    The blob with a strong ETag from its content hash, or 304 when the client
+    copy is current. FileResponse serves Range and If-Range requests as 206.
+    """
+    filestat = file_path.stat()
+    headers = {
+        "ETag": f'"{doc.sha256}"',
+        "Last-Modified": formatdate(filestat.st_mtime, usegmt=True),
+        "Cache-Control": DOCUMENT_CACHE_CONTROL,
+        **(headers or {}),
+    }
+    if is_not_modified(request, headers["ETag"], filestat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    # media_type helps the browser understand how to render it
+    media_type, _ = mimetypes.guess_type(doc.filename)
+    return ByteRangesFileResponse(
+        path=file_path,
+        filename=doc.filename,
+        headers=headers,
+        media_type=media_type or "application/octet-stream",
+        stat_result=filestat,
+    )
+
+async def get_document_file(db: AsyncSession, filename: str) -> Tuple[Document, Path]:
+    """Active document by name and its blob, 404 when either is missing"""
+    doc = await get_active_document(db, filename)
+    if doc is None or doc.sha256 is None:
+        raise FILE_NOT_FOUND_EXC
+    file_path = blob_store.path(doc.sha256)
+    if not file_path.exists():
+        raise FILE_NOT_FOUND_EXC
+    return doc, file_path
+
+def document_schema(doc: Document) -> DocumentSchema:
+    return DocumentSchema(
+        id=doc.id,
+        filename=doc.filename,
+        filepath=doc.filepath,
+        filesize=get_formatted_size(doc.filesize),
+        sha256=doc.sha256,
+        category=doc.category,
+        is_starred=doc.is_starred,
+        tags=doc.tags,
+        description=doc.description,
+        created_at=doc.created_at,
+        modified_at=doc.updated_at,
+    )
 
 @router.get("/documents", response_model=List[DocumentSchema])
 async def document_list(
+    response: Response,
+    category: Optional[int] = None,
+    starred: Optional[bool] = None,
+    tag: Optional[str] = None,
+    search: Optional[str] = None,
+    sort: Literal["id", "filename", "filesize", "created_at", "updated_at"] = "id",
+    order: Literal["asc", "desc"] = "asc",
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
     user: User = Depends(current_active_user),
-    # db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    documents = []
-    for idx, file in enumerate(UPLOAD_DIR.iterdir()):
-        filestat = file.stat()
-        documents.append(DocumentSchema(
-            id=str(idx+1),
-            filename=file.name,
-            filepath=str(file),
-            filesize=get_formatted_size(filestat.st_size),
-            created_at=datetime.fromtimestamp(filestat.st_ctime),
-            modified_at=datetime.fromtimestamp(filestat.st_mtime),
-        ))
-    return documents
-
-@router.post("/documents/upload", response_model=List[DocumentSchema])
+    """
+    List documents from the metadata index
+    
+    - **tag**: Optional, one of the comma-separated tags
+    - **search**: Optional, part of the filename
+    - **cursor**: Optional, the X-Next-Cursor header of the previous page
+    - **limit**: Optional page size, all documents when not set
+    """
+    try:
+        query = list_query(category, starred, tag, search, sort, order == "desc", cursor,
+                           limit + 1 if limit else None)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    result = await db.execute(query)
+    docs = result.scalars().all()
+    if limit and len(docs) > limit:
+        docs = docs[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(getattr(docs[-1], sort), docs[-1].id)
+    return [document_schema(doc) for doc in docs]
+
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+        "required": ["files"],
+    }}},
+}
+
+@router.post("/documents/upload", response_model=List[DocumentSchema],
+             openapi_extra={"requestBody": UPLOAD_REQUEST_BODY})
 async def upload_files(
-    files: list[UploadFile] = File(...),
+    request: Request,
     # user: User = Depends(current_active_user), # excluding user auth for external use
-    # db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    stored_files = []
-    for file in files:
-        store_filepath = UPLOAD_DIR / file.filename
-        store_filepath = get_unique_filename(store_filepath)
-
-        with open(store_filepath, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        stored_files.append(store_filepath)
-
-    response = []
-    for idx, filepath in enumerate(stored_files):
-        filestat = filepath.stat()
-        response.append(DocumentSchema(
-            id=str(idx+1),
-            filename=filepath.name,
-            filepath=str(filepath),
-            filesize=get_formatted_size(filestat.st_size),
-            created_at=datetime.fromtimestamp(filestat.st_ctime),
-            modified_at=datetime.fromtimestamp(filestat.st_mtime),
-        ))
-    return response
+    """
+    Upload files as multipart/form-data, streamed to disk while they arrive.
+    Content already stored is kept once and shared by the documents.
+    """
+    try:
+        upload_receiver.check_content_length(request.headers.get("content-length"))
+        uploads = await upload_receiver.receive(request.headers.get("content-type", ""), request.stream())
+    except UploadTooLargeError as e:
+        raise HTTPException(413, str(e))
+    except InvalidUploadError as e:
+        raise HTTPException(400, str(e))
+    if not uploads:
+        raise HTTPException(400, "No files uploaded")
+
+    docs = []
+    try:
+        async with blob_store.lock:
+            for upload in uploads:
+                await asyncio.to_thread(blob_store.put, upload.path, upload.sha256)
+                doc = Document(
+                    filename=await unique_filename(db, upload.filename),
+                    filepath=str(blob_store.path(upload.sha256)),
+                    filesize=upload.size,
+                    sha256=upload.sha256,
+                )
+                db.add(doc)
+                await db.flush()  # the next unique_filename sees this name
+                docs.append(doc)
+                await acquire_blob(db, upload.sha256, upload.size)
+            await db.commit()
+    finally:
+        await upload_receiver.discard(uploads)  # temp files not moved into the store
+    for doc in docs:
+        thumbnail_cache.pregenerate(Path(doc.filepath), config.thumbnail_pregenerate_sizes, doc.filename)
+    return [document_schema(doc) for doc in docs]
+
+@router.patch("/documents/{document_id}", response_model=DocumentSchema)
+async def update_document(
+    document_id: int,
+    updates: UpdateDocumentSchema,
+    user: User = Depends(current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Update category, starred, tags and description, PATCH /documents renames"""
+    doc = await db.get(Document, document_id)
+    if doc is None or doc.deleted_at is not None:
+        raise HTTPException(404, f"Document id {document_id} not found")
+    changes = updates.model_dump(exclude_unset=True)
+    if changes.pop("filename", doc.filename) != doc.filename:
+        raise HTTPException(400, "Rename documents with PATCH /documents")
+    for key, value in changes.items():
+        setattr(doc, key, value)
+    doc.updated_by = user.id
+    await db.commit()
+    await db.refresh(doc)
+    return document_schema(doc)
 
 @router.get("/documents/thumbnail/{filename}")
 async def get_thumbnail(
     filename: str,
+    request: Request,
     width: int = 100,
     height: int = 100,
     user: User = Depends(current_active_user),
-    # db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    file_path = UPLOAD_DIR / filename
-    if not file_path.exists():
-        raise FILE_NOT_FOUND_EXC
-    
-    ext = file_path.suffix.lower()
-    if ext in [".jpg", ".jpeg", ".png", ".webp"]:
-        width = width if width > 10 else 10
-        height = height if height > 10 else 10
-        with Image.open(file_path) as img:
-            img.thumbnail((width, height))
-            buf = io.BytesIO()
-            img.save(buf, format="WEBP")
-            return Response(
-                content=buf.getvalue(), 
-                media_type="image/webp",
-            )
-    return FileResponse(ICON_DIR / icon_filename(ext))
+    _, file_path = await get_document_file(db, filename)
+
+    ext = Path(filename).suffix.lower()
+    if ext in THUMBNAIL_EXTENSIONS:
+        # a bounded set of sizes keeps renders and the disk cache bounded too
+        width = snap_size(width, config.thumbnail_sizes)
+        height = snap_size(height, config.thumbnail_sizes)
+        etag = thumbnail_cache.etag(thumbnail_cache.make_key(file_path, width, height))
+        headers = {"ETag": etag, "Cache-Control": THUMBNAIL_CACHE_CONTROL}
+        if is_not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+        content, _ = await thumbnail_cache.get(file_path, width, height)
+        return Response(
+            content=content, 
+            media_type=THUMBNAIL_MEDIA_TYPES["WEBP"],
+            headers=headers,
+        )
+    return FileResponse(ICON_DIR / icon_filename(ext), headers={"Cache-Control": THUMBNAIL_CACHE_CONTROL})
 
 @router.get("/documents/view/{filename}", response_class=FileResponse)
 async def view_file(
     filename: str,
+    request: Request,
     user: User = Depends(current_active_user),
-    # db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    file_path = UPLOAD_DIR / filename
-    if not file_path.exists():
-        raise FILE_NOT_FOUND_EXC
-    
-    # media_type helps the browser understand how to render it
-    media_type, _ = mimetypes.guess_type(file_path)
+    doc, file_path = await get_document_file(db, filename)
 
     # 'inline' tells the browser: "Try to show this inside the window"
     headers = {
-        "Content-Disposition": f"inline; filename={file_path.name}"
+        "Content-Disposition": f"inline; filename={doc.filename}"
     }
-
-    return FileResponse(
-        path=file_path,
-        filename=file_path.name,
-        headers=headers,
-        media_type=media_type or "application/octet-stream",
-    )
+    return document_file_response(request, doc, file_path, headers)
 
 @router.get("/documents/download/{filename}", response_class=FileResponse)
 async def download_file(
     filename: str,
+    request: Request,
     user: User = Depends(current_active_user),
-    # db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    file_path = UPLOAD_DIR / filename
-    if not file_path.exists():
-        raise FILE_NOT_FOUND_EXC
-
-    media_type, _ = mimetypes.guess_type(file_path)
-    return FileResponse(
-        path=file_path,
-        filename=file_path.name,
-        media_type=media_type or "application/octet-stream"
-    )
+    doc, file_path = await get_document_file(db, filename)
+    return document_file_response(request, doc, file_path)
 
 @router.patch("/documents", response_model=DocumentSchema)
 async def update_filename(
     doc: RenameRequest,
     user: User = Depends(current_active_user),
-    # db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    file_path = UPLOAD_DIR / doc.filename
-    if not file_path.exists():
-        raise FILE_NOT_FOUND_EXC    
-    
-    file_path.rename(UPLOAD_DIR / doc.new_filename)
-    return DocumentSchema(
-        id=0,
-        filename=doc.new_filename,
-        filepath=str(UPLOAD_DIR / doc.new_filename),
-    )
+    document = await get_active_document(db, doc.filename)
+    if document is None:
+        raise FILE_NOT_FOUND_EXC
+    if await get_active_document(db, doc.new_filename) is not None:
+        raise HTTPException(409, f"File {doc.new_filename} already exists")
+
+    # the blob is named by its content, renaming only changes the index
+    document.filename = doc.new_filename
+    document.updated_by = user.id
+    await db.commit()
+    await db.refresh(document)
+    return document_schema(document)
 
 @router.delete("/documents", response_model=DocumentSchema)
 async def delete_file(
     doc: DocumentRequest,
     user: User = Depends(current_active_user),
-    # db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    file_path = UPLOAD_DIR / doc.filename
-    if not file_path.exists():
+    document = await get_active_document(db, doc.filename)
+    if document is None:
         raise FILE_NOT_FOUND_EXC
 
-    file_path.unlink()
-    return DocumentSchema(
-        id=0,
-        filename=doc.filename,
-        filepath=str(file_path),
-    )
+    async with blob_store.lock:
+        document.deleted_at = datetime.now(timezone.utc)
+        document.deleted_by = user.id
+        unused = document.sha256 is not None and await release_blob(db, document.sha256)
+        await db.commit()
+        # only unlink when no document references the blob after the commit
+        if unused and await blob_refcount(db, document.sha256) == 0:
+            await asyncio.to_thread(blob_store.remove, document.sha256)
+            thumbnail_cache.purge(document.sha256)
+    return document_schema(document)
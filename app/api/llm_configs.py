@@ -4,8 +4,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select, Column
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.users import current_active_user
+from app.core.users import current_active_user, current_active_superuser
 from app.core.llm_cache import LlmCache, llm_cache, get_llm_cache
+from app.core.llm_http import llm_http_pool
+from app.core.llm_telemetry import llm_telemetry
 from app.db.async_db import get_async_db
 from app.models.user import User
 from app.models.llm_config import LlmConfig
@@ -61,6 +63,20 @@ async def get_cached_llm_configs(
         configs = cache.get_active_llm_configs()
     return list(configs.values())
 
+@router.get("/llm-configs/telemetry")
+async def get_llm_telemetry(
+    admin: User = Depends(current_active_superuser),
+):
+    """Latency histograms, failures and token usage per LLM config and per user"""
+    return llm_telemetry.stats()
+
+@router.get("/llm-configs/http-pool")
+async def get_llm_http_pool_stats(
+    admin: User = Depends(current_active_superuser),
+):
+    """Connections and request counters of the HTTP pool shared by all LLM clients"""
+    return llm_http_pool.stats()
+
 @router.get("/llm-configs/{llm_id}", response_model=LlmSchema)
 async def get_llm_config(
     llm_id: int,
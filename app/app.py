@@ -1,5 +1,6 @@
+import asyncio
 from pathlib import Path
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI, Request, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -9,9 +10,15 @@ from fastapi.exception_handlers import http_exception_handler
 from app.core.config import config
 from app.core.logger import get_logger
 from app.db.async_db import create_db_tables, dispose_sync_db_engine
+from app.core.llm_cache import llm_cache
+from app.core.llm_http import llm_http_pool
+from app.core.thumbnails import thumbnail_cache
+from app.core.chat_sessions import chat_session_store
+from app.core.document_index import reconcile_document_index
 from app.core.users import auth_backend, fastapi_users
 from app.schemas.user import UserCreate, UserRead, UserUpdate
 from app.pages import jinja_pages
+from app.api.documents import UPLOAD_DIR
 from app.api import (
     health, admin, documents, llm_configs, notepads, 
 	todos, expenses, services, chatbot
@@ -34,9 +41,21 @@ async def lifespan(app: FastAPI):
     logger.info(f"Database URL: {config.database_url}")
     logger.info(f"Serving React build from: {REACT_BUILD_DIR}")
     await create_db_tables(rebuild=config.database_rebuild)
+    await reconcile_document_index(UPLOAD_DIR)
+    await chat_session_store.load_archive_index()
+    cache_watcher = None
+    if config.llm_cache_sync_sec > 0:
+        cache_watcher = asyncio.create_task(llm_cache.watch(config.llm_cache_sync_sec))
     yield
     
     # on shutdown
+    if cache_watcher is not None:
+        cache_watcher.cancel()
+        # a reload in progress must not build clients on the closed pool
+        with suppress(asyncio.CancelledError):
+            await cache_watcher
+    await llm_http_pool.aclose()
+    thumbnail_cache.shutdown()
     await dispose_sync_db_engine()
     logger.warning(f"{config.app_name} app exited")
 
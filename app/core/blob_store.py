@@ -0,0 +1,163 @@
+import os
+import fcntl
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import Any, Dict
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import config
+from app.models.blob import Blob
+from app.models.document import Document
+
+
+def hash_file(path: Path) -> str:
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def is_blob_name(name: str) -> bool:
+    return len(name) == 64 and all(c in "0123456789abcdef" for c in name)
+
+
+class FileLock:
+    """
+    Exclusive lock shared by the worker processes through flock on a lock
+    file, tasks of one process queue on an asyncio.Lock in front of it
+    """
+
+    def __init__(self, path: Path, poll_sec: float = 0.01):
+        self.path = Path(path)
+        self.poll_sec = poll_sec
+        self._mutex = asyncio.Lock()
+        self._fd = None
+
+    async def __aenter__(self):
+        await self._mutex.acquire()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            while True:
+                try:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return self
+                except BlockingIOError:
+                    await asyncio.sleep(self.poll_sec)  # held by another worker
+        except BaseException:
+            self._release()
+            raise
+
+    async def __aexit__(self, *exc_info):
+        self._release()
+
+    def _release(self):
+        if self._fd is not None:
+            os.close(self._fd)  # drops the flock
+            self._fd = None
+        self._mutex.release()
+
+
+class BlobStore:
+    """
+    Content addressed file store, each blob is named by the SHA-256 of its
+    content and sharded by hash prefix as root/ab/cd/abcd... Documents with
+    identical content share one blob, the blobs table counts their references.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        # serializes reference counting with the file operations that depend on it,
+        # across all workers sharing the data dir
+        self.lock = FileLock(self.root / ".lock")
+
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    def put(self, tmp_path: Path, sha256: str) -> bool:
+        """Move a hashed file into the store, False when the content was stored already"""
+        path = self.path(sha256)
+        if path.exists():
+            tmp_path.unlink(missing_ok=True)
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, path)
+        return True
+
+    def import_file(self, file_path: Path) -> str:
+        """Hash a file and move it into the store"""
+        sha256 = hash_file(file_path)
+        self.put(file_path, sha256)
+        return sha256
+
+    def remove(self, sha256: str):
+        path = self.path(sha256)
+        path.unlink(missing_ok=True)
+        for shard in (path.parent, path.parent.parent):
+            try:
+                shard.rmdir()
+            except OSError:
+                break  # still holds other blobs
+
+    def quarantine(self, sha256: str) -> Path:
+        """Move a blob no document references out of the store, kept for manual recovery"""
+        target = self.root / "orphaned" / sha256
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.path(sha256), target)
+        self.remove(sha256)  # prunes the empty shard directories
+        return target
+
+    def scan(self) -> Dict[str, int]:
+        """Size of every stored blob by hash"""
+        if not self.root.exists():
+            return {}
+        return {
+            file.name: file.stat().st_size
+            for file in self.root.glob("*/*/*") if file.is_file() and is_blob_name(file.name)
+        }
+
+
+async def acquire_blob(db: AsyncSession, sha256: str, size: int):
+    """Count one more document referencing the blob, commit with the document"""
+    result = await db.execute(
+        update(Blob).where(Blob.sha256 == sha256).values(refcount=Blob.refcount + 1))
+    if result.rowcount == 0:
+        db.add(Blob(sha256=sha256, size=size, refcount=1))
+        await db.flush()  # a second file with the same content in this upload updates the row
+
+
+async def release_blob(db: AsyncSession, sha256: str) -> bool:
+    """Drop one reference, True when it was the last one and the blob can be removed"""
+    await db.execute(
+        update(Blob).where(Blob.sha256 == sha256).values(refcount=Blob.refcount - 1))
+    result = await db.execute(
+        delete(Blob).where((Blob.sha256 == sha256) & (Blob.refcount <= 0)))
+    return result.rowcount > 0
+
+
+async def blob_refcount(db: AsyncSession, sha256: str) -> int:
+    """References counted in the database, 0 once the row is gone"""
+    result = await db.execute(select(Blob.refcount).where(Blob.sha256 == sha256))
+    return result.scalar() or 0
+
+
+async def storage_stats(db: AsyncSession) -> Dict[str, Any]:
+    """Logical document bytes against the bytes actually stored"""
+    documents, logical_bytes = (await db.execute(
+        select(func.count(Document.id), func.coalesce(func.sum(Document.filesize), 0))
+        .where((Document.deleted_at == None) & (Document.sha256 != None)))).one()
+    blobs, stored_bytes = (await db.execute(
+        select(func.count(Blob.sha256), func.coalesce(func.sum(Blob.size), 0)))).one()
+    saved_bytes = max(logical_bytes - stored_bytes, 0)
+    return {
+        "documents": documents,
+        "blobs": blobs,
+        "logical_bytes": logical_bytes,
+        "stored_bytes": stored_bytes,
+        "saved_bytes": saved_bytes,
+        "saved_ratio": round(saved_bytes / logical_bytes, 3) if logical_bytes else 0.0,
+    }
+
+
+# Global instance
+blob_store = BlobStore(Path(config.data_dir, "blobs"))
@@ -0,0 +1,63 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import config
+from app.core.logger import get_logger
+from app.core.llm_cache import llm_cache
+
+
+logger = get_logger(__name__)
+type ChainKey = Tuple[int, str, int]  # llm_id, system prompt hash, history token budget
+
+
+def prompt_hash(system_prompt: Optional[str]) -> str:
+    return hashlib.sha256((system_prompt or "").encode("utf-8")).hexdigest()
+
+
+class ChainCache:
+    """
+    LRU cache of compiled chat runnables. An entry remembers the LLM instance
+    it was built with and is rebuilt when that instance was replaced.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[ChainKey, Tuple[Any, Any]] = OrderedDict()  # key -> (llm, runnable)
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get_or_build(self, key: ChainKey, llm: Any, build: Callable[[], Any]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is llm:
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry[1]
+
+        self._counters["misses"] += 1
+        runnable = build()
+        if self.max_entries > 0:
+            self._entries[key] = (llm, runnable)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+        return runnable
+
+    def invalidate(self, llm_id: Optional[int] = None):
+        """Drop the chains of one LLM, or all chains for None"""
+        keys = [key for key in self._entries if llm_id is None or key[0] == llm_id]
+        for key in keys:
+            del self._entries[key]
+        self._counters["invalidations"] += len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            **self._counters,
+        }
+
+
+# Global instance, dropped chains follow LLM cache reloads
+chain_cache = ChainCache(max_entries=config.chat_chain_cache_size)
+llm_cache.add_reload_listener(chain_cache.invalidate)
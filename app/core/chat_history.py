@@ -0,0 +1,150 @@
+import asyncio
+from typing import Dict, List, Optional, Set
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, trim_messages
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.language_models import BaseChatModel
+from langchain_core.chat_history import BaseChatMessageHistory
+
+from app.core.config import config
+from app.core.logger import get_logger
+from app.core.llm_scheduler import LlmScheduler, llm_scheduler
+
+
+logger = get_logger(__name__)
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+SUMMARY_INSTRUCTIONS = (
+    "Condense the conversation below into a short summary for the assistant. "
+    "Keep names, facts, decisions and open questions, drop small talk."
+)
+SUMMARIZER_USER_KEY = "__history_summarizer__"  # scheduler queue of background jobs
+
+
+def count_tokens(messages: List[BaseMessage]) -> int:
+    """Approximate token count, good enough for budgeting across providers"""
+    return count_tokens_approximately(messages)
+
+
+def is_summary(message: BaseMessage) -> bool:
+    return isinstance(message, SystemMessage) and message.additional_kwargs.get("summary", False)
+
+
+def split_summary(messages: List[BaseMessage]) -> tuple[Optional[BaseMessage], List[BaseMessage]]:
+    if messages and is_summary(messages[0]):
+        return messages[0], messages[1:]
+    return None, messages
+
+
+def window_history(messages: List[BaseMessage], max_tokens: int) -> List[BaseMessage]:
+    """
+    Keep the most recent turns that fit the token budget. A leading summary
+    message is always kept and counts against the budget, the window always
+    starts on a human message so no reply is sent without its question.
+    """
+    if max_tokens <= 0 or count_tokens(messages) <= max_tokens:
+        return messages
+    return trim_messages(
+        messages,
+        max_tokens=max_tokens,
+        token_counter=count_tokens,
+        strategy="last",
+        start_on="human",
+        include_system=True,
+        allow_partial=False,
+    )
+
+
+def format_transcript(messages: List[BaseMessage]) -> str:
+    lines = []
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        lines.append(f"{message.type}: {content}")
+    return "\n".join(lines)
+
+
+class HistorySummarizer:
+    """
+    Compacts long session histories in the background. Once a history grows
+    over trigger_tokens, the turns older than the most recent keep_tokens are
+    replaced by one summary message at the front of the history.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        trigger_tokens: int = 8000,
+        keep_tokens: int = 2000,
+        scheduler: Optional[LlmScheduler] = None,
+    ):
+        self.enabled = enabled
+        self.trigger_tokens = trigger_tokens
+        self.keep_tokens = keep_tokens
+        self._scheduler = scheduler or llm_scheduler
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._counters = {"scheduled": 0, "completed": 0, "skipped": 0, "failed": 0}
+
+    def maybe_schedule(self, session_id: str, history: BaseChatMessageHistory,
+                       llm: BaseChatModel, llm_id: int) -> Optional[asyncio.Task]:
+        """Start a summarization job when the history is over the trigger size"""
+        if not self.enabled or session_id in self._running:
+            return None
+        if count_tokens(history.messages) <= self.trigger_tokens:
+            return None
+        self._running.add(session_id)
+        self._counters["scheduled"] += 1
+        task = asyncio.create_task(self._summarize(session_id, history, llm, llm_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _summarize(self, session_id: str, history: BaseChatMessageHistory,
+                         llm: BaseChatModel, llm_id: int):
+        try:
+            snapshot = list(history.messages)
+            summary, rest = split_summary(snapshot)
+            recent = window_history(rest, self.keep_tokens)
+            older = rest[:len(rest) - len(recent)]
+            if not older:
+                self._counters["skipped"] += 1
+                return
+
+            transcript = format_transcript(older)
+            if summary is not None:
+                transcript = f"{summary.content}\n\n{transcript}"
+            async with await self._scheduler.acquire(llm_id, SUMMARIZER_USER_KEY):
+                result = await llm.ainvoke([
+                    SystemMessage(content=SUMMARY_INSTRUCTIONS),
+                    HumanMessage(content=transcript),
+                ])
+
+            current = history.messages
+            if len(current) < len(snapshot) or any(a is not b for a, b in zip(current, snapshot)):
+                # the session was cleared or rewritten meanwhile, the summary is stale
+                self._counters["skipped"] += 1
+                return
+            compacted = SystemMessage(
+                content=SUMMARY_PREFIX + str(result.content),
+                additional_kwargs={"summary": True},
+            )
+            # turns added while the summary was generated are kept as they are
+            keep = current[len(snapshot) - len(recent):]
+            history.clear()
+            history.add_messages([compacted, *keep])
+            self._counters["completed"] += 1
+            logger.info(f"Summarized {len(older)} messages of chat session {session_id}")
+        except Exception as e:
+            self._counters["failed"] += 1
+            logger.warning(f"Failed to summarize chat session {session_id}: {e}")
+        finally:
+            self._running.discard(session_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {"running": len(self._running), **self._counters}
+
+
+# Global instance
+history_summarizer = HistorySummarizer(
+    enabled=config.chat_summary_enable,
+    trigger_tokens=config.chat_summary_trigger_tokens,
+    keep_tokens=config.chat_summary_keep_tokens,
+)
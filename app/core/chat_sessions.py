@@ -0,0 +1,472 @@
+import json
+import time
+import asyncio
+import itertools
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+from pydantic import PrivateAttr
+from sqlalchemy import delete, select
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+from langchain_core.chat_history import InMemoryChatMessageHistory
+
+from app.core.config import config
+from app.core.logger import get_logger
+from app.db.async_db import AsyncSessionLocal
+from app.models.chat_session import ChatSessionArchive
+
+
+logger = get_logger(__name__)
+MESSAGE_OVERHEAD_BYTES = 64  # rough per-message object overhead
+
+
+def message_size(message: BaseMessage) -> int:
+    """Approximate memory footprint of a message in bytes"""
+    content = message.content
+    if not isinstance(content, str):
+        content = json.dumps(content, default=str)
+    return len(content.encode("utf-8")) + MESSAGE_OVERHEAD_BYTES
+
+
+class BoundedChatMessageHistory(InMemoryChatMessageHistory):
+    """In-memory history that reports every change to its owning store"""
+    _store: Optional['ChatSessionStore'] = PrivateAttr(default=None)
+    _session_id: str = PrivateAttr(default="")
+
+    def bind(self, store: 'ChatSessionStore', session_id: str) -> 'BoundedChatMessageHistory':
+        self._store = store
+        self._session_id = session_id
+        return self
+
+    def add_message(self, message: BaseMessage) -> None:
+        super().add_message(message)
+        if self._store is not None:
+            self._store.on_messages_added(self._session_id, [message])
+
+    def clear(self) -> None:
+        removed = self.messages
+        super().clear()
+        if self._store is not None:
+            self._store.on_messages_removed(self._session_id, removed)
+
+
+@dataclass
+class SessionEntry:
+    history: BoundedChatMessageHistory
+    ttl_sec: float
+    last_access: float = field(default_factory=time.monotonic)
+    message_count: int = 0
+    size_bytes: int = 0
+
+    def is_expired(self, now: float) -> bool:
+        return self.ttl_sec > 0 and now - self.last_access > self.ttl_sec
+
+
+class ChatSessionStore(ABC):
+    """Interface for chat history stores, plugged into get_session_history"""
+
+    def __init__(self):
+        self._discard_listeners: List[Callable[[Optional[str]], None]] = []
+
+    def add_discard_listener(self, callback: Callable[[Optional[str]], None]):
+        """Register a callback for sessions dropped for good, None means all sessions"""
+        self._discard_listeners.append(callback)
+
+    def _notify_discard(self, session_id: Optional[str]):
+        for callback in self._discard_listeners:
+            callback(session_id)
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[BoundedChatMessageHistory]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def peek(self, session_id: str) -> Optional[BoundedChatMessageHistory]:
+        """Lookup without refreshing the session's LRU position or idle timer"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_or_create(self, session_id: str) -> BoundedChatMessageHistory:
+        raise NotImplementedError
+
+    @abstractmethod
+    def contains(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def session_ids(self, offset: int = 0, limit: Optional[int] = None) -> List[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def session_count(self) -> int:
+        raise NotImplementedError
+
+    def expire_idle(self):
+        pass
+
+    @abstractmethod
+    def message_count(self, session_id: str) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self) -> int:
+        raise NotImplementedError
+
+    def is_taken(self, session_id: str) -> bool:
+        """Whether the id is resident or archived, new sessions must not reuse it"""
+        return self.contains(session_id)
+
+    async def load_archive_index(self):
+        """Learn the ids archived before a restart"""
+        pass
+
+    async def restore(self, session_id: str) -> bool:
+        """Reload a previously evicted session, returns True if it is resident"""
+        return self.contains(session_id)
+
+    def on_messages_added(self, session_id: str, messages: List[BaseMessage]):
+        pass
+
+    def on_messages_removed(self, session_id: str, messages: List[BaseMessage]):
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+class InMemoryChatSessionStore(ChatSessionStore):
+    """
+    LRU ordered chat session store bounded by session, message and byte caps.
+    Idle sessions past their TTL are dropped, sessions evicted to satisfy
+    the caps are optionally spilled to the database and restored on demand.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        max_messages: int = 20000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_sec: float = 86400,
+        spill_enable: bool = False,
+    ):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self.spill_enable = spill_enable
+
+        self._entries: OrderedDict[str, SessionEntry] = OrderedDict()  # LRU first
+        self._pending_spills: Dict[str, list] = {}  # session_id -> message dicts not yet in db
+        self._archived_ids: set[str] = set()  # spilled to db, pending or written
+        self._spill_tasks: set[asyncio.Task] = set()
+        self._total_messages = 0
+        self._total_bytes = 0
+        self._counters = {
+            "evictions": 0,
+            "expirations": 0,
+            "spills": 0,
+            "spill_errors": 0,
+            "restores": 0,
+        }
+
+    # --- lookup ---
+    def get(self, session_id: str) -> Optional[BoundedChatMessageHistory]:
+        self.expire_idle()
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        self._touch(session_id, entry)
+        return entry.history
+
+    def peek(self, session_id: str) -> Optional[BoundedChatMessageHistory]:
+        entry = self._entries.get(session_id)
+        return entry.history if entry is not None else None
+
+    def get_or_create(self, session_id: str) -> BoundedChatMessageHistory:
+        history = self.get(session_id)
+        if history is None:
+            history = self._insert(session_id, BoundedChatMessageHistory())
+        return history
+
+    def contains(self, session_id: str) -> bool:
+        entry = self._entries.get(session_id)
+        return entry is not None and not entry.is_expired(time.monotonic())
+
+    def session_ids(self, offset: int = 0, limit: Optional[int] = None) -> List[str]:
+        self.expire_idle()
+        stop = offset + limit if limit is not None else None
+        return list(itertools.islice(self._entries.keys(), offset, stop))
+
+    def session_count(self) -> int:
+        self.expire_idle()
+        return len(self._entries)
+
+    def message_count(self, session_id: str) -> int:
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            return entry.message_count
+        return len(self._pending_spills.get(session_id, []))
+
+    def delete(self, session_id: str) -> bool:
+        entry = self._entries.pop(session_id, None)
+        spilled = self._pending_spills.pop(session_id, None)
+        self._archived_ids.discard(session_id)
+        if entry is not None:
+            self._release(entry)
+        if self.spill_enable:
+            self._schedule(self._delete_spill(session_id))
+        self._notify_discard(session_id)
+        return entry is not None or spilled is not None
+
+    def clear(self) -> int:
+        count = len(self._entries)
+        self._entries.clear()
+        self._pending_spills.clear()
+        self._archived_ids.clear()
+        self._total_messages = 0
+        self._total_bytes = 0
+        if self.spill_enable:
+            self._schedule(self._delete_spill(None))
+        self._notify_discard(None)
+        return count
+
+    # --- accounting hooks called by BoundedChatMessageHistory ---
+    def on_messages_added(self, session_id: str, messages: List[BaseMessage]):
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return
+        size = sum(message_size(msg) for msg in messages)
+        entry.message_count += len(messages)
+        entry.size_bytes += size
+        self._total_messages += len(messages)
+        self._total_bytes += size
+        self._touch(session_id, entry)
+        self._enforce_limits()
+
+    def on_messages_removed(self, session_id: str, messages: List[BaseMessage]):
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return
+        size = sum(message_size(msg) for msg in messages)
+        entry.message_count -= len(messages)
+        entry.size_bytes -= size
+        self._total_messages -= len(messages)
+        self._total_bytes -= size
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._entries),
+            "messages": self._total_messages,
+            "bytes": self._total_bytes,
+            "pending_spills": len(self._pending_spills),
+            "max_sessions": self.max_sessions,
+            "max_messages": self.max_messages,
+            "max_bytes": self.max_bytes,
+            **self._counters,
+        }
+
+    # --- spill and restore ---
+    def is_taken(self, session_id: str) -> bool:
+        return self.contains(session_id) or session_id in self._archived_ids
+
+    async def load_archive_index(self):
+        if not self.spill_enable:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(ChatSessionArchive.session_id))
+                self._archived_ids.update(result.scalars().all())
+        except Exception as e:
+            logger.error(f"Failed to load archived chat session ids: {e}")
+
+    async def restore(self, session_id: str) -> bool:
+        if self.contains(session_id):
+            return True
+        if not self.spill_enable:
+            return False
+
+        message_dicts = self._pending_spills.pop(session_id, None)
+        if message_dicts is None:
+            try:
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(
+                        select(ChatSessionArchive).where(ChatSessionArchive.session_id == session_id)
+                    )
+                    archive = result.scalars().first()
+                    if archive is None:
+                        return False
+                    message_dicts = json.loads(archive.messages)
+                    await db.delete(archive)
+                    await db.commit()
+            except Exception as e:
+                logger.error(f"Failed to restore chat session {session_id}: {e}")
+                return False
+
+        # a concurrent request may have restored it while awaiting the db
+        if self.contains(session_id):
+            return True
+        history = BoundedChatMessageHistory(messages=messages_from_dict(message_dicts))
+        self._archived_ids.discard(session_id)
+        self._insert(session_id, history)
+        self._counters["restores"] += 1
+        return True
+
+    def _spill(self, session_id: str, entry: SessionEntry):
+        if not entry.history.messages:
+            return
+        self._pending_spills[session_id] = messages_to_dict(entry.history.messages)
+        self._archived_ids.add(session_id)
+        self._counters["spills"] += 1
+        self._schedule(self._write_spill(session_id))
+
+    async def _write_spill(self, session_id: str):
+        message_dicts = self._pending_spills.get(session_id)
+        if message_dicts is None:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.merge(ChatSessionArchive(
+                    session_id=session_id,
+                    messages=json.dumps(message_dicts),
+                    message_count=len(message_dicts),
+                ))
+                await db.commit()
+            # keep the pending copy if the session was evicted again meanwhile
+            if self._pending_spills.get(session_id) is message_dicts:
+                del self._pending_spills[session_id]
+        except Exception as e:
+            self._counters["spill_errors"] += 1
+            logger.error(f"Failed to spill chat session {session_id}: {e}")
+
+    async def _delete_spill(self, session_id: Optional[str]):
+        try:
+            async with AsyncSessionLocal() as db:
+                query = delete(ChatSessionArchive)
+                if session_id is not None:
+                    query = query.where(ChatSessionArchive.session_id == session_id)
+                await db.execute(query)
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Failed to delete archived chat session {session_id}: {e}")
+
+    def _schedule(self, coro):
+        try:
+            task = asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            coro.close()  # no event loop, pending spills stay in memory
+            return
+        self._spill_tasks.add(task)
+        task.add_done_callback(self._spill_tasks.discard)
+
+    # --- internals ---
+    def _insert(self, session_id: str, history: BoundedChatMessageHistory) -> BoundedChatMessageHistory:
+        history.bind(self, session_id)
+        entry = SessionEntry(history=history, ttl_sec=self.ttl_sec)
+        entry.message_count = len(history.messages)
+        entry.size_bytes = sum(message_size(msg) for msg in history.messages)
+        self._entries[session_id] = entry
+        self._total_messages += entry.message_count
+        self._total_bytes += entry.size_bytes
+        self._enforce_limits()
+        return history
+
+    def _touch(self, session_id: str, entry: SessionEntry):
+        entry.last_access = time.monotonic()
+        self._entries.move_to_end(session_id)
+
+    def _release(self, entry: SessionEntry):
+        self._total_messages -= entry.message_count
+        self._total_bytes -= entry.size_bytes
+        entry.history.bind(None, "")
+
+    def expire_idle(self):
+        # entries are in access order, so expired ones are always at the front
+        now = time.monotonic()
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if not entry.is_expired(now):
+                break
+            del self._entries[session_id]
+            self._release(entry)
+            self._counters["expirations"] += 1
+            self._notify_discard(session_id)
+
+    def _over_limits(self) -> bool:
+        return (
+            len(self._entries) > self.max_sessions
+            or self._total_messages > self.max_messages
+            or self._total_bytes > self.max_bytes
+        )
+
+    def _enforce_limits(self):
+        # never evict the most recently used session, it is being worked on
+        while len(self._entries) > 1 and self._over_limits():
+            session_id, entry = self._entries.popitem(last=False)
+            self._release(entry)
+            self._counters["evictions"] += 1
+            if self.spill_enable:
+                self._spill(session_id, entry)
+            else:
+                self._notify_discard(session_id)
+
+
+class ChatSessionRegistry:
+    """
+    Per-user index of chat sessions with a monotonic session counter,
+    so listing and creating sessions never scans other users' sessions.
+    """
+
+    def __init__(self, store: ChatSessionStore):
+        self._store = store
+        self._user_sessions: Dict[str, Dict[str, None]] = {}  # user_key -> ordered session ids
+        self._session_owners: Dict[str, str] = {}  # session_id -> user_key
+        self._user_counters: Dict[str, int] = {}  # user_key -> last issued number
+        store.add_discard_listener(self._on_discard)
+
+    def create_session(self, user_key: str, prefix: str) -> str:
+        counter = self._user_counters.get(user_key, 0)
+        while True:
+            counter += 1
+            session_id = f"{prefix}_{counter:02d}"
+            # users with the same email local-part share the prefix, archived
+            # sessions keep their ids across restarts
+            if session_id not in self._session_owners and not self._store.is_taken(session_id):
+                break
+        self._user_counters[user_key] = counter
+        self._user_sessions.setdefault(user_key, {})[session_id] = None
+        self._session_owners[session_id] = user_key
+        self._store.get_or_create(session_id)
+        return session_id
+
+    def user_sessions(self, user_key: str) -> List[str]:
+        self._store.expire_idle()
+        return list(self._user_sessions.get(user_key, {}))
+
+    def owner(self, session_id: str) -> Optional[str]:
+        return self._session_owners.get(session_id)
+
+    def _on_discard(self, session_id: Optional[str]):
+        if session_id is None:
+            self._user_sessions.clear()
+            self._session_owners.clear()
+            return
+        user_key = self._session_owners.pop(session_id, None)
+        if user_key is not None:
+            self._user_sessions[user_key].pop(session_id, None)
+
+
+# Global instance
+chat_session_store: ChatSessionStore = InMemoryChatSessionStore(
+    max_sessions=config.chat_session_max_sessions,
+    max_messages=config.chat_session_max_messages,
+    max_bytes=config.chat_session_max_bytes,
+    ttl_sec=config.chat_session_ttl_sec,
+    spill_enable=config.chat_session_spill_enable,
+)
+chat_session_registry = ChatSessionRegistry(chat_session_store)
@@ -0,0 +1,233 @@
+import asyncio
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+from starlette.requests import Request
+
+from app.core.logger import get_logger
+
+
+logger = get_logger(__name__)
+DISCONNECT_POLL_SEC = 0.25
+
+
+@dataclass(frozen=True)
+class StreamFlushPolicy:
+    """
+    Coalesce streamed chunks into one write until max_bytes are buffered or
+    max_delay_ms passed since the first buffered chunk, whichever is first.
+    A zero delay disables coalescing and flushes every chunk.
+    """
+    max_bytes: int = 64
+    max_delay_ms: float = 20
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 1 and self.max_delay_ms > 0
+
+
+_END = object()
+stream_counters: Dict[str, int] = {
+    "started": 0,
+    "completed": 0,
+    "cancelled": 0,  # client went away before the reply was complete
+    "failed": 0,
+}
+
+
+class _StreamError:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+async def _next_chunk(iterator: AsyncIterator[str]):
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return _END
+
+
+async def _close(iterator: AsyncIterator[str]):
+    """Close the upstream now so its cleanup does not wait for garbage collection"""
+    aclose = getattr(iterator, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+async def coalesce_chunks(chunks: AsyncIterator[str], policy: StreamFlushPolicy) -> AsyncIterator[str]:
+    """Re-chunk a text stream according to the flush policy"""
+    iterator = chunks.__aiter__()
+    if not policy.enabled:
+        try:
+            async for text in iterator:
+                yield text
+        finally:
+            await _close(iterator)
+        return
+
+    loop = asyncio.get_running_loop()
+    max_delay = policy.max_delay_ms / 1000
+    buffer: List[str] = []
+    buffered_bytes = 0
+    deadline = 0.0
+    pending: Optional[asyncio.Task] = None
+    try:
+        while True:
+            if buffer:
+                # wait for the next chunk only until the flush deadline
+                if pending is None:
+                    pending = asyncio.ensure_future(_next_chunk(iterator))
+                timeout = deadline - loop.time()
+                if timeout > 0:
+                    await asyncio.wait((pending,), timeout=timeout)
+                if not pending.done():
+                    yield "".join(buffer)
+                    buffer, buffered_bytes = [], 0
+                    continue
+                text, pending = pending.result(), None
+            elif pending is not None:
+                text, pending = await pending, None
+            else:
+                text = await _next_chunk(iterator)
+
+            if text is _END:
+                break
+            if not buffer:
+                deadline = loop.time() + max_delay
+            buffer.append(text)
+            buffered_bytes += len(text.encode("utf-8"))
+            if buffered_bytes >= policy.max_bytes:
+                yield "".join(buffer)
+                buffer, buffered_bytes = [], 0
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.wait((pending,))  # the upstream cannot be closed while it runs
+        await _close(iterator)
+
+
+async def stream_until_disconnect(
+    request: Request,
+    chunks: AsyncIterator[str],
+    poll_interval: float = DISCONNECT_POLL_SEC,
+) -> AsyncIterator[str]:
+    """
+    Pull chunks in a separate producer task and relay them to the response.
+    The producer, and with it the upstream LLM generation, is cancelled as soon
+    as the client disconnects, even while the model has not sent a token yet.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for text in chunks:
+                queue.put_nowait(text)
+            queue.put_nowait(_END)
+        except Exception as e:
+            queue.put_nowait(_StreamError(e))
+
+    producer = asyncio.create_task(pump())
+    stream_counters["started"] += 1
+    finished = False
+    last_check = loop.time()
+    try:
+        while True:
+            item = None
+            try:
+                async with asyncio.timeout(poll_interval):
+                    item = await queue.get()
+            except TimeoutError:
+                pass
+            if item is None or loop.time() - last_check > poll_interval:
+                last_check = loop.time()
+                if await request.is_disconnected():
+                    break
+            if item is None:
+                continue
+            if item is _END:
+                finished = True
+                stream_counters["completed"] += 1
+                break
+            if isinstance(item, _StreamError):
+                finished = True
+                stream_counters["failed"] += 1
+                raise item.exc
+            yield item
+    finally:
+        if not finished:
+            stream_counters["cancelled"] += 1
+            logger.info(f"Client disconnected, cancelling upstream stream {request.url.path}")
+        if not producer.done():
+            producer.cancel()
+            await asyncio.wait((producer,))
+
+
+@dataclass
+class FanOutEvent:
+    key: int
+    event: str  # chunk, done, error or cancelled
+    text: str = ""
+    elapsed_ms: float = 0.0
+
+
+async def fan_out(streams: Dict[int, AsyncIterator[str]], first_n: Optional[int] = None) -> AsyncIterator[FanOutEvent]:
+    """
+    Run several streams concurrently and interleave their chunks in arrival
+    order, each tagged with its key. With first_n, the streams still running
+    once that many completed successfully are cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def elapsed_ms() -> float:
+        return (loop.time() - start) * 1000
+
+    async def pump(key: int, chunks: AsyncIterator[str]):
+        try:
+            async for text in chunks:
+                queue.put_nowait(FanOutEvent(key, "chunk", text, elapsed_ms()))
+            queue.put_nowait(FanOutEvent(key, "done", elapsed_ms=elapsed_ms()))
+        except Exception as e:
+            queue.put_nowait(FanOutEvent(key, "error", str(e), elapsed_ms()))
+
+    tasks = {key: asyncio.create_task(pump(key, chunks)) for key, chunks in streams.items()}
+    running = list(tasks)
+    completed = 0
+    try:
+        while running:
+            item = await queue.get()
+            if item.key not in running:
+                continue
+            yield item
+            if item.event == "chunk":
+                continue
+            running.remove(item.key)
+            if item.event == "done":
+                completed += 1
+            if first_n and completed >= first_n:
+                break
+        for key in running:
+            tasks[key].cancel()
+            yield FanOutEvent(key, "cancelled", elapsed_ms=elapsed_ms())
+    finally:
+        pending = [task for task in tasks.values() if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+
+def format_sse_event(data: str, event: Optional[str] = None, event_id: Optional[str] = None) -> str:
+    """Frame text as one server-sent event, multi-line data gets one data field per line"""
+    lines = data.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    frame = ""
+    if event_id is not None:
+        frame += f"id: {event_id}\n"
+    if event is not None:
+        frame += f"event: {event}\n"
+    frame += "".join(f"data: {line}\n" for line in lines)
+    return frame + "\n"
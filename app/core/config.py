@@ -39,6 +39,18 @@ class Config(BaseSettings):
     # dir configs
     data_dir: str = "./data"
 
+    # document thumbnail configs, cached on disk under data_dir and in memory
+    thumbnail_workers: int = 2 # encoding processes, 0 encodes in a thread
+    thumbnail_cache_max_entries: int = 1000
+    thumbnail_cache_max_bytes: int = 32 * 1024 * 1024 # 32 MB
+    thumbnail_max_age_sec: int = 86400 # browser cache, revalidated with the ETag after
+    thumbnail_sizes: List[int] = [100, 160, 320, 640] # requested sizes snap up to one of these
+    thumbnail_pregenerate_sizes: List[int] = [100, 320] # rendered right after an upload
+
+    # document upload size caps in bytes, 0 is unlimited
+    upload_max_file_bytes: int = 0
+    upload_max_request_bytes: int = 0
+
     # DB configs
     database_debug: bool = False
     database_rebuild: bool = False
@@ -49,6 +61,73 @@ class Config(BaseSettings):
     jwt_lifetime_sec: int = 86400 # 1 day
     jwt_secret_key: str = "jwt-dev-secret"
 
+    # chat session store configs
+    chat_session_max_sessions: int = 1000
+    chat_session_max_messages: int = 20000
+    chat_session_max_bytes: int = 64 * 1024 * 1024 # 64 MB
+    chat_session_ttl_sec: int = 86400 # 1 day idle
+    chat_session_spill_enable: bool = False # archive evicted sessions to db
+
+    # chat history configs, token counts are approximate
+    chat_history_max_tokens: int = 4000 # history sent per turn, 0 = unlimited
+    chat_summary_enable: bool = False # compact old turns into a summary message
+    chat_summary_trigger_tokens: int = 8000
+    chat_summary_keep_tokens: int = 2000 # recent history kept verbatim
+    chat_chain_cache_size: int = 256 # compiled chains per llm and system prompt, 0 disables
+
+    # chat streaming configs, chunks are coalesced up to N bytes or N ms
+    chat_stream_flush_bytes: int = 64
+    chat_stream_flush_ms: int = 20 # 0 flushes every chunk
+    ask_stream_flush_bytes: int = 128
+    ask_stream_flush_ms: int = 30
+
+    # resumable chat event streams, replayed with Last-Event-ID
+    chat_resume_enable: bool = True
+    chat_resume_grace_sec: float = 30 # generation keeps running this long without a client
+    chat_resume_ttl_sec: int = 120 # finished generations stay replayable
+    chat_resume_max_events: int = 4096 # ring buffer of chunks per generation
+    chat_resume_max_generations: int = 2 # per session
+
+    # chat websocket configs
+    chat_ws_max_in_flight: int = 4 # concurrent turns per connection
+
+    # ask response cache configs, only replies at temperature 0 or opted in are cached
+    ask_cache_enable: bool = True
+    ask_cache_max_entries: int = 1000
+    ask_cache_max_bytes: int = 16 * 1024 * 1024 # 16 MB
+    ask_cache_ttl_sec: int = 3600
+
+    # ask batch configs
+    ask_batch_max_items: int = 100
+    ask_batch_max_concurrency: int = 4 # per batch, the llm scheduler limits still apply
+
+    # llm scheduler configs, limits apply per llm config id
+    llm_max_in_flight: int = 8
+    llm_max_queue: int = 64
+    llm_queue_timeout_sec: float = 30
+    llm_max_in_flight_overrides: Dict[int, int] = {} # e.g. {"3": 2}
+
+    # llm config cache, picks up changes made through other workers
+    llm_cache_sync_sec: float = 5 # 0 disables the check
+
+    # llm failover configs, a group is served in place of its primary llm id
+    llm_failover_groups: Dict[int, List[int]] = {} # primary -> backups, e.g. {"1": [2]}
+    llm_hedge_percentile: float = 0.95 # of the primary's time to first token
+    llm_hedge_min_ms: int = 250
+    llm_hedge_default_ms: int = 2000 # until enough samples are collected
+    llm_breaker_window: int = 50 # recent calls per llm config
+    llm_breaker_min_calls: int = 10
+    llm_breaker_error_rate: float = 0.5
+    llm_breaker_open_sec: int = 30
+
+    # llm http pool configs, one client shared by all llm provider instances
+    llm_http_max_connections: int = 100
+    llm_http_max_keepalive: int = 20
+    llm_http_keepalive_sec: float = 60
+    llm_http_connect_timeout_sec: float = 10
+    llm_http_read_timeout_sec: float = 120 # also the longest pause between streamed chunks
+    llm_http_http2: bool = True # used when the h2 package is installed
+
     # email support configs
     email_support_enable: bool = False
     smtp_user: str = ""
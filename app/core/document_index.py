@@ -0,0 +1,185 @@
+import os
+import json
+import base64
+import asyncio
+from pathlib import Path
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import Select, and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logger import get_logger
+from app.db.async_db import AsyncSessionLocal
+from app.models.blob import Blob
+from app.models.document import Document
+from app.core.blob_store import BlobStore, blob_store
+
+
+logger = get_logger(__name__)
+
+SORT_COLUMNS = {
+    "id": Document.id,
+    "filename": Document.filename,
+    "filesize": Document.filesize,
+    "created_at": Document.created_at,
+    "updated_at": Document.updated_at,
+}
+
+
+def encode_cursor(value: Any, document_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, document_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    """Sort value and id after which the next page starts, raises ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, document_id = json.loads(raw)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if sort in ("created_at", "updated_at") and value is not None:
+        value = datetime.fromisoformat(value)
+    return value, int(document_id)
+
+
+def list_query(
+    category: Optional[int] = None,
+    starred: Optional[bool] = None,
+    tag: Optional[str] = None,
+    search: Optional[str] = None,
+    sort: str = "id",
+    descending: bool = False,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Select:
+    """Active documents filtered and ordered by (sort, id), keyset paginated after cursor"""
+    column = SORT_COLUMNS[sort]
+    query = select(Document).where(Document.deleted_at == None)
+    if category is not None:
+        query = query.where(Document.category == category)
+    if starred is not None:
+        query = query.where(Document.is_starred == int(starred))
+    if tag:
+        tags = "," + func.replace(Document.tags, " ", "") + ","
+        query = query.where(tags.contains(f",{tag.strip()},"))
+    if search:
+        query = query.where(Document.filename.icontains(search))
+    if cursor:
+        value, after_id = decode_cursor(cursor, sort)
+        if descending:
+            query = query.where(or_(column < value, and_(column == value, Document.id < after_id)))
+        else:
+            query = query.where(or_(column > value, and_(column == value, Document.id > after_id)))
+    if descending:
+        query = query.order_by(column.desc(), Document.id.desc())
+    else:
+        query = query.order_by(column.asc(), Document.id.asc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+async def get_active_document(db: AsyncSession, filename: str) -> Optional[Document]:
+    result = await db.execute(
+        select(Document).where((Document.filename == filename) & (Document.deleted_at == None)))
+    return result.scalars().first()
+
+
+async def unique_filename(db: AsyncSession, filename: str) -> str:
+    """The filename, or "name (n).ext" when an active document uses it already"""
+    path = Path(filename)
+    result = await db.execute(select(Document.filename).where(
+        (Document.deleted_at == None) & Document.filename.startswith(path.stem, autoescape=True)))
+    taken = set(result.scalars().all())
+    count = 1
+    unique = filename
+    while unique in taken:
+        unique = f"{path.stem} ({count}){path.suffix}"
+        count += 1
+    return unique
+
+
+def scan_upload_dir(upload_dir: Path) -> Dict[str, os.stat_result]:
+    return {file.name: file.stat() for file in upload_dir.iterdir() if file.is_file()}
+
+
+async def reconcile(db: AsyncSession, upload_dir: Path, store: BlobStore) -> Dict[str, int]:
+    """
+    Move files found in upload_dir into the blob store, then bring the
+    documents and blobs tables in line with the stored blobs. Blobs no
+    document references are quarantined, never deleted.
+    """
+    result = await db.execute(select(Document).where(Document.deleted_at == None))
+    indexed = {doc.filename: doc for doc in result.scalars().all()}
+    now = datetime.now(timezone.utc)
+    counts = {"added": 0, "updated": 0, "removed": 0, "orphans": 0}
+
+    # files copied in while the app was down, and the former one file per name layout
+    files = await asyncio.to_thread(scan_upload_dir, upload_dir)
+    for filename, filestat in files.items():
+        try:
+            sha256 = await asyncio.to_thread(store.import_file, upload_dir / filename)
+        except FileNotFoundError:
+            continue  # removed while scanning
+        doc = indexed.get(filename)
+        if doc is None:
+            doc = Document(
+                filename=filename,
+                created_at=datetime.fromtimestamp(filestat.st_ctime, timezone.utc),
+                updated_at=datetime.fromtimestamp(filestat.st_mtime, timezone.utc),
+            )
+            db.add(doc)
+            indexed[filename] = doc
+            counts["added"] += 1
+        elif doc.sha256 != sha256:
+            counts["updated"] += 1
+        doc.sha256 = sha256
+        doc.filepath = str(store.path(sha256))
+        doc.filesize = filestat.st_size
+    # imported files are in the store now, index them before anything counts as an orphan
+    await db.commit()
+
+    stored = await asyncio.to_thread(store.scan)
+    refcounts = Counter()
+    for doc in indexed.values():
+        if doc.sha256 in stored:
+            refcounts[doc.sha256] += 1
+        else:
+            doc.deleted_at = now
+            counts["removed"] += 1
+
+    result = await db.execute(select(Blob))
+    blobs = {blob.sha256: blob for blob in result.scalars().all()}
+    for sha256, size in stored.items():
+        blob = blobs.pop(sha256, None)
+        if refcounts[sha256] == 0:
+            target = await asyncio.to_thread(store.quarantine, sha256)
+            logger.warning(f"Blob {sha256} is not referenced by any document, moved to {target}")
+            if blob is not None:
+                await db.delete(blob)
+            counts["orphans"] += 1
+            continue
+        if blob is None:
+            blob = Blob(sha256=sha256)
+            db.add(blob)
+        blob.size = size
+        blob.refcount = refcounts[sha256]
+    for blob in blobs.values():
+        await db.delete(blob)  # the blob file is gone
+    await db.commit()
+    return counts
+
+
+async def reconcile_document_index(upload_dir: Path):
+    """Startup pass, picks up files copied in or removed while the app was down"""
+    try:
+        async with blob_store.lock, AsyncSessionLocal() as db:
+            counts = await reconcile(db, upload_dir, blob_store)
+        logger.info(f"Document index reconciled, {counts}")
+    except Exception as e:
+        # e.g. a populated documents table that upgrade_documents_table could not migrate
+        logger.error(f"Document index reconcile failed: {e}")
@@ -0,0 +1,161 @@
+import time
+import zlib
+import random
+import asyncio
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from urllib.parse import parse_qsl, urlparse
+from pydantic import PrivateAttr
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage, message_chunk_to_message
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+FAKE_VOCABULARY = (
+    "the quick brown fox jumps over lazy dog while streaming synthetic tokens "
+    "for load testing chat pipelines without any remote model provider"
+).split()
+MIN_SLEEP_SEC = 0.001  # skip sleeps shorter than this and catch up on the next token
+
+
+class FakeLlmError(RuntimeError):
+    pass
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    Offline chat model that streams deterministic synthetic tokens.
+    The reply text depends only on the seed and the prompt, while latency,
+    throughput, length and failure rate are configurable for load tests.
+    """
+    model_name: str = "local-fake"
+    ttft_ms: float = 200.0          # time to first token
+    tokens_per_sec: float = 50.0    # 0 disables pacing after the first token
+    response_tokens: int = 100
+    error_rate: float = 0.0         # probability of failing a call mid-stream
+    seed: int = 0
+
+    _error_rng: Optional[random.Random] = PrivateAttr(default=None)
+
+    @classmethod
+    def from_endpoint(cls, endpoint: str, **kwargs) -> 'FakeStreamingChatModel':
+        """Build from an endpoint like fake://local?ttft_ms=100&tokens_per_sec=200"""
+        params: Dict[str, Any] = dict(parse_qsl(urlparse(endpoint or "").query))
+        fields = {name: params[name] for name in cls.model_fields if name in params}
+        return cls(**{**fields, **kwargs})  # explicit arguments win over the query
+
+    @property
+    def _llm_type(self) -> str:
+        return "local-fake"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "model_name": self.model_name,
+            "ttft_ms": self.ttft_ms,
+            "tokens_per_sec": self.tokens_per_sec,
+            "response_tokens": self.response_tokens,
+        }
+
+    def _reply_tokens(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "".join(str(msg.content) for msg in messages)
+        rng = random.Random(self.seed ^ zlib.crc32(prompt.encode("utf-8")))
+        return [rng.choice(FAKE_VOCABULARY) + " " for _ in range(self.response_tokens)]
+
+    def _fail_at(self) -> Optional[int]:
+        """Token index to fail at for this call, None for a successful call"""
+        if self._error_rng is None:
+            self._error_rng = random.Random(self.seed)
+        if self.error_rate > 0 and self._error_rng.random() < self.error_rate:
+            return self._error_rng.randrange(self.response_tokens + 1)
+        return None
+
+    def _schedule(self, index: int) -> float:
+        """Seconds after the call start at which token index is emitted"""
+        delay = self.ttft_ms / 1000
+        if self.tokens_per_sec > 0:
+            delay += index / self.tokens_per_sec
+        return delay
+
+    def _usage_chunk(self, messages: List[BaseMessage], tokens: List[str]) -> ChatGenerationChunk:
+        input_tokens = sum(len(str(msg.content).split()) for msg in messages)
+        return ChatGenerationChunk(message=AIMessageChunk(
+            content="",
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": len(tokens),
+                "total_tokens": input_tokens + len(tokens),
+            },
+            response_metadata={"model_name": self.model_name},
+        ))
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        tokens = self._reply_tokens(messages)
+        fail_at = self._fail_at()
+        start = time.monotonic()
+        for index, token in enumerate(tokens):
+            if index == fail_at:
+                raise FakeLlmError(f"Synthetic failure after {index} tokens")
+            wait = start + self._schedule(index) - time.monotonic()
+            if wait > MIN_SLEEP_SEC:
+                time.sleep(wait)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        if fail_at == len(tokens):
+            raise FakeLlmError("Synthetic failure at end of stream")
+        yield self._usage_chunk(messages, tokens)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = self._reply_tokens(messages)
+        fail_at = self._fail_at()
+        start = time.monotonic()
+        for index, token in enumerate(tokens):
+            if index == fail_at:
+                raise FakeLlmError(f"Synthetic failure after {index} tokens")
+            wait = start + self._schedule(index) - time.monotonic()
+            if wait > MIN_SLEEP_SEC:
+                await asyncio.sleep(wait)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        if fail_at == len(tokens):
+            raise FakeLlmError("Synthetic failure at end of stream")
+        yield self._usage_chunk(messages, tokens)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        merged = None
+        for chunk in self._stream(messages, stop, run_manager, **kwargs):
+            merged = chunk if merged is None else merged + chunk
+        return ChatResult(generations=[ChatGeneration(message=message_chunk_to_message(merged.message))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        merged = None
+        async for chunk in self._astream(messages, stop, run_manager, **kwargs):
+            merged = chunk if merged is None else merged + chunk
+        return ChatResult(generations=[ChatGeneration(message=message_chunk_to_message(merged.message))])
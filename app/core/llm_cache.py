@@ -1,22 +1,42 @@
-from typing import Dict, Optional, Union
+import time
+import asyncio
+import anthropic
+from functools import cached_property
+from typing import Callable, Dict, List, Optional, Tuple, Union
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
-from sqlalchemy import select
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.logger import get_logger
+from app.core.fake_llm import FakeStreamingChatModel
+from app.core.llm_http import llm_http_pool
 from app.db.async_db import AsyncSessionLocal
 from app.models.llm_config import LlmConfig
 
 
 logger = get_logger(__name__)
-type LlmProvider = Union[ChatOpenAI, ChatAnthropic]
+type LlmProvider = Union[ChatOpenAI, ChatAnthropic, FakeStreamingChatModel]
+type ClientKey = Tuple  # the config fields an LLM instance is built from
+type Watermark = Tuple  # latest updated_at and row count of the llm_configs table
 
 # Provider constants (should match database values)
 class LlmProviderType:
     OPENAI = 0
     ANTHROPIC = 1
     AZURE = 2
+    LOCAL_FAKE = 10  # offline synthetic model for load tests
+
+
+class PooledChatAnthropic(ChatAnthropic):
+    """ChatAnthropic on the shared LLM HTTP pool, it has no http client parameter"""
+
+    @cached_property
+    def _async_client(self) -> anthropic.AsyncClient:
+        params = dict(self._client_params)
+        if params.get("timeout") is None:
+            params["timeout"] = llm_http_pool.timeout
+        return anthropic.AsyncClient(**params, http_client=llm_http_pool.client)
 
 
 class LlmCache:
@@ -34,8 +54,24 @@ class LlmCache:
         
         self._llm_configs: Dict[int, LlmConfig] = {}  # id -> LlmConfig from db
         self._llm_instances: Dict[int, LlmProvider] = {}  # id -> LangChain instance
+        self._client_keys: Dict[int, ClientKey] = {}  # id -> fields of the cached instance
+        self._reload_listeners: List[Callable[[Optional[int]], None]] = []
+        self._load_lock = asyncio.Lock()
+        self._load_requests = 0  # load calls so far
+        self._loaded_requests = 0  # load calls covered by the current snapshot
+        self._watermark: Optional[Watermark] = None  # of the current snapshot
+        self._synced_at = float("-inf")
+        self.session_factory = AsyncSessionLocal  # sessions of the loads started by the cache itself
         LlmCache._initialized = True
     
+    def add_reload_listener(self, callback: Callable[[Optional[int]], None]):
+        """Register a callback for replaced LLM instances, None means all of them"""
+        self._reload_listeners.append(callback)
+    
+    def _notify_reload(self, llm_id: Optional[int] = None):
+        for callback in self._reload_listeners:
+            callback(llm_id)
+    
     @property
     def is_loaded(self) -> bool:
         return len(self._llm_configs) > 0
@@ -55,6 +91,10 @@ class LlmCache:
     def get_llm_instance(self, llm_id: int) -> Optional[LlmProvider]:
         return self._llm_instances.get(llm_id)
     
+    @staticmethod
+    def _client_key(config: LlmConfig) -> ClientKey:
+        return (config.provider, config.model_name, config.temperature, config.api_endpoint, config.api_key)
+    
     def _create_llm_instance(self, config: LlmConfig) -> Optional[LlmProvider]:
         try:
             if config.provider == LlmProviderType.OPENAI:
@@ -63,51 +103,130 @@ class LlmCache:
                     api_key=config.api_key,
                     model=config.model_name,
                     temperature=config.temperature,
+                    timeout=llm_http_pool.timeout,
+                    http_async_client=llm_http_pool.client,
                 )
             elif config.provider == LlmProviderType.ANTHROPIC:
-                return ChatAnthropic(
+                return PooledChatAnthropic(
                     base_url=config.api_endpoint if config.api_endpoint else None,
                     api_key=config.api_key,
                     model_name=config.model_name,
                     temperature=config.temperature,
                 )
+            elif config.provider == LlmProviderType.LOCAL_FAKE:
+                return FakeStreamingChatModel.from_endpoint(
+                    config.api_endpoint,
+                    model_name=config.model_name,
+                )
             logger.warning(f"Unsupported LLM provider: {config.provider} for model {config.title}")
         except Exception as e:
             logger.error(f"Failed to create LLM instance for {config.title}: {e}")
         return None
     
     async def load(self, db: Optional[AsyncSession] = None) -> int:
+        """
+        Build a new snapshot aside and swap it in, readers never see an empty
+        cache. Unchanged configs keep their instance and its connection pool.
+        Concurrent calls share one reload that started after they were made.
+        """
+        self._load_requests += 1
+        requested = self._load_requests
+        async with self._load_lock:
+            if self._loaded_requests >= requested:
+                return len(self._llm_configs)  # a reload started after this call already ran
+            covered, self._loaded_requests = self._loaded_requests, self._load_requests
+            try:
+                return await self._load_snapshot(db)
+            except Exception:
+                self._loaded_requests = covered  # waiting callers try again
+                raise
+    
+    @staticmethod
+    async def _query_watermark(db: AsyncSession) -> Watermark:
+        # every create, update and soft delete bumps updated_at, hard deletes the count
+        result = await db.execute(select(func.max(LlmConfig.updated_at), func.count(LlmConfig.id)))
+        return tuple(result.one())
+    
+    async def sync(self, db: Optional[AsyncSession] = None, min_interval_sec: float = 0) -> bool:
+        """
+        Reload when another worker changed the llm_configs table, checked with
+        one tiny query at most every min_interval_sec. True when reloaded.
+        """
+        now = time.monotonic()
+        if now - self._synced_at < min_interval_sec:
+            return False
+        self._synced_at = now
         close_session = False
         if db is None:
-            db = AsyncSessionLocal()
+            db = self.session_factory()
+            close_session = True
+        try:
+            watermark = await self._query_watermark(db)
+            if watermark == self._watermark:
+                return False
+            logger.info("LLM configs changed in the database, reloading the cache")
+            await self.load(db)
+            return True
+        finally:
+            if close_session:
+                await db.close()
+    
+    async def watch(self, interval_sec: float):
+        """Keep this worker coherent with config changes made by other workers"""
+        while True:
+            try:
+                await self.sync(min_interval_sec=interval_sec)
+            except Exception as e:
+                logger.error(f"LLM config cache sync failed: {e}")
+            await asyncio.sleep(interval_sec)
+    
+    async def _load_snapshot(self, db: Optional[AsyncSession] = None) -> int:
+        close_session = False
+        if db is None:
+            db = self.session_factory()
             close_session = True
         
         try:
-            # Clear existing cache
-            self._llm_configs.clear()
-            self._llm_instances.clear()
+            # taken before the rows, a change in between only causes another reload
+            watermark = await self._query_watermark(db)
             
             # Query all active LLMs configs from database
             query = select(LlmConfig).where(LlmConfig.deleted_at == None)
             query = query.where((LlmConfig.is_active == True) & (LlmConfig.category == 0))
             result = await db.execute(query)
             llm_configs = result.scalars().all()
-            
-            # Populate cache
-            for llm_config in llm_configs:
-                self._llm_configs[llm_config.id] = llm_config
-                instance = self._create_llm_instance(llm_config)
-                if instance:
-                    self._llm_instances[llm_config.id] = instance
-            logger.info(f"LLM config cache loaded count: {len(self._llm_configs)}")
-            return len(self._llm_configs)
-            
         except Exception as e:
-            logger.error(f"Failed to load LLM config cache: {e}")
+            logger.error(f"Failed to load LLM config cache, keeping the previous snapshot: {e}")
             raise
         finally:
             if close_session:
                 await db.close()
+        
+        # Build the new snapshot, reusing instances of unchanged configs
+        configs: Dict[int, LlmConfig] = {}
+        instances: Dict[int, LlmProvider] = {}
+        client_keys: Dict[int, ClientKey] = {}
+        changed: List[int] = []
+        for llm_config in llm_configs:
+            configs[llm_config.id] = llm_config
+            client_key = self._client_key(llm_config)
+            instance = self._llm_instances.get(llm_config.id)
+            if instance is None or self._client_keys.get(llm_config.id) != client_key:
+                instance = self._create_llm_instance(llm_config)
+                changed.append(llm_config.id)
+            if instance:
+                instances[llm_config.id] = instance
+                client_keys[llm_config.id] = client_key
+        removed = [llm_id for llm_id in self._llm_instances if llm_id not in configs]
+        
+        # Swap without awaiting in between
+        self._llm_configs, self._llm_instances, self._client_keys = configs, instances, client_keys
+        self._watermark = watermark
+        logger.info(f"LLM config cache loaded count: {len(configs)}, "
+                    f"rebuilt: {len(changed)}, removed: {len(removed)}")
+        for llm_id in changed + removed:
+            self._notify_reload(llm_id)
+        return len(configs)
     
     async def refresh(self) -> int:
         return await self.load()
@@ -116,11 +235,14 @@ class LlmCache:
         if llm_id is not None:
             self._llm_configs.pop(llm_id, None)
             self._llm_instances.pop(llm_id, None)
+            self._client_keys.pop(llm_id, None)
             logger.info(f"Invalidated LLM config cache for id={llm_id}")
         else:
             self._llm_configs.clear()
             self._llm_instances.clear()
+            self._client_keys.clear()
             logger.info("Invalidated entire LLM config cache")
+        self._notify_reload(llm_id)
 
 
 # Global instance
@@ -0,0 +1,395 @@
+import time
+import asyncio
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional
+from pydantic import Field
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.chat_models import agenerate_from_stream
+from langchain_core.messages import BaseMessage, BaseMessageChunk
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+from app.core.config import config
+from app.core.logger import get_logger
+from app.core.llm_cache import llm_cache
+from app.core.llm_scheduler import (
+    LlmQueueFullError, LlmQueueTimeoutError, LlmScheduler, LlmSlot, current_llm_user, llm_scheduler,
+)
+
+
+logger = get_logger(__name__)
+TTFT_SAMPLES = 200  # recent time to first token samples kept per config
+MIN_TTFT_SAMPLES = 20  # below this the default hedge delay is used
+
+
+class LlmUnavailableError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Error rate breaker over the last window calls. Once open, calls are
+    refused for open_sec, then a single probe call decides whether it closes.
+    """
+
+    def __init__(self, window: int = 50, min_calls: int = 10, error_rate: float = 0.5, open_sec: float = 30):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_sec = open_sec
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.open_sec:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._probing)
+
+    def begin_call(self):
+        if self.state == "half_open":
+            self._probing = True
+
+    def record(self, success: bool):
+        if self._opened_at is not None:
+            # outcome of the half-open probe
+            self._probing = False
+            if success:
+                self._opened_at = None
+                self._outcomes.clear()
+            else:
+                self._opened_at = time.monotonic()
+            return
+        self._outcomes.append(success)
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+            self._opened_at = time.monotonic()
+            self.trips += 1
+            logger.warning(f"Circuit breaker opened after {failures}/{len(self._outcomes)} failed calls")
+
+    def record_cancelled(self):
+        """A cancelled call says nothing about health, it only frees the probe"""
+        if self._opened_at is not None:
+            self._probing = False
+
+    def error_ratio(self) -> float:
+        return self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0
+
+
+class LlmHealth:
+    """Time to first token samples and circuit breaker of one LLM config"""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker(
+            window=config.llm_breaker_window,
+            min_calls=config.llm_breaker_min_calls,
+            error_rate=config.llm_breaker_error_rate,
+            open_sec=config.llm_breaker_open_sec,
+        )
+        self._ttft_ms: Deque[float] = deque(maxlen=TTFT_SAMPLES)
+
+    def record_ttft(self, ttft_ms: float):
+        self._ttft_ms.append(ttft_ms)
+
+    def ttft_percentile(self, q: float) -> Optional[float]:
+        if len(self._ttft_ms) < MIN_TTFT_SAMPLES:
+            return None
+        samples = sorted(self._ttft_ms)
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "error_ratio": round(self.breaker.error_ratio(), 3),
+            "trips": self.breaker.trips,
+            "ttft_samples": len(self._ttft_ms),
+            "ttft_ms_p50": self.ttft_percentile(0.50),
+            "ttft_ms_p95": self.ttft_percentile(0.95),
+        }
+
+
+class LlmHealthRegistry:
+    def __init__(self):
+        self._health: Dict[int, LlmHealth] = {}
+
+    def get(self, llm_id: int) -> LlmHealth:
+        health = self._health.get(llm_id)
+        if health is None:
+            health = LlmHealth()
+            self._health[llm_id] = health
+        return health
+
+    def stats(self) -> Dict[int, Dict[str, Any]]:
+        return {llm_id: health.stats() for llm_id, health in self._health.items()}
+
+
+class _Attempt:
+    """One member call of a failover group, raced until its first token"""
+
+    def __init__(self, llm_id: int, chunks: AsyncIterator[BaseMessageChunk],
+                 acquire: Optional[Callable[[], Awaitable[LlmSlot]]] = None):
+        self.llm_id = llm_id
+        self.chunks = chunks
+        self.start = time.monotonic()
+        self.head: List[BaseMessageChunk] = []  # chunks up to the first token
+        self.exhausted = False
+        self._acquire = acquire
+        self._slot: Optional[LlmSlot] = None
+
+    @property
+    def started(self) -> bool:
+        """The member call was made, not still waiting for a scheduler slot"""
+        return self._acquire is None or self._slot is not None
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.start) * 1000
+
+    async def first_token(self) -> '_Attempt':
+        if self._acquire is not None:
+            self._slot = await self._acquire()
+            self.start = time.monotonic()  # the queue wait is not time to first token
+        # leading empty chunks (role, metadata) do not count as the first token
+        async for chunk in self.chunks:
+            self.head.append(chunk)
+            if chunk.content:
+                return self
+        self.exhausted = True
+        return self
+
+    async def close(self):
+        try:
+            await self.chunks.aclose()
+        except Exception:
+            pass
+        if self._slot is not None:
+            self._slot.release()
+
+
+class FailoverChatModel(BaseChatModel):
+    """
+    Chat model over a group of LLM configs, primary first. Configs with an
+    open circuit breaker are skipped. When the current attempt has no first
+    token after the hedge delay, the next config is raced against it and
+    the first one to produce a token wins, the others are cancelled.
+    The hedge delay is a percentile of the config's recent time to first token,
+    cancelled attempts add the time they waited as a lower bound.
+    The caller holds the primary's scheduler slot, every other member call
+    acquires its own slot for the user of the request.
+    """
+    llm_ids: List[int]
+    hedge_percentile: float = 0.95
+    hedge_min_ms: float = 250
+    hedge_default_ms: float = 2000
+    health: Optional[LlmHealthRegistry] = Field(default=None, exclude=True)
+    scheduler: Optional[LlmScheduler] = Field(default=None, exclude=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "failover-group"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"llm_ids": self.llm_ids}
+
+    def _registry(self) -> LlmHealthRegistry:
+        return self.health or llm_health
+
+    def _slot_acquirer(self, llm_id: int) -> Optional[Callable[[], Awaitable[LlmSlot]]]:
+        if llm_id == self.llm_ids[0]:
+            return None
+        scheduler = self.scheduler or llm_scheduler
+        user_key = current_llm_user.get() or f"failover-{self.llm_ids[0]}"
+        return lambda: scheduler.acquire(llm_id, user_key)
+
+    def hedge_delay_sec(self, llm_id: int) -> float:
+        ttft_ms = self._registry().get(llm_id).ttft_percentile(self.hedge_percentile)
+        if ttft_ms is None:
+            ttft_ms = self.hedge_default_ms
+        return max(ttft_ms, self.hedge_min_ms) / 1000
+
+    def candidates(self) -> List[int]:
+        """Members with an instance and a closed breaker, all members as a last resort"""
+        available = [llm_id for llm_id in self.llm_ids if llm_cache.get_llm_instance(llm_id) is not None]
+        allowed = [llm_id for llm_id in available if self._registry().get(llm_id).breaker.allow()]
+        return allowed or available
+
+    async def _race(self, messages: List[BaseMessage], stop: Optional[List[str]], **kwargs) -> _Attempt:
+        registry = self._registry()
+        waiting = deque(self.candidates())
+        if not waiting:
+            raise LlmUnavailableError(f"No LLM of failover group {self.llm_ids} is available")
+
+        racing: Dict[asyncio.Task, _Attempt] = {}
+        last_error: Optional[Exception] = None
+
+        def launch() -> Optional[int]:
+            while waiting:
+                llm_id = waiting.popleft()
+                llm = llm_cache.get_llm_instance(llm_id)
+                if llm is None:
+                    logger.warning(f"LLM id {llm_id} of failover group {self.llm_ids} was removed, skipping it")
+                    continue
+                registry.get(llm_id).breaker.begin_call()
+                attempt = _Attempt(llm_id, llm.astream(messages, stop=stop, **kwargs), self._slot_acquirer(llm_id))
+                racing[asyncio.ensure_future(attempt.first_token())] = attempt
+                return llm_id
+            return None
+
+        current = launch()
+        if current is None:
+            raise LlmUnavailableError(f"No LLM of failover group {self.llm_ids} is available")
+        winner: Optional[_Attempt] = None
+        try:
+            while winner is None:
+                if not racing:
+                    if not waiting:
+                        raise last_error or LlmUnavailableError("All LLMs of the failover group failed")
+                    current = launch()
+                    continue
+                timeout = self.hedge_delay_sec(current) if waiting else None
+                done, _ = await asyncio.wait(racing, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"No first token from LLM id {current}, hedging to LLM id {waiting[0]}")
+                    current = launch() or current
+                    continue
+                for task in done:
+                    attempt = racing.pop(task)
+                    try:
+                        task.result()
+                    except (LlmQueueFullError, LlmQueueTimeoutError) as e:
+                        # a busy member is not an unhealthy one
+                        logger.info(f"LLM id {attempt.llm_id} skipped: {e}")
+                        registry.get(attempt.llm_id).breaker.record_cancelled()
+                        await attempt.close()
+                        last_error = e
+                        continue
+                    except Exception as e:
+                        logger.warning(f"LLM id {attempt.llm_id} failed before the first token: {e}")
+                        registry.get(attempt.llm_id).breaker.record(False)
+                        await attempt.close()
+                        last_error = e
+                        continue
+                    registry.get(attempt.llm_id).record_ttft(attempt.elapsed_ms())
+                    if winner is None:
+                        winner = attempt
+                    else:
+                        registry.get(attempt.llm_id).breaker.record_cancelled()
+                        await attempt.close()
+        finally:
+            # the losers are cancelled, with them their upstream requests
+            for task, attempt in racing.items():
+                task.cancel()
+                health = registry.get(attempt.llm_id)
+                health.breaker.record_cancelled()
+                if attempt.started:
+                    # a lower bound of its time to first token, without it a member that keeps
+                    # losing races would keep its stale percentile and the hedge delay with it
+                    health.record_ttft(attempt.elapsed_ms())
+            if racing:
+                await asyncio.wait(racing)
+            for attempt in racing.values():
+                await attempt.close()
+        return winner
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        winner = await self._race(messages, stop, **kwargs)
+        breaker = self._registry().get(winner.llm_id).breaker
+        finished = False
+        try:
+            for chunk in winner.head:
+                yield ChatGenerationChunk(message=chunk)
+            if not winner.exhausted:
+                async for chunk in winner.chunks:
+                    if run_manager and chunk.content:
+                        await run_manager.on_llm_new_token(chunk.content, chunk=chunk)
+                    yield ChatGenerationChunk(message=chunk)
+            finished = True
+            breaker.record(True)
+        except Exception:
+            finished = True
+            breaker.record(False)
+            raise
+        finally:
+            if not finished:
+                breaker.record_cancelled()
+            await winner.close()  # also gives back the member's scheduler slot
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop, run_manager, **kwargs))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        """Sync calls try the members in turn, without hedging or scheduler slots"""
+        registry = self._registry()
+        last_error: Optional[Exception] = None
+        for llm_id in self.candidates():
+            llm = llm_cache.get_llm_instance(llm_id)
+            if llm is None:
+                continue
+            breaker = registry.get(llm_id).breaker
+            breaker.begin_call()
+            try:
+                result = llm._generate(messages, stop=stop, **kwargs)
+            except Exception as e:
+                logger.warning(f"LLM id {llm_id} failed: {e}")
+                breaker.record(False)
+                last_error = e
+                continue
+            breaker.record(True)
+            return result
+        raise last_error or LlmUnavailableError(f"No LLM of failover group {self.llm_ids} is available")
+
+
+class FailoverRouter:
+    """Serves a failover group in place of its primary LLM id"""
+
+    def __init__(self, groups: Dict[int, List[int]]):
+        self.groups = groups
+        self._models: Dict[int, FailoverChatModel] = {}
+
+    def get_llm_instance(self, llm_id: int) -> Optional[BaseChatModel]:
+        backups = self.groups.get(llm_id)
+        if not backups:
+            return llm_cache.get_llm_instance(llm_id)
+        model = self._models.get(llm_id)
+        if model is None:
+            model = FailoverChatModel(
+                llm_ids=[llm_id, *[backup for backup in backups if backup != llm_id]],
+                hedge_percentile=config.llm_hedge_percentile,
+                hedge_min_ms=config.llm_hedge_min_ms,
+                hedge_default_ms=config.llm_hedge_default_ms,
+            )
+            self._models[llm_id] = model
+        # members come from the llm cache on every call, so reloads apply
+        if not any(llm_cache.get_llm_instance(member) for member in model.llm_ids):
+            return None
+        return model
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "groups": {llm_id: [llm_id, *backups] for llm_id, backups in self.groups.items()},
+            "health": llm_health.stats(),
+        }
+
+
+# Global instances
+llm_health = LlmHealthRegistry()
+failover_router = FailoverRouter(config.llm_failover_groups)
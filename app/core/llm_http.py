@@ -0,0 +1,92 @@
+import httpx
+from typing import Any, Dict, Optional
+
+from app.core.config import config
+from app.core.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class LlmHttpPool:
+    """
+    One async HTTP client shared by all LLM provider instances. Instances
+    rebuilt on a config reload keep using the warm keep-alive connections.
+    """
+
+    def __init__(self, max_connections: int = 100, max_keepalive: int = 20, keepalive_sec: float = 60,
+                 connect_timeout_sec: float = 10, read_timeout_sec: float = 120, http2: bool = True):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_sec,
+        )
+        self.timeout = httpx.Timeout(read_timeout_sec, connect=connect_timeout_sec)
+        self.http2 = http2 and http2_available()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._counters = {"clients": 0, "requests": 0, "responses": 0, "server_errors": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+                event_hooks={"request": [self._on_request], "response": [self._on_response]},
+            )
+            self._counters["clients"] += 1
+            logger.info(f"LLM HTTP pool created, http2: {self.http2}, "
+                        f"max connections: {self.limits.max_connections}")
+        return self._client
+
+    async def _on_request(self, request: httpx.Request):
+        self._counters["requests"] += 1
+
+    async def _on_response(self, response: httpx.Response):
+        self._counters["responses"] += 1
+        if response.status_code >= 500:
+            self._counters["server_errors"] += 1
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("LLM HTTP pool closed")
+
+    def stats(self) -> Dict[str, Any]:
+        connections = []
+        queued = 0
+        if self._client is not None and not self._client.is_closed:
+            pool = getattr(self._client._transport, "_pool", None)  # httpcore pool
+            if pool is not None:
+                connections = pool.connections
+                queued = len(getattr(pool, "_requests", ()))
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive": self.limits.max_keepalive_connections,
+            "keepalive_sec": self.limits.keepalive_expiry,
+            "connections": len(connections),
+            "idle": sum(1 for conn in connections if conn.is_idle()),
+            "queued_requests": queued,
+            **self._counters,
+        }
+
+
+# Global instance
+llm_http_pool = LlmHttpPool(
+    max_connections=config.llm_http_max_connections,
+    max_keepalive=config.llm_http_max_keepalive,
+    keepalive_sec=config.llm_http_keepalive_sec,
+    connect_timeout_sec=config.llm_http_connect_timeout_sec,
+    read_timeout_sec=config.llm_http_read_timeout_sec,
+    http2=config.llm_http_http2,
+)
@@ -0,0 +1,202 @@
+import math
+import time
+import asyncio
+from contextvars import ContextVar
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional
+
+from app.core.config import config
+from app.core.logger import get_logger
+
+
+logger = get_logger(__name__)
+WAIT_SAMPLES = 1000  # recent queue wait times kept per model for percentiles
+SERVICE_TIME_ALPHA = 0.2  # smoothing of the average slot hold time
+
+# user of the slot acquired last in this context, calls made on the user's
+# behalf further down, such as failover hedges, queue under the same user
+current_llm_user: ContextVar[str] = ContextVar("current_llm_user", default="")
+
+
+class LlmQueueFullError(Exception):
+    def __init__(self, llm_id: int, retry_after: int):
+        super().__init__(f"LLM id {llm_id} is busy, request queue is full")
+        self.retry_after = retry_after
+
+
+class LlmQueueTimeoutError(Exception):
+    def __init__(self, llm_id: int, retry_after: int):
+        super().__init__(f"LLM id {llm_id} is busy, timed out waiting in queue")
+        self.retry_after = retry_after
+
+
+class LlmSlot:
+    """An admitted request, release it exactly once when the LLM call is over"""
+
+    def __init__(self, queue: 'ModelQueue'):
+        self._queue = queue
+        self._acquired_at = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._queue.release(time.monotonic() - self._acquired_at)
+
+    def __del__(self):
+        # a streaming response that never started still gives its slot back
+        self.release()
+
+    async def __aenter__(self) -> 'LlmSlot':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+
+class ModelQueue:
+    """
+    Concurrency limit for one LLM config. Requests over the limit wait in
+    per-user FIFO queues which are served round-robin, so one user with many
+    queued requests cannot starve the others.
+    """
+
+    def __init__(self, llm_id: int, max_in_flight: int, max_queue: int):
+        self.llm_id = llm_id
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.queued = 0
+        self._waiters: OrderedDict[str, Deque[asyncio.Future]] = OrderedDict()  # round-robin order
+        self._wait_ms: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._service_sec = 1.0
+        self._counters = {"admitted": 0, "rejected": 0, "timeouts": 0}
+
+    def retry_after(self) -> int:
+        """Rough seconds until a new request could be admitted"""
+        rounds = (self.queued + 1) / max(self.max_in_flight, 1)
+        return max(1, math.ceil(rounds * self._service_sec))
+
+    async def acquire(self, user_key: str, timeout: float) -> LlmSlot:
+        if self.in_flight < self.max_in_flight and self.queued == 0:
+            return self._admit(0)
+        if self.queued >= self.max_queue:
+            self._counters["rejected"] += 1
+            raise LlmQueueFullError(self.llm_id, self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(user_key, deque()).append(waiter)
+        self.queued += 1
+        start = time.monotonic()
+        try:
+            async with asyncio.timeout(timeout):
+                await waiter
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just as we gave up, pass it on
+                self.in_flight -= 1
+                self._dispatch()
+            else:
+                self._remove_waiter(user_key, waiter)
+            if isinstance(e, TimeoutError):
+                self._counters["timeouts"] += 1
+                raise LlmQueueTimeoutError(self.llm_id, self.retry_after()) from None
+            raise
+        return self._admit((time.monotonic() - start) * 1000, counted=True)
+
+    def release(self, held_sec: float):
+        self._service_sec += SERVICE_TIME_ALPHA * (held_sec - self._service_sec)
+        self.in_flight -= 1
+        self._dispatch()
+
+    def stats(self) -> Dict[str, float]:
+        waits = sorted(self._wait_ms)
+        def pick(q: float) -> float:
+            return round(waits[min(len(waits) - 1, int(q * len(waits)))], 1) if waits else 0.0
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "waiting_users": len(self._waiters),
+            "wait_ms_p50": pick(0.50),
+            "wait_ms_p95": pick(0.95),
+            "wait_ms_max": round(waits[-1], 1) if waits else 0.0,
+            "avg_service_sec": round(self._service_sec, 3),
+            **self._counters,
+        }
+
+    def _admit(self, wait_ms: float, counted: bool = False) -> LlmSlot:
+        # queued waiters already got their in_flight slot from _dispatch
+        if not counted:
+            self.in_flight += 1
+        self._counters["admitted"] += 1
+        self._wait_ms.append(wait_ms)
+        return LlmSlot(self)
+
+    def _dispatch(self):
+        while self.in_flight < self.max_in_flight and self._waiters:
+            user_key, waiters = next(iter(self._waiters.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                self._waiters.move_to_end(user_key)
+            else:
+                del self._waiters[user_key]
+            self.queued -= 1
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def _remove_waiter(self, user_key: str, waiter: asyncio.Future):
+        waiters = self._waiters.get(user_key)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        self.queued -= 1
+        if not waiters:
+            del self._waiters[user_key]
+
+
+class LlmScheduler:
+    """Per LLM config admission control in front of the provider calls"""
+
+    def __init__(
+        self,
+        max_in_flight: int = 8,
+        max_queue: int = 64,
+        queue_timeout_sec: float = 30,
+        max_in_flight_overrides: Optional[Dict[int, int]] = None,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout_sec = queue_timeout_sec
+        self.max_in_flight_overrides = max_in_flight_overrides or {}
+        self._queues: Dict[int, ModelQueue] = {}
+
+    def get_queue(self, llm_id: int) -> ModelQueue:
+        queue = self._queues.get(llm_id)
+        if queue is None:
+            max_in_flight = self.max_in_flight_overrides.get(llm_id, self.max_in_flight)
+            queue = ModelQueue(llm_id, max_in_flight, self.max_queue)
+            self._queues[llm_id] = queue
+        return queue
+
+    async def acquire(self, llm_id: int, user_key: str, timeout: Optional[float] = None) -> LlmSlot:
+        timeout = self.queue_timeout_sec if timeout is None else timeout
+        slot = await self.get_queue(llm_id).acquire(user_key, timeout)
+        current_llm_user.set(user_key)
+        return slot
+
+    def stats(self) -> Dict[int, Dict[str, float]]:
+        return {llm_id: queue.stats() for llm_id, queue in self._queues.items()}
+
+
+# Global instance
+llm_scheduler = LlmScheduler(
+    max_in_flight=config.llm_max_in_flight,
+    max_queue=config.llm_max_queue,
+    queue_timeout_sec=config.llm_queue_timeout_sec,
+    max_in_flight_overrides=config.llm_max_in_flight_overrides,
+)
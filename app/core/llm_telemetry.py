@@ -0,0 +1,164 @@
+import time
+import bisect
+from typing import Any, Dict, Optional, Sequence
+
+
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000)  # tokens per second
+
+
+class Histogram:
+    """Fixed bucket histogram, memory does not grow with the sample count"""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last bucket is the overflow
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th sample"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(self.bounds[index], round(self.max, 1)) if index < len(self.bounds) else round(self.max, 1)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 1) if self.count else None,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": round(self.max, 1),
+        }
+
+
+def empty_usage() -> Dict[str, int]:
+    return {"requests": 0, "input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+
+
+class ModelTelemetry:
+    def __init__(self):
+        self.ttft_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.tokens_per_sec = Histogram(RATE_BUCKETS)
+        self.counters = {"requests": 0, "completed": 0, "failed": 0, "cancelled": 0, "chunks": 0}
+        self.usage = empty_usage()
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.counters["requests"]
+        return {
+            **self.counters,
+            "error_rate": round(self.counters["failed"] / requests, 3) if requests else 0.0,
+            "ttft_ms": self.ttft_ms.summary(),
+            "latency_ms": self.latency_ms.summary(),
+            "tokens_per_sec": self.tokens_per_sec.summary(),
+            "usage": self.usage,
+        }
+
+
+class RequestTrace:
+    """Measures one LLM call, finish it exactly once"""
+
+    def __init__(self, telemetry: 'LlmTelemetry', llm_id: int, user_key: str):
+        self._telemetry = telemetry
+        self.llm_id = llm_id
+        self.user_key = user_key
+        self.start = time.monotonic()
+        self.first_chunk_at: Optional[float] = None
+        self.chunks = 0
+        self.usage: Optional[Dict[str, int]] = None
+        self.finished = False
+
+    def on_chunk(self):
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.monotonic()
+        self.chunks += 1
+
+    def on_usage(self, usage: Optional[Dict[str, Any]]):
+        """Provider usage metadata, streamed usage may arrive in several parts"""
+        if not usage:
+            return
+        if self.usage is None:
+            self.usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+        for key in self.usage:
+            self.usage[key] += usage.get(key, 0) or 0
+
+    def on_message(self, message: Any):
+        """Record a complete, non-streamed reply, it has no time to first token"""
+        self.chunks += 1
+        self.on_usage(getattr(message, "usage_metadata", None))
+
+    def finish(self, status: str = "completed"):
+        if self.finished:
+            return
+        self.finished = True
+        self._telemetry.record(self, status)
+
+
+class LlmTelemetry:
+    """Per LLM config latency histograms and token usage per model and per user"""
+
+    def __init__(self):
+        self._models: Dict[int, ModelTelemetry] = {}
+        self._users: Dict[str, Dict[str, int]] = {}
+
+    def start(self, llm_id: int, user_key: str) -> RequestTrace:
+        return RequestTrace(self, llm_id, user_key)
+
+    def model(self, llm_id: int) -> ModelTelemetry:
+        telemetry = self._models.get(llm_id)
+        if telemetry is None:
+            telemetry = ModelTelemetry()
+            self._models[llm_id] = telemetry
+        return telemetry
+
+    def record(self, trace: RequestTrace, status: str):
+        end = time.monotonic()
+        telemetry = self.model(trace.llm_id)
+        telemetry.counters["requests"] += 1
+        telemetry.counters[status] += 1
+        telemetry.counters["chunks"] += trace.chunks
+        if status == "completed":
+            generation = end - trace.start
+            telemetry.latency_ms.observe(generation * 1000)
+            if trace.first_chunk_at is not None:
+                telemetry.ttft_ms.observe((trace.first_chunk_at - trace.start) * 1000)
+                generation = end - trace.first_chunk_at
+            output_tokens = trace.usage["output_tokens"] if trace.usage else trace.chunks
+            if output_tokens > 1 and generation > 0:
+                telemetry.tokens_per_sec.observe(output_tokens / generation)
+
+        # cancelled and failed calls are billed too when the provider reported usage
+        usage = trace.usage or {}
+        for totals in (telemetry.usage, self._users.setdefault(trace.user_key, empty_usage())):
+            totals["requests"] += 1
+            for key in ("input_tokens", "output_tokens", "total_tokens"):
+                totals[key] += usage.get(key, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "models": {llm_id: telemetry.stats() for llm_id, telemetry in self._models.items()},
+            "users": self._users,
+        }
+
+    def reset(self):
+        self._models.clear()
+        self._users.clear()
+
+
+# Global instance
+llm_telemetry = LlmTelemetry()
@@ -0,0 +1,136 @@
+import time
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.config import config
+from app.core.logger import get_logger
+
+
+logger = get_logger(__name__)
+ENTRY_OVERHEAD_BYTES = 128  # rough per-entry key and object overhead
+
+
+def normalize_message(message: str) -> str:
+    """Collapse whitespace so trivially different prompts share an entry"""
+    return " ".join(message.split())
+
+
+def make_cache_key(llm_id: int, config_version: str, system_prompt: Optional[str],
+                   message: str, temperature: Optional[float]) -> str:
+    parts = [llm_id, config_version, system_prompt or "", normalize_message(message), temperature]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    llm_id: int
+    value: str
+    expires_at: float
+    size_bytes: int
+
+
+class ResponseCache:
+    """
+    TTL and LRU bounded cache of LLM replies. Concurrent misses for the same
+    key share one upstream call, the first caller computes and the others wait
+    for its result. Failed calls are not cached.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 16 * 1024 * 1024, ttl_sec: float = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()  # LRU order, oldest first
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._total_bytes = 0
+        self._counters = {"hits": 0, "misses": 0, "shared": 0, "evictions": 0, "expirations": 0, "errors": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._counters["expirations"] += 1
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def put(self, key: str, llm_id: int, value: str):
+        if key in self._entries:
+            self._remove(key)
+        size = len(value.encode("utf-8")) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        self._entries[key] = CacheEntry(llm_id, value, time.monotonic() + self.ttl_sec, size)
+        self._total_bytes += size
+        while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._counters["evictions"] += 1
+
+    async def get_or_compute(self, key: str, llm_id: int,
+                             compute: Callable[[], Awaitable[str]]) -> Tuple[str, str]:
+        """Return the reply and how it was served, one of hit, shared or miss"""
+        value = self.get(key)
+        if value is not None:
+            self._counters["hits"] += 1
+            return value, "hit"
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._counters["shared"] += 1
+            # shielded so one waiter going away does not cancel the others
+            return await asyncio.shield(task), "shared"
+
+        self._counters["misses"] += 1
+        task = asyncio.create_task(self._compute(key, llm_id, compute))
+        self._inflight[key] = task
+        return await asyncio.shield(task), "miss"
+
+    async def _compute(self, key: str, llm_id: int, compute: Callable[[], Awaitable[str]]) -> str:
+        try:
+            value = await compute()
+            self.put(key, llm_id, value)
+            return value
+        except Exception:
+            self._counters["errors"] += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def purge(self, llm_id: Optional[int] = None) -> int:
+        """Drop all entries, or only those of one LLM, returns the count dropped"""
+        keys = [key for key, entry in self._entries.items() if llm_id is None or entry.llm_id == llm_id]
+        for key in keys:
+            self._remove(key)
+        logger.info(f"Purged {len(keys)} cached LLM responses" + (f" of llm id={llm_id}" if llm_id is not None else ""))
+        return len(keys)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self._counters["hits"] + self._counters["misses"] + self._counters["shared"]
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "inflight": len(self._inflight),
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_sec": self.ttl_sec,
+            "hit_ratio": round(self._counters["hits"] / lookups, 3) if lookups else 0.0,
+            **self._counters,
+        }
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.size_bytes
+
+
+# Global instance
+ask_response_cache = ResponseCache(
+    max_entries=config.ask_cache_max_entries,
+    max_bytes=config.ask_cache_max_bytes,
+    ttl_sec=config.ask_cache_ttl_sec,
+)
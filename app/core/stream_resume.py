@@ -0,0 +1,207 @@
+import time
+import uuid
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+from app.core.config import config
+from app.core.logger import get_logger
+from app.core.chat_sessions import chat_session_store
+
+
+logger = get_logger(__name__)
+
+
+class ReplayGapError(Exception):
+    pass
+
+
+def format_event_id(generation_id: str, seq: int) -> str:
+    return f"{generation_id}-{seq}"
+
+
+def parse_event_id(event_id: str) -> Optional[Tuple[str, int]]:
+    """Split a Last-Event-ID into generation id and sequence number"""
+    generation_id, _, seq = event_id.strip().rpartition("-")
+    if not generation_id or not seq.isdigit():
+        return None
+    return generation_id, int(seq)
+
+
+class Generation:
+    """
+    One streamed reply, produced in a background task into a ring buffer of
+    numbered chunks. Clients subscribe from any retained sequence number.
+    Without subscribers the generation keeps running for grace_sec, then it
+    is cancelled like a plain stream whose client went away.
+    """
+
+    def __init__(self, session_id: str, max_events: int = 4096, grace_sec: float = 30):
+        self.id = uuid.uuid4().hex[:16]
+        self.session_id = session_id
+        self.grace_sec = grace_sec
+        self.last_seq = 0
+        self.done = False
+        self.cancelled = False
+        self.error: Optional[Exception] = None
+        self.finished_at: Optional[float] = None
+        self._events: Deque[Tuple[int, str]] = deque(maxlen=max_events)
+        self._changed = asyncio.Event()
+        self._subscribers = 0
+        self._task: Optional[asyncio.Task] = None
+        self._grace_timer: Optional[asyncio.TimerHandle] = None
+
+    def start(self, chunks: AsyncIterator[str]):
+        self._task = asyncio.create_task(self._produce(chunks))
+        self._start_grace_timer()  # nobody subscribed yet
+
+    async def _produce(self, chunks: AsyncIterator[str]):
+        try:
+            async for text in chunks:
+                self.last_seq += 1
+                self._events.append((self.last_seq, text))
+                self._notify()
+        except asyncio.CancelledError:
+            self.cancelled = True
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self.finished_at = time.monotonic()
+            self._cancel_grace_timer()
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def can_resume(self, after_seq: int) -> bool:
+        """Whether every chunk after after_seq is still in the ring buffer"""
+        if after_seq > self.last_seq:
+            return False
+        oldest = self._events[0][0] if self._events else self.last_seq + 1
+        return after_seq + 1 >= oldest
+
+    async def subscribe(self, after_seq: int = 0) -> AsyncIterator[Tuple[int, str]]:
+        """Replay the chunks after after_seq, then follow the live generation"""
+        self._subscribers += 1
+        self._cancel_grace_timer()
+        try:
+            while True:
+                if not self.can_resume(after_seq):
+                    raise ReplayGapError(f"Chunks after {after_seq} of generation {self.id} are no longer buffered")
+                changed = self._changed
+                for seq, text in list(self._events):
+                    if seq > after_seq:
+                        after_seq = seq
+                        yield seq, text
+                if after_seq < self.last_seq:
+                    continue  # more chunks arrived while yielding
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await changed.wait()
+        finally:
+            self._subscribers -= 1
+            if self._subscribers == 0 and not self.done:
+                self._start_grace_timer()
+
+    def _start_grace_timer(self):
+        self._cancel_grace_timer()
+        self._grace_timer = asyncio.get_running_loop().call_later(self.grace_sec, self._grace_expired)
+
+    def _cancel_grace_timer(self):
+        if self._grace_timer is not None:
+            self._grace_timer.cancel()
+            self._grace_timer = None
+
+    def _grace_expired(self):
+        self._grace_timer = None
+        if self._subscribers == 0 and self._task is not None and not self._task.done():
+            logger.info(f"No client resumed generation {self.id} of session {self.session_id}, cancelling it")
+            self._task.cancel()
+
+    def cancel(self):
+        self._cancel_grace_timer()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+
+class StreamResumeRegistry:
+    """The most recent generations of each chat session, kept for replay"""
+
+    def __init__(self, max_generations: int = 2, max_events: int = 4096,
+                 grace_sec: float = 30, ttl_sec: float = 120):
+        self.max_generations = max_generations
+        self.max_events = max_events
+        self.grace_sec = grace_sec
+        self.ttl_sec = ttl_sec
+        self._sessions: Dict[str, Deque[Generation]] = {}
+        self._counters = {"started": 0, "resumed": 0, "gaps": 0, "expired": 0}
+
+    def start(self, session_id: str, chunks: AsyncIterator[str]) -> Generation:
+        self.expire()
+        generation = Generation(session_id, self.max_events, self.grace_sec)
+        generations = self._sessions.setdefault(session_id, deque())
+        generations.append(generation)
+        while len(generations) > self.max_generations:
+            generations.popleft().cancel()
+        generation.start(chunks)
+        self._counters["started"] += 1
+        return generation
+
+    def resume(self, session_id: str, event_id: str) -> Tuple[Generation, int]:
+        """Find the generation of a Last-Event-ID, raises KeyError or ReplayGapError"""
+        parsed = parse_event_id(event_id)
+        if parsed is None:
+            raise KeyError(event_id)
+        generation_id, after_seq = parsed
+        for generation in self._sessions.get(session_id, ()):
+            if generation.id == generation_id and not self._is_expired(generation, time.monotonic()):
+                if not generation.can_resume(after_seq):
+                    self._counters["gaps"] += 1
+                    raise ReplayGapError(f"Event {event_id} is no longer buffered")
+                self._counters["resumed"] += 1
+                return generation, after_seq
+        raise KeyError(event_id)
+
+    def discard(self, session_id: Optional[str] = None):
+        """Drop the generations of a deleted session, None drops all"""
+        sessions = list(self._sessions) if session_id is None else [session_id]
+        for key in sessions:
+            for generation in self._sessions.pop(key, ()):
+                generation.cancel()
+
+    def _is_expired(self, generation: Generation, now: float) -> bool:
+        return generation.finished_at is not None and now - generation.finished_at > self.ttl_sec
+
+    def expire(self):
+        now = time.monotonic()
+        for session_id in list(self._sessions):
+            generations = self._sessions[session_id]
+            kept = deque(g for g in generations if not self._is_expired(g, now))
+            self._counters["expired"] += len(generations) - len(kept)
+            if kept:
+                self._sessions[session_id] = kept
+            else:
+                del self._sessions[session_id]
+
+    def stats(self) -> Dict[str, int]:
+        generations = [g for gens in self._sessions.values() for g in gens]
+        return {
+            "sessions": len(self._sessions),
+            "generations": len(generations),
+            "running": sum(1 for g in generations if not g.done),
+            **self._counters,
+        }
+
+
+# Global instance
+stream_resume = StreamResumeRegistry(
+    max_generations=config.chat_resume_max_generations,
+    max_events=config.chat_resume_max_events,
+    grace_sec=config.chat_resume_grace_sec,
+    ttl_sec=config.chat_resume_ttl_sec,
+)
+chat_session_store.add_discard_listener(stream_resume.discard)
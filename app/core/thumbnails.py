@@ -0,0 +1,174 @@
+import io
+import os
+import shutil
+import asyncio
+import hashlib
+import multiprocessing
+from PIL import Image
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Iterable, Optional, Sequence, Set, Tuple
+
+from app.core.config import config
+from app.core.logger import get_logger
+
+
+logger = get_logger(__name__)
+type ThumbnailKey = Tuple[str, int, int, int, int, str]  # file, mtime, size, width, height, format
+
+THUMBNAIL_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+THUMBNAIL_MEDIA_TYPES = {"WEBP": "image/webp"}
+
+
+def snap_size(size: int, sizes: Sequence[int]) -> int:
+    """The smallest allowed size not below size, the largest one caps it"""
+    allowed = sorted(sizes)
+    return next((allowed_size for allowed_size in allowed if allowed_size >= size), allowed[-1])
+
+
+def render_thumbnail(path: str, width: int, height: int, format: str) -> bytes:
+    """Decode, downsize and encode one image, runs in a worker process"""
+    with Image.open(path) as img:
+        img.draft(None, (width, height))  # JPEG decodes at a reduced scale
+        img.thumbnail((width, height))
+        buf = io.BytesIO()
+        img.save(buf, format=format)
+        return buf.getvalue()
+
+
+class ThumbnailCache:
+    """
+    Thumbnails cached on disk and in a bounded in-memory LRU, keyed by the
+    source file's mtime and size so a replaced file gets new thumbnails.
+    Images are decoded and encoded off the event loop in a process pool.
+    """
+
+    def __init__(self, cache_dir: Path, max_entries: int = 1000, max_bytes: int = 32 * 1024 * 1024,
+                 workers: int = 2):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.workers = workers  # 0 renders in a thread instead
+        self._memory: OrderedDict[ThumbnailKey, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._inflight: Dict[ThumbnailKey, asyncio.Future] = {}
+        self._background: Set[asyncio.Task] = set()
+        self._pool: Optional[Executor] = None
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "renders": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(path: Path, width: int, height: int, format: str = "WEBP") -> ThumbnailKey:
+        filestat = path.stat()
+        return (path.name, filestat.st_mtime_ns, filestat.st_size, width, height, format)
+
+    @staticmethod
+    def etag(key: ThumbnailKey) -> str:
+        return '"' + hashlib.sha256(repr(key).encode()).hexdigest()[:32] + '"'
+
+    def _file_dir(self, filename: str) -> Path:
+        return self.cache_dir / hashlib.sha256(filename.encode()).hexdigest()[:16]
+
+    def _disk_path(self, key: ThumbnailKey) -> Path:
+        filename, mtime_ns, size, width, height, format = key
+        return self._file_dir(filename) / f"{mtime_ns}-{size}-{width}x{height}.{format.lower()}"
+
+    def _executor(self) -> Optional[Executor]:
+        if self.workers > 0 and self._pool is None:
+            # spawned workers do not inherit the server's threads and sockets
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def get(self, path: Path, width: int, height: int, format: str = "WEBP") -> Tuple[bytes, str]:
+        """Thumbnail bytes and ETag, rendered at most once per key at a time"""
+        key = self.make_key(path, width, height, format)
+        content = self._memory.get(key)
+        if content is not None:
+            self._memory.move_to_end(key)
+            self._counters["memory_hits"] += 1
+            return content, self.etag(key)
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(path, key))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future), self.etag(key)
+
+    async def _load(self, path: Path, key: ThumbnailKey) -> bytes:
+        disk_path = self._disk_path(key)
+        try:
+            content = await asyncio.to_thread(disk_path.read_bytes)
+            self._counters["disk_hits"] += 1
+        except FileNotFoundError:
+            _, _, _, width, height, format = key
+            loop = asyncio.get_running_loop()
+            content = await loop.run_in_executor(self._executor(), render_thumbnail, str(path), width, height, format)
+            self._counters["renders"] += 1
+            await asyncio.to_thread(self._write, disk_path, content)
+        self._remember(key, content)
+        return content
+
+    @staticmethod
+    def _write(disk_path: Path, content: bytes):
+        disk_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = disk_path.with_name(disk_path.name + ".tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, disk_path)  # readers never see a partial file
+
+    def _remember(self, key: ThumbnailKey, content: bytes):
+        if len(content) > self.max_bytes:
+            return
+        self._memory[key] = content
+        self._memory_bytes += len(content)
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._counters["evictions"] += 1
+
+    def pregenerate(self, path: Path, sizes: Iterable[int], filename: Optional[str] = None):
+        """Render common sizes in the background, e.g. after an upload"""
+        if Path(filename or path.name).suffix.lower() not in THUMBNAIL_EXTENSIONS:
+            return
+
+        async def render_all():
+            for size in sizes:
+                try:
+                    await self.get(path, size, size)
+                except Exception as e:
+                    logger.warning(f"Thumbnail {size}x{size} of {path.name} failed: {e}")
+                    return
+
+        task = asyncio.create_task(render_all())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def purge(self, filename: str):
+        """Drop the thumbnails of a deleted file"""
+        for key in [key for key in self._memory if key[0] == filename]:
+            self._memory_bytes -= len(self._memory.pop(key))
+        shutil.rmtree(self._file_dir(filename), ignore_errors=True)
+
+    def shutdown(self):
+        for task in self._background:
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "rendering": len(self._inflight),
+            **self._counters,
+        }
+
+
+# Global instance
+thumbnail_cache = ThumbnailCache(
+    cache_dir=Path(config.data_dir, "thumbnails"),
+    max_entries=config.thumbnail_cache_max_entries,
+    max_bytes=config.thumbnail_cache_max_bytes,
+    workers=config.thumbnail_workers,
+)
@@ -0,0 +1,175 @@
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import AsyncIterator, BinaryIO, Callable, List, Optional, Tuple
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from app.core.config import config
+from app.core.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class UploadTooLargeError(Exception):
+    def __init__(self, what: str, limit: int):
+        self.limit = limit
+        super().__init__(f"{what} exceeds the limit of {limit} bytes")
+
+
+class InvalidUploadError(Exception):
+    pass
+
+
+@dataclass
+class StoredUpload:
+    filename: str  # as sent by the client
+    path: Path  # final location, or the temp file when the caller places it
+    size: int
+    sha256: str
+    elapsed_sec: float
+
+
+@dataclass
+class _Part:
+    filename: Optional[str] = None
+    tmp_path: Optional[Path] = None
+    file: Optional[BinaryIO] = None
+    hasher: 'hashlib._Hash' = field(default_factory=hashlib.sha256)
+    size: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+
+def _write_chunk(file: BinaryIO, hasher: 'hashlib._Hash', data: bytes):
+    # both release the GIL on large buffers
+    hasher.update(data)
+    file.write(data)
+
+
+class MultipartUploadReceiver:
+    """
+    Streams the file parts of a multipart request to temp files in chunks,
+    hashing on the fly and enforcing size caps while the body arrives.
+    Completed files are moved into place with an atomic rename.
+    """
+
+    def __init__(self, tmp_dir: Path, max_file_bytes: int = 0, max_request_bytes: int = 0):
+        self.tmp_dir = Path(tmp_dir)
+        self.max_file_bytes = max_file_bytes  # 0 is unlimited
+        self.max_request_bytes = max_request_bytes
+
+    def check_content_length(self, content_length: Optional[str]):
+        """Reject an oversized request before reading its body"""
+        if self.max_request_bytes and content_length and content_length.isdigit():
+            if int(content_length) > self.max_request_bytes:
+                raise UploadTooLargeError("Request", self.max_request_bytes)
+
+    async def receive(self, content_type: str, body: AsyncIterator[bytes],
+                      place: Optional[Callable[[str], Path]] = None) -> List[StoredUpload]:
+        """
+        Store every file part, place maps a client filename to its final path.
+        Without place the temp files are returned, the caller moves or discards them.
+        """
+        media_type, params = parse_options_header(content_type)
+        if media_type != b"multipart/form-data" or b"boundary" not in params:
+            raise InvalidUploadError("Expected a multipart/form-data request")
+
+        # the parser callbacks are sync, they queue events handled after each chunk
+        events: List[Tuple[str, bytes]] = []
+        header_field, header_value = bytearray(), bytearray()
+
+        def on_header_end():
+            events.append(("header", bytes(header_field).lower() + b":" + bytes(header_value)))
+            header_field.clear()
+            header_value.clear()
+
+        callbacks = {
+            "on_part_begin": lambda: events.append(("begin", b"")),
+            "on_header_field": lambda data, start, end: header_field.extend(data[start:end]),
+            "on_header_value": lambda data, start, end: header_value.extend(data[start:end]),
+            "on_header_end": on_header_end,
+            "on_headers_finished": lambda: events.append(("headers_finished", b"")),
+            "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+            "on_part_end": lambda: events.append(("end", b"")),
+        }
+        parser = MultipartParser(params[b"boundary"], callbacks)
+
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        stored: List[StoredUpload] = []
+        part: Optional[_Part] = None
+        received = 0
+        try:
+            async for chunk in body:
+                received += len(chunk)
+                if self.max_request_bytes and received > self.max_request_bytes:
+                    raise UploadTooLargeError("Request", self.max_request_bytes)
+                parser.write(chunk)
+                pending = b""
+                for event, data in events:
+                    if event == "begin":
+                        part = _Part()
+                    elif event == "header" and data.startswith(b"content-disposition:"):
+                        _, disposition = parse_options_header(data.split(b":", 1)[1])
+                        if b"filename" in disposition:
+                            filename = Path(disposition[b"filename"].decode("utf-8", "replace")).name
+                            part.filename = filename if filename not in (".", "..") else None
+                    elif event == "headers_finished" and part.filename:
+                        part.tmp_path = self.tmp_dir / f"{uuid.uuid4().hex}.part"
+                        part.file = await asyncio.to_thread(open, part.tmp_path, "wb")
+                    elif event == "data" and part.file is not None:
+                        part.size += len(data)
+                        if self.max_file_bytes and part.size > self.max_file_bytes:
+                            raise UploadTooLargeError(f"File {part.filename}", self.max_file_bytes)
+                        pending += data
+                    elif event == "end" and part.file is not None:
+                        await asyncio.to_thread(_write_chunk, part.file, part.hasher, pending)
+                        pending = b""
+                        stored.append(await self._finish(part, place))
+                        part = None
+                events.clear()
+                if pending:
+                    await asyncio.to_thread(_write_chunk, part.file, part.hasher, pending)
+            parser.finalize()
+        except BaseException:
+            # nothing half written is left behind, placed files stay in place
+            if part is not None and part.file is not None:
+                await asyncio.to_thread(self._discard, part)
+            if place is None:
+                await self.discard(stored)
+            raise
+        return stored
+
+    async def _finish(self, part: _Part, place: Optional[Callable[[str], Path]]) -> StoredUpload:
+        await asyncio.to_thread(part.file.close)
+        path = part.tmp_path
+        if place is not None:
+            path = place(part.filename)
+            await asyncio.to_thread(os.replace, part.tmp_path, path)
+        elapsed = time.perf_counter() - part.started_at
+        upload = StoredUpload(part.filename, path, part.size, part.hasher.hexdigest(), elapsed)
+        logger.info(f"Uploaded {part.filename}: {part.size} bytes in {elapsed:.2f}s, "
+                    f"{part.size / max(elapsed, 1e-6) / 1e6:.1f} MB/s, sha256 {upload.sha256[:12]}")
+        return upload
+
+    @staticmethod
+    async def discard(uploads: List[StoredUpload]):
+        """Remove temp files the caller did not place"""
+        for upload in uploads:
+            await asyncio.to_thread(upload.path.unlink, True)
+
+    @staticmethod
+    def _discard(part: _Part):
+        part.file.close()
+        part.tmp_path.unlink(missing_ok=True)
+
+
+# Global instance, the temp dir shares the filesystem of the upload dir for the rename
+upload_receiver = MultipartUploadReceiver(
+    tmp_dir=Path(config.data_dir, "upload_tmp"),
+    max_file_bytes=config.upload_max_file_bytes,
+    max_request_bytes=config.upload_max_request_bytes,
+)
@@ -1,6 +1,6 @@
 import uuid
 from typing import Optional
-from fastapi import Request, Depends
+from fastapi import Request, Depends, WebSocket
 from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin
 from fastapi_users.authentication import BearerTransport, CookieTransport
 from fastapi_users.authentication import AuthenticationBackend, JWTStrategy
@@ -10,6 +10,7 @@ from fastapi_users.db import SQLAlchemyUserDatabase
 from app.core.config import config
 from app.core.logger import get_logger
 from app.core.email import UserEmailSchema, email_service
+from app.db.async_db import AsyncSessionLocal
 from app.models.user import User, get_user_db
 from app.schemas.user import UserCreate, UserUpdate
 
@@ -98,3 +99,26 @@ auth_backend = AuthenticationBackend(
 fastapi_users = FastAPIUsers[User, uuid.UUID](get_user_manager, [auth_backend])
 current_active_user = fastapi_users.current_user(active=True, verified=True)
 current_active_superuser = fastapi_users.current_user(active=True, verified=True, superuser=True)
+
+
+def websocket_token(websocket: WebSocket) -> Optional[str]:
+    """Auth cookie, bearer header or, for browsers that cannot set headers, token query"""
+    if isinstance(transport_type, CookieTransport):
+        token = websocket.cookies.get(transport_type.cookie_name)
+        if token:
+            return token
+    scheme, _, token = websocket.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token
+    return websocket.query_params.get("token")
+
+async def current_websocket_user(websocket: WebSocket) -> Optional[User]:
+    """current_active_user for websocket routes, None when not authenticated"""
+    token = websocket_token(websocket)
+    if not token:
+        return None
+    async with AsyncSessionLocal() as db:
+        user = await get_jwt_strategy().read_token(token, UserManager(SQLAlchemyUserDatabase(db, User)))
+    if user is None or not user.is_active or not user.is_verified:
+        return None
+    return user
@@ -1,3 +1,4 @@
+from sqlalchemy import Connection, func, inspect, select, text
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
 from app.core.config import config
@@ -32,9 +33,11 @@ class DbBase(DeclarativeBase):
 # These must be imported for SQLAlchemy to discover them for create all tables
 from app.models.user import User
 from app.models.document import Document
+from app.models.blob import Blob
 from app.models.notepad import Notepad
 from app.models.todo import Todo
 from app.models.expense import Expense
+from app.models.chat_session import ChatSessionArchive
 
 async def create_db_tables(rebuild: bool=False):
     async with async_engine.begin() as conn:
@@ -44,6 +47,26 @@ async def create_db_tables(rebuild: bool=False):
 
         logger.warning(f"Syncing database tables (creating new tables, existing data will be preserved)")
         await conn.run_sync(DbBase.metadata.create_all)
+        await conn.run_sync(upgrade_documents_table)
+
+def upgrade_documents_table(conn: Connection):
+    """Bring an older documents table up to date, create_all never alters tables"""
+    columns = {column["name"]: column for column in inspect(conn).get_columns(Document.__tablename__)}
+    if not columns["created_by"]["nullable"]:
+        rows = conn.execute(select(func.count()).select_from(Document.__table__)).scalar()
+        if rows == 0:
+            # the original upload never stored rows, the startup reconcile indexes the files again
+            logger.warning("Recreating the empty documents table with the current schema")
+            Document.__table__.drop(conn)
+            Document.__table__.create(conn)
+        elif conn.dialect.name == "postgresql":
+            conn.execute(text("ALTER TABLE documents ALTER COLUMN created_by DROP NOT NULL"))
+        else:
+            logger.error("documents.created_by must be nullable, set DATABASE_REBUILD or migrate the table")
+        columns = {column["name"]: column for column in inspect(conn).get_columns(Document.__tablename__)}
+    if "sha256" not in columns:
+        logger.warning("Adding the sha256 column to the documents table")
+        conn.execute(text("ALTER TABLE documents ADD COLUMN sha256 VARCHAR"))
 
 async def dispose_sync_db_engine():
     logger.info(f"Disposing async database engine")
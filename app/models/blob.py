@@ -0,0 +1,15 @@
+from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, Integer, String
+from app.db.async_db import DbBase
+
+
+class Blob(DbBase):
+    __tablename__ = "blobs"
+    sha256 = Column(String, primary_key=True, index=True)  # hex digest, names the file in the blob store
+    size = Column(Integer, nullable=False)
+    refcount = Column(Integer, default=0, nullable=False)  # active documents with this content
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False
+    )
@@ -0,0 +1,16 @@
+from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, Integer, String, Text
+from app.db.async_db import DbBase
+
+
+class ChatSessionArchive(DbBase):
+    __tablename__ = "chat_session_archives"
+    session_id = Column(String, primary_key=True, index=True)
+    messages = Column(Text, default="[]", nullable=False)  # JSON encoded message dicts
+    message_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        nullable=False
+    )
@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import declared_attr
 from app.db.async_db import DbBase
 from app.models.audit_mixin import AuditMixin
 
@@ -6,11 +8,17 @@ from app.models.audit_mixin import AuditMixin
 class Document(DbBase, AuditMixin):
     __tablename__ = "documents"
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    filename = Column(String, nullable=False)
+    filename = Column(String, nullable=False, index=True)
     filepath = Column(String, nullable=False)
     filesize = Column(Integer, nullable=False)
+    sha256 = Column(String, nullable=True)  # hex digest, computed while uploading
     
     category = Column(Integer, default=0, nullable=False)  # e.g., 0: personal, 1: work, etc.
     is_starred = Column(Integer, default=0, nullable=False)  # e.g., 0: no, 1: yes
     tags = Column(String, default="", nullable=False)  # Comma-separated tags
     description = Column(String, default="", nullable=False)
+
+    # uploads without auth and files found by the startup reconcile have no creator
+    @declared_attr
+    def created_by(cls):
+        return Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Literal, Optional
 
 
 class ChatRequest(BaseModel):
@@ -7,6 +7,25 @@ class ChatRequest(BaseModel):
     message: str
     session_id: str = ""
     system_prompt: Optional[str] = "You are a helpful and concise AI assistant."
+    history_max_tokens: Optional[int] = None # defaults to CHAT_HISTORY_MAX_TOKENS
+    use_cache: Optional[bool] = None # ask only, None caches when temperature is 0
+
+class MultiAskRequest(BaseModel):
+    llm_ids: list[int]
+    message: str
+    system_prompt: Optional[str] = "You are a helpful and concise AI assistant."
+    first_n: Optional[int] = None # stop after this many models answered
+
+class BatchAskRequest(BaseModel):
+    llm_id: int
+    messages: list[str]
+    system_prompt: Optional[str] = "You are a helpful and concise AI assistant."
+    max_concurrency: Optional[int] = None # capped by ASK_BATCH_MAX_CONCURRENCY
+
+class ChatSocketFrame(BaseModel):
+    type: Literal["request", "cancel"]
+    id: str # client chosen, tags every reply frame of the turn
+    request: Optional[ChatRequest] = None # for type request
 
 class ChatResponse(BaseModel):
     llm_id: int
@@ -8,6 +8,7 @@ class DocumentSchema(BaseModel):
     filename: str
     filepath: str
     filesize: Optional[str] = ""
+    sha256: Optional[str] = None
     
     category: Optional[int] = 0
     is_starred: Optional[int] = 0
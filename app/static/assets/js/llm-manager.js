@@ -4,7 +4,7 @@ let dataTable;
 let currentEntryId = null;
 let llms = [];
 
-const providerLabels = ['OpenAI', 'Anthropic', 'Azure OpenAI', 'Google AI', 'AWS Bedrock', 'Cohere', 'Mistral AI', 'Hugging Face', 'Local/Ollama', 'Other'];
+const providerLabels = ['OpenAI', 'Anthropic', 'Azure OpenAI', 'Google AI', 'AWS Bedrock', 'Cohere', 'Mistral AI', 'Hugging Face', 'Local/Ollama', 'Other', 'Local Fake'];
 const providerIcons = ['fa-robot', 'fa-brain', 'fa-microsoft', 'fa-google', 'fa-aws', 'fa-circle-nodes', 'fa-wind', 'fa-face-smile', 'fa-server', 'fa-ellipsis-h'];
 const providerColors = ['text-success', 'text-warning', 'text-info', 'text-primary', 'text-danger', 'text-secondary', 'text-info', 'text-warning', 'text-muted', 'text-secondary'];
 
@@ -106,6 +106,10 @@ function bindEvents() {
     $('#testConnectionBtn').on('click', function() {
         testConnection();
     });
+
+    $('#refreshTelemetryBtn').on('click', function() {
+        requestTelemetry();
+    });
 }
 
 function initDataTable() {
@@ -224,6 +228,7 @@ function requestGetEntries() {
             llms = data;
             dataTable.clear().rows.add(llms).draw();
             hideLoading();
+            requestTelemetry();
         },
         error: function(xhr, status, error) {
             hideLoading();
@@ -232,6 +237,59 @@ function requestGetEntries() {
     });
 }
 
+// Load per model telemetry, only available to admins
+function requestTelemetry() {
+    $.ajax({
+        url: `${API_BASE_URL}/llm-configs/telemetry`,
+        method: 'GET',
+        success: function(data) {
+            renderTelemetry(data);
+            $('#telemetryCard').removeClass('d-none');
+        },
+        error: function() {
+            $('#telemetryCard').addClass('d-none');
+        }
+    });
+}
+
+function formatPair(summary) {
+    if (!summary || summary.count === 0) return '-';
+    return `${summary.p50} / ${summary.p95}`;
+}
+
+function renderTelemetry(data) {
+    const modelRows = Object.entries(data.models).map(([llmId, stats]) => {
+        const llm = llms.find(l => l.id == llmId);
+        const title = llm ? llm.title : `#${llmId}`;
+        const errorClass = stats.error_rate >= 0.1 ? 'text-danger fw-bold' : '';
+        return `
+            <tr>
+                <td>${title}</td>
+                <td>${stats.requests}</td>
+                <td class="${errorClass}">${stats.failed} (${(stats.error_rate * 100).toFixed(1)}%)</td>
+                <td>${stats.cancelled}</td>
+                <td>${formatPair(stats.ttft_ms)}</td>
+                <td>${formatPair(stats.latency_ms)}</td>
+                <td>${stats.tokens_per_sec.count ? stats.tokens_per_sec.p50 : '-'}</td>
+                <td>${stats.usage.input_tokens}</td>
+                <td>${stats.usage.output_tokens}</td>
+            </tr>
+        `;
+    });
+    $('#telemetryTable tbody').html(modelRows.join('') || '<tr><td colspan="9" class="text-muted">No requests yet</td></tr>');
+
+    const userRows = Object.entries(data.users).map(([user, usage]) => `
+        <tr>
+            <td>${user}</td>
+            <td>${usage.requests}</td>
+            <td>${usage.input_tokens}</td>
+            <td>${usage.output_tokens}</td>
+            <td>${usage.total_tokens}</td>
+        </tr>
+    `);
+    $('#userUsageTable tbody').html(userRows.join('') || '<tr><td colspan="5" class="text-muted">No usage yet</td></tr>');
+}
+
 // View entry details
 function viewEntity(id) {
     showLoading();
@@ -0,0 +1,325 @@
+"""
+Chat streaming benchmark
+
+Starts the app on localhost in a background thread against a throwaway
+SQLite database, signs in a verified user, registers a Local Fake LLM config
+and opens N concurrent streaming requests per scenario. Reports time to first
+byte, inter-chunk latency percentiles, tokens/sec and the server event loop
+lag as JSON.
+
+Usage:
+    uv run benchmarks/bench_chat_stream.py --clients 50 --requests 4
+    uv run benchmarks/bench_chat_stream.py --endpoints chat --modes sse --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_DIR = Path(__file__).parent.parent
+BENCH_DIR = tempfile.mkdtemp(prefix="chat-bench-")
+
+# configure the app before it is imported, every run uses a fresh database
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{BENCH_DIR}/bench.db"
+os.environ["DATA_DIR"] = BENCH_DIR
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.chdir(PROJECT_DIR)
+sys.path.append(str(PROJECT_DIR))
+
+import httpx
+import uvicorn
+from fastapi_users.db import SQLAlchemyUserDatabase
+from app.app import app, API_PREFIX
+from app.core.llm_cache import LlmProviderType, llm_cache
+from app.core.users import UserManager
+from app.db.async_db import AsyncSessionLocal
+from app.models.llm_config import LlmConfig
+from app.models.user import User
+from app.schemas.user import UserCreate
+
+
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+LAG_SAMPLE_SEC = 0.01
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+    return {
+        "count": len(ordered),
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes up a periodic timer"""
+
+    def __init__(self, interval: float = LAG_SAMPLE_SEC):
+        self.interval = interval
+        self.samples: List[float] = []
+
+    async def run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append((time.perf_counter() - start - self.interval) * 1000)
+
+    def reset(self):
+        self.samples = []
+
+
+class ServerThread(threading.Thread):
+    """Runs uvicorn with its own event loop so client load is not measured as server lag"""
+
+    def __init__(self, port: int):
+        super().__init__(daemon=True)
+        self.port = port
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.lag_monitor = LoopLagMonitor()
+        self.server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=port, log_level="warning", lifespan="on",
+        ))
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._serve())
+
+    async def _serve(self):
+        lag_task = asyncio.create_task(self.lag_monitor.run())
+        await self.server.serve()
+        lag_task.cancel()
+
+    def call(self, coro, timeout: float = 30):
+        """Run a coroutine on the server loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def wait_started(self, timeout: float = 30):
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.is_alive():
+                raise RuntimeError("Benchmark server failed to start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.join(timeout=10)
+
+
+async def seed_database(args) -> int:
+    async with AsyncSessionLocal() as session:
+        user_manager = UserManager(SQLAlchemyUserDatabase(session, User))
+        user = await user_manager.create(UserCreate(
+            email=BENCH_EMAIL,
+            password=BENCH_PASSWORD,
+            is_active=True,
+            is_verified=True,
+        ), safe=False)
+
+        endpoint = (
+            f"fake://local?ttft_ms={args.ttft_ms}&tokens_per_sec={args.tokens_per_sec}"
+            f"&response_tokens={args.response_tokens}&error_rate={args.error_rate}"
+        )
+        llm = LlmConfig(
+            provider=LlmProviderType.LOCAL_FAKE,
+            category=0,
+            is_active=True,
+            title="Benchmark Fake",
+            model_name="bench-fake",
+            temperature=0,
+            api_endpoint=endpoint,
+            api_key="",
+            created_by=user.id,
+        )
+        session.add(llm)
+        await session.commit()
+        await session.refresh(llm)
+    await llm_cache.refresh()
+    return llm.id
+
+
+async def login(client: httpx.AsyncClient):
+    resp = await client.post(
+        f"{API_PREFIX}/auth/jwt/login",
+        data={"username": BENCH_EMAIL, "password": BENCH_PASSWORD},
+    )
+    resp.raise_for_status()
+    if resp.content and "access_token" in resp.text:  # bearer transport
+        client.headers["Authorization"] = f"Bearer {resp.json()['access_token']}"
+
+
+def stream_text(body: str, event_stream: bool) -> str:
+    if not event_stream:
+        return body
+    lines = []
+    for event in body.split("\n\n"):
+        data = [line[5:].removeprefix(" ") for line in event.split("\n") if line.startswith("data:")]
+        if data:
+            lines.append("\n".join(data))
+    return "".join(lines)
+
+
+async def stream_once(client: httpx.AsyncClient, path: str, payload: dict, event_stream: bool) -> dict:
+    result = {"ok": False, "ttfb_ms": None, "gaps_ms": [], "chunks": 0, "tokens": 0}
+    params = {"event_stream": "true"} if event_stream else {}
+    start = time.perf_counter()
+    try:
+        async with client.stream("POST", path, json=payload, params=params) as resp:
+            if resp.status_code != 200:
+                result["error"] = f"HTTP {resp.status_code}"
+                return result
+            body = []
+            last = None
+            async for chunk in resp.aiter_raw():
+                now = time.perf_counter()
+                if last is None:
+                    result["ttfb_ms"] = (now - start) * 1000
+                else:
+                    result["gaps_ms"].append((now - last) * 1000)
+                last = now
+                result["chunks"] += 1
+                body.append(chunk)
+        text = stream_text(b"".join(body).decode("utf-8", errors="replace"), event_stream)
+        result["tokens"] = len(text.split())
+        result["ok"] = True
+    except httpx.HTTPError as e:
+        result["error"] = type(e).__name__
+    return result
+
+
+async def run_scenario(server: ServerThread, base_url: str, llm_id: int, endpoint: str, mode: str, args) -> dict:
+    event_stream = mode == "sse"
+    path = f"{API_PREFIX}/{endpoint}/stream"
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    timeout = httpx.Timeout(args.timeout)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        await login(client)
+
+        async def client_loop(client_idx: int) -> List[dict]:
+            results = []
+            for request_idx in range(args.requests):
+                payload = {
+                    "llm_id": llm_id,
+                    "message": f"benchmark prompt {client_idx}-{request_idx}",
+                    "session_id": f"bench_{endpoint}_{mode}_{client_idx:04d}",
+                }
+                results.append(await stream_once(client, path, payload, event_stream))
+            return results
+
+        server.loop.call_soon_threadsafe(server.lag_monitor.reset)
+        start = time.perf_counter()
+        per_client = await asyncio.gather(*(client_loop(i) for i in range(args.clients)))
+        wall_sec = time.perf_counter() - start
+        lag_samples = list(server.lag_monitor.samples)
+
+    results = [r for client_results in per_client for r in client_results]
+    succeeded = [r for r in results if r["ok"]]
+    tokens = sum(r["tokens"] for r in succeeded)
+    errors: Dict[str, int] = {}
+    for r in results:
+        if not r["ok"]:
+            errors[r.get("error", "unknown")] = errors.get(r.get("error", "unknown"), 0) + 1
+
+    return {
+        "endpoint": endpoint,
+        "mode": mode,
+        "clients": args.clients,
+        "requests": len(results),
+        "succeeded": len(succeeded),
+        "errors": errors,
+        "wall_sec": round(wall_sec, 3),
+        "tokens": tokens,
+        "tokens_per_sec": round(tokens / wall_sec, 1) if wall_sec else 0,
+        "chunks_per_response": percentiles([r["chunks"] for r in succeeded]),
+        "ttfb_ms": percentiles([r["ttfb_ms"] for r in succeeded if r["ttfb_ms"] is not None]),
+        "inter_chunk_ms": percentiles([gap for r in succeeded for gap in r["gaps_ms"]]),
+        "loop_lag_ms": percentiles(lag_samples),
+    }
+
+
+async def run_benchmark(server: ServerThread, llm_id: int, args) -> dict:
+    base_url = f"http://127.0.0.1:{server.port}"
+    scenarios = []
+    for endpoint in args.endpoints:
+        for mode in args.modes:
+            scenario = await run_scenario(server, base_url, llm_id, endpoint, mode, args)
+            scenarios.append(scenario)
+            print(
+                f"{endpoint}/{mode}: {scenario['succeeded']}/{scenario['requests']} ok, "
+                f"ttfb p50={scenario['ttfb_ms'].get('p50')} ms, "
+                f"gap p99={scenario['inter_chunk_ms'].get('p99')} ms, "
+                f"{scenario['tokens_per_sec']} tokens/s, "
+                f"loop lag p99={scenario['loop_lag_ms'].get('p99')} ms",
+                file=sys.stderr,
+            )
+    return {
+        "benchmark": "chat_stream",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "model": {
+            "ttft_ms": args.ttft_ms,
+            "tokens_per_sec": args.tokens_per_sec,
+            "response_tokens": args.response_tokens,
+            "error_rate": args.error_rate,
+        },
+        "scenarios": scenarios,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark /chat/stream and /ask/stream")
+    parser.add_argument("--clients", type=int, default=20, help="concurrent streaming clients")
+    parser.add_argument("--requests", type=int, default=3, help="sequential requests per client")
+    parser.add_argument("--endpoints", nargs="+", choices=["ask", "chat"], default=["ask", "chat"])
+    parser.add_argument("--modes", nargs="+", choices=["sse", "plain"], default=["sse", "plain"])
+    parser.add_argument("--ttft-ms", type=float, default=50)
+    parser.add_argument("--tokens-per-sec", type=float, default=200)
+    parser.add_argument("--response-tokens", type=int, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=60, help="per request timeout in seconds")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    args = parse_args(argv)
+    server = ServerThread(free_port())
+    server.start()
+    try:
+        server.wait_started()
+        llm_id = server.call(seed_database(args))
+        report = asyncio.run(run_benchmark(server, llm_id, args))
+    finally:
+        server.stop()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Chat chain construction microbenchmark
+
+Measures what create_chain costs per chat request when the prompt template,
+pipeline and RunnableWithMessageHistory are built from scratch compared to
+the cached chain, alone and including a full turn against a zero latency
+Local Fake LLM. Reports microseconds per request as JSON.
+
+Usage:
+    uv run benchmarks/bench_create_chain.py --iterations 2000
+    uv run benchmarks/bench_create_chain.py --turns 500 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict
+
+PROJECT_DIR = Path(__file__).parent.parent
+BENCH_DIR = tempfile.mkdtemp(prefix="chain-bench-")
+
+# configure the app before it is imported
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{BENCH_DIR}/bench.db"
+os.environ["DATA_DIR"] = BENCH_DIR
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.chdir(PROJECT_DIR)
+sys.path.append(str(PROJECT_DIR))
+
+from app.app import app  # noqa: F401, resolves the import order of the api modules
+from app.api.chatbot import build_chain, create_chain
+from app.core.chain_cache import chain_cache
+from app.core.chat_sessions import chat_session_store
+from app.core.fake_llm import FakeStreamingChatModel
+from app.core.llm_cache import llm_cache
+from app.schemas.chatbot import ChatRequest
+
+
+BENCH_LLM_ID = 1
+SYSTEM_PROMPT = "You are a helpful and concise AI assistant."
+
+
+def uncached_chain(request: ChatRequest):
+    """create_chain as it was before the chain cache"""
+    llm = llm_cache.get_llm_instance(request.llm_id)
+    return build_chain(llm, request.system_prompt, 4000)
+
+
+def time_construction(factory: Callable, request: ChatRequest, iterations: int) -> float:
+    factory(request)  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        factory(request)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def time_turns(factory: Callable, request: ChatRequest, turns: int) -> float:
+    config = {"configurable": {"session_id": request.session_id}}
+    await factory(request).ainvoke({"input": "warm up"}, config=config)
+    start = time.perf_counter()
+    for i in range(turns):
+        # a short history keeps the measurement about construction, not prompt size
+        if i % 10 == 0:
+            chat_session_store.delete(request.session_id)
+        await factory(request).ainvoke({"input": f"question {i}"}, config=config)
+    return (time.perf_counter() - start) / turns * 1e6
+
+
+async def run(args) -> Dict[str, Dict[str, float]]:
+    llm_cache._llm_instances[BENCH_LLM_ID] = FakeStreamingChatModel(
+        ttft_ms=0, tokens_per_sec=0, response_tokens=5)
+    request = ChatRequest(llm_id=BENCH_LLM_ID, message="", session_id="bench_01",
+                          system_prompt=SYSTEM_PROMPT)
+    results = {}
+    for name, factory in (("uncached", uncached_chain), ("cached", create_chain)):
+        results[name] = {
+            "construct_us": round(time_construction(factory, request, args.iterations), 1),
+            "turn_us": round(await time_turns(factory, request, args.turns), 1),
+        }
+    results["speedup"] = {
+        key: round(results["uncached"][key] / max(results["cached"][key], 1e-9), 2)
+        for key in ("construct_us", "turn_us")
+    }
+    results["chain_cache"] = chain_cache.stats()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat chain construction microbenchmark")
+    parser.add_argument("--iterations", type=int, default=2000, help="chain constructions per variant")
+    parser.add_argument("--turns", type=int, default=300, help="full chat turns per variant")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    print(report)
+    if args.output:
+        Path(args.output).write_text(report)
+
+
+if __name__ == "__main__":
+    main()
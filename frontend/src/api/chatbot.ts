@@ -1,5 +1,10 @@
 import { apiClient, API_BASE } from './client';
-import type { ChatHistory, ChatRequest, ChatResponse, ChatSession, ChatSessionResponse } from '@/types';
+import type {
+  ChatHistory, ChatRequest, ChatResponse, ChatSession, ChatSessionResponse,
+  ChatSocketEvent, MultiAskEvent, MultiAskRequest,
+} from '@/types';
+
+const MAX_STREAM_RESUMES = 3;
 
 export const chatbotApi = {
   ask: async (payload: ChatRequest): Promise<ChatResponse> => {
@@ -37,7 +42,77 @@ export const chatbotApi = {
   ): Promise<string> {
     const path = opts.persistent ? '/chat/stream' : '/ask/stream';
     const url = `${API_BASE}${path}?event_stream=true`;
-    const resp = await fetch(url, {
+    let fullText = '';
+    let lastEventId = '';
+    // persistent streams resume from the last received event after a network error
+    for (let attempt = 0; ; attempt++) {
+      const headers: Record<string, string> = {
+        'Content-Type': 'application/json',
+        Accept: 'text/event-stream',
+      };
+      if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+      let resp: Response;
+      try {
+        resp = await fetch(url, {
+          method: 'POST',
+          credentials: 'include',
+          headers,
+          body: JSON.stringify(payload),
+          signal: opts.signal,
+        });
+      } catch (err) {
+        if (!opts.persistent || !lastEventId || opts.signal?.aborted || attempt >= MAX_STREAM_RESUMES) throw err;
+        await new Promise((resolve) => setTimeout(resolve, 500 * (attempt + 1)));
+        continue;
+      }
+      if (!resp.ok || !resp.body) {
+        throw new Error(`Stream failed: ${resp.status} ${resp.statusText}`);
+      }
+      const reader = resp.body.getReader();
+      const decoder = new TextDecoder('utf-8');
+      let buffer = '';
+      try {
+        // eslint-disable-next-line no-constant-condition
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) return fullText;
+          buffer += decoder.decode(value, { stream: true });
+          // SSE: chunks separated by \n\n; lines starting with "data: "
+          let idx;
+          while ((idx = buffer.indexOf('\n\n')) >= 0) {
+            const event = buffer.slice(0, idx);
+            buffer = buffer.slice(idx + 2);
+            const idLine = event.split('\n').find((line) => line.startsWith('id:'));
+            if (idLine) lastEventId = idLine.slice(3).trim();
+            // multi-line payloads arrive as one data field per line
+            const lines = event
+              .split('\n')
+              .filter((line) => line.startsWith('data:'))
+              .map((line) => line.slice(line.startsWith('data: ') ? 6 : 5));
+            if (lines.length === 0) continue;
+            const data = lines.join('\n');
+            if (data === '[DONE]') continue;
+            fullText += data;
+            opts.onChunk(data);
+          }
+        }
+      } catch (err) {
+        if (!opts.persistent || !lastEventId || opts.signal?.aborted || attempt >= MAX_STREAM_RESUMES) throw err;
+      } finally {
+        reader.releaseLock();
+      }
+    }
+  },
+
+  /**
+   * Ask several LLMs at once. Calls onEvent for every tagged event as it arrives,
+   * returns the llm_ids that completed in finish order.
+   */
+  async askMulti(
+    payload: MultiAskRequest,
+    opts: { signal?: AbortSignal; onEvent: (event: MultiAskEvent) => void }
+  ): Promise<number[]> {
+    const resp = await fetch(`${API_BASE}/ask/multi`, {
       method: 'POST',
       credentials: 'include',
       headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
@@ -50,31 +125,59 @@ export const chatbotApi = {
     const reader = resp.body.getReader();
     const decoder = new TextDecoder('utf-8');
     let buffer = '';
-    let fullText = '';
+    let completed: number[] = [];
     try {
       // eslint-disable-next-line no-constant-condition
       while (true) {
         const { done, value } = await reader.read();
         if (done) break;
         buffer += decoder.decode(value, { stream: true });
-        // SSE: chunks separated by \n\n; lines starting with "data: "
         let idx;
         while ((idx = buffer.indexOf('\n\n')) >= 0) {
-          const event = buffer.slice(0, idx);
+          const frame = buffer.slice(0, idx);
           buffer = buffer.slice(idx + 2);
-          for (const line of event.split('\n')) {
-            if (line.startsWith('data:')) {
-              const data = line.slice(5).trimStart();
-              if (data === '[DONE]') continue;
-              fullText += data;
-              opts.onChunk(data);
-            }
+          let name = 'message';
+          let data = '';
+          for (const line of frame.split('\n')) {
+            if (line.startsWith('event:')) name = line.slice(6).trim();
+            else if (line.startsWith('data:')) data += line.slice(line.startsWith('data: ') ? 6 : 5);
           }
+          if (!data) continue;
+          const parsed = JSON.parse(data);
+          if (name === 'end') completed = parsed.completed;
+          else opts.onEvent({ ...parsed, event: name });
         }
       }
     } finally {
       reader.releaseLock();
     }
-    return fullText;
+    return completed;
   },
 };
+
+/**
+ * One websocket carrying chat turns for several sessions. Frames of every turn
+ * are tagged with the turn id passed to send().
+ */
+export function openChatSocket(onEvent: (event: ChatSocketEvent) => void): {
+  send: (id: string, payload: ChatRequest) => void;
+  cancel: (id: string) => void;
+  close: () => void;
+} {
+  const base = new URL(`${API_BASE}/chat/ws`, window.location.href);
+  base.protocol = base.protocol === 'https:' ? 'wss:' : 'ws:';
+  const socket = new WebSocket(base.toString());
+  const queued: string[] = [];
+  socket.onopen = () => queued.splice(0).forEach((frame) => socket.send(frame));
+  socket.onmessage = (msg) => onEvent(JSON.parse(msg.data));
+  const post = (frame: object) => {
+    const data = JSON.stringify(frame);
+    if (socket.readyState === WebSocket.OPEN) socket.send(data);
+    else queued.push(data);
+  };
+  return {
+    send: (id, payload) => post({ type: 'request', id, request: payload }),
+    cancel: (id) => post({ type: 'cancel', id }),
+    close: () => socket.close(),
+  };
+}
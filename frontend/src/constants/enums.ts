@@ -66,6 +66,7 @@ export const LLM_PROVIDERS = [
   { value: 3, label: 'Google' },
   { value: 4, label: 'Ollama' },
   { value: 5, label: 'Other' },
+  { value: 10, label: 'Local Fake' },
 ];
 
 export const LLM_CATEGORIES = [
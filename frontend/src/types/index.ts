@@ -143,3 +143,24 @@ export interface ChatRequest {
   session_id?: string;
   system_prompt?: string;
 }
+
+export interface MultiAskRequest {
+  llm_ids: number[];
+  message: string;
+  system_prompt?: string;
+  first_n?: number;
+}
+
+export type ChatSocketEvent =
+  | { type: 'chunk'; id: string; text: string }
+  | { type: 'done'; id: string; finish_reason: 'stop' | 'cancelled' }
+  | { type: 'error'; id: string | null; status: number; detail: unknown };
+
+export interface MultiAskEvent {
+  event: 'chunk' | 'done' | 'error' | 'cancelled';
+  llm_id: number;
+  text?: string;
+  detail?: string;
+  latency_ms?: number;
+  ttft_ms?: number;
+}
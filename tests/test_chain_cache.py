@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from app.core.chain_cache import ChainCache, chain_cache, prompt_hash
+from app.core.fake_llm import FakeStreamingChatModel
+from app.core.llm_cache import llm_cache
+
+
+def test_chains_are_reused_until_the_llm_instance_changes():
+    cache = ChainCache(max_entries=10)
+    llm = FakeStreamingChatModel()
+    key = (1, prompt_hash("be brief"), 4000)
+    first = cache.get_or_build(key, llm, object)
+    assert cache.get_or_build(key, llm, object) is first
+    assert cache.get_or_build((1, prompt_hash("be verbose"), 4000), llm, object) is not first
+
+    # a reloaded LLM config comes with a new instance
+    assert cache.get_or_build(key, FakeStreamingChatModel(), object) is not first
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 3
+
+
+def test_lru_eviction():
+    cache = ChainCache(max_entries=2)
+    llm = FakeStreamingChatModel()
+    for llm_id in (1, 2, 1, 3):
+        cache.get_or_build((llm_id, "", 0), llm, object)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_llm_cache_invalidation_drops_chains():
+    llm = FakeStreamingChatModel()
+    chain_cache.get_or_build((9201, "", 0), llm, object)
+    chain_cache.get_or_build((9202, "", 0), llm, object)
+    entries = chain_cache.stats()["entries"]
+
+    llm_cache.invalidate(9201)
+    assert chain_cache.stats()["entries"] == entries - 1
+    llm_cache.invalidate()
+    assert chain_cache.stats()["entries"] == 0
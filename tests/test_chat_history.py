@@ -0,0 +1,103 @@
+import sys
+import asyncio
+import pytest
+from pathlib import Path
+from typing import Any, List, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from app.core.chat_history import HistorySummarizer, count_tokens, is_summary, window_history
+from app.core.chat_sessions import InMemoryChatSessionStore
+from app.core.llm_scheduler import LlmScheduler
+
+
+class SummaryChatModel(BaseChatModel):
+    """Answers every call with a fixed summary after a short delay"""
+    delay_sec: float = 0.05
+    calls: List[List[BaseMessage]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "summary-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        raise NotImplementedError
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        self.calls.append(messages)
+        await asyncio.sleep(self.delay_sec)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="user likes foxes"))])
+
+
+def turns(count: int, size: int = 200) -> List[BaseMessage]:
+    messages = []
+    for i in range(count):
+        messages.append(HumanMessage(content=f"question {i} " + "q" * size))
+        messages.append(AIMessage(content=f"answer {i} " + "a" * size))
+    return messages
+
+
+def test_window_keeps_recent_turns_within_budget():
+    messages = turns(20)
+    window = window_history(messages, 300)
+    assert 0 < len(window) < len(messages)
+    assert count_tokens(window) <= 300
+    assert window[0].type == "human"
+    assert window[-1] is messages[-1]
+    assert window_history(messages, 0) == messages
+
+
+def test_window_always_keeps_the_summary():
+    summary = SystemMessage(content="earlier: user likes foxes", additional_kwargs={"summary": True})
+    messages = [summary, *turns(20)]
+    window = window_history(messages, 300)
+    assert window[0] is summary
+    assert window[1].type == "human"
+    assert count_tokens(window) <= 300
+
+
+@pytest.mark.asyncio
+async def test_summarizer_compacts_old_turns_and_keeps_new_ones():
+    store = InMemoryChatSessionStore(max_sessions=10, ttl_sec=0)
+    history = store.get_or_create("s1")
+    history.add_messages(turns(20))
+    summarizer = HistorySummarizer(enabled=True, trigger_tokens=1000, keep_tokens=300,
+                                   scheduler=LlmScheduler())
+    llm = SummaryChatModel(calls=[])
+
+    task = summarizer.maybe_schedule("s1", history, llm, 1)
+    assert task is not None
+    # a second trigger while running is ignored
+    assert summarizer.maybe_schedule("s1", history, llm, 1) is None
+    # a turn finishing while the summary is generated must survive
+    late_turn = turns(1)
+    history.add_messages(late_turn)
+    await task
+
+    messages = history.messages
+    assert is_summary(messages[0])
+    assert "user likes foxes" in messages[0].content
+    assert messages[1].type == "human"
+    assert messages[-2:] == late_turn
+    assert count_tokens(messages) < 1000
+    assert store.stats()["messages"] == len(messages)
+    assert summarizer.stats()["completed"] == 1
+    assert len(llm.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_summary_is_dropped_when_session_was_cleared():
+    store = InMemoryChatSessionStore(max_sessions=10, ttl_sec=0)
+    history = store.get_or_create("s1")
+    history.add_messages(turns(20))
+    summarizer = HistorySummarizer(enabled=True, trigger_tokens=1000, keep_tokens=300,
+                                   scheduler=LlmScheduler())
+
+    task = summarizer.maybe_schedule("s1", history, SummaryChatModel(calls=[]), 1)
+    history.clear()
+    await task
+    assert history.messages == []
+    assert summarizer.stats()["skipped"] == 1
@@ -0,0 +1,149 @@
+import sys
+import asyncio
+import pytest
+from pathlib import Path
+from langchain_core.messages import AIMessage, HumanMessage
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from app.db.async_db import DbBase
+from app.core import chat_sessions
+from app.models.chat_session import ChatSessionArchive
+from app.core.chat_sessions import (
+    ChatSessionRegistry,
+    ChatSessionStore,
+    InMemoryChatSessionStore,
+    message_size,
+)
+
+
+def add_turn(store: InMemoryChatSessionStore, session_id: str, text: str = "hello"):
+    history = store.get_or_create(session_id)
+    history.add_messages([HumanMessage(content=text), AIMessage(content=text)])
+
+
+def test_message_and_byte_counters():
+    store = InMemoryChatSessionStore()
+    add_turn(store, "alice_01", "hi")
+    add_turn(store, "alice_01", "there")
+
+    stats = store.stats()
+    assert stats["sessions"] == 1
+    assert stats["messages"] == 4
+    assert stats["bytes"] == sum(message_size(m) for m in store.peek("alice_01").messages)
+
+    store.peek("alice_01").clear()
+    assert store.stats()["messages"] == 0
+    assert store.stats()["bytes"] == 0
+
+
+def test_lru_eviction_on_message_cap():
+    store = InMemoryChatSessionStore(max_messages=4)
+    add_turn(store, "s1")
+    add_turn(store, "s2")
+    store.get("s1")  # s2 becomes least recently used
+    add_turn(store, "s3")
+
+    assert store.session_ids() == ["s1", "s3"]
+    assert store.stats()["evictions"] == 1
+    assert store.stats()["messages"] == 4
+
+
+def test_session_cap_never_evicts_active_session():
+    store = InMemoryChatSessionStore(max_sessions=1, max_bytes=1)
+    add_turn(store, "s1", "x" * 100)
+    assert store.session_ids() == ["s1"]
+
+    add_turn(store, "s2")
+    assert store.session_ids() == ["s2"]
+
+
+def test_idle_sessions_expire():
+    store = InMemoryChatSessionStore(ttl_sec=60)
+    add_turn(store, "s1")
+    store.peek("s1")  # peek does not refresh the idle timer
+    store._entries["s1"].last_access -= 120
+
+    assert not store.contains("s1")
+    assert store.session_ids() == []
+    assert store.stats()["expirations"] == 1
+    assert store.stats()["messages"] == 0
+
+
+def test_evicted_session_is_spilled_and_restored():
+    store = InMemoryChatSessionStore(max_sessions=1, spill_enable=True)
+    add_turn(store, "s1", "remember me")
+    add_turn(store, "s2")
+
+    assert not store.contains("s1")
+    assert store.stats()["spills"] == 1
+
+    assert asyncio.run(store.restore("s1"))
+    messages = store.peek("s1").messages
+    assert [m.content for m in messages] == ["remember me", "remember me"]
+    assert store.stats()["restores"] == 1
+
+
+def test_registry_keeps_users_with_shared_prefix_apart():
+    store = InMemoryChatSessionStore()
+    registry = ChatSessionRegistry(store)
+    assert registry.create_session("user-1", "bob") == "bob_01"
+    assert registry.create_session("user-2", "bobby") == "bobby_01"
+    assert registry.create_session("user-1", "bob") == "bob_02"
+
+    assert registry.user_sessions("user-1") == ["bob_01", "bob_02"]
+    assert registry.user_sessions("user-2") == ["bobby_01"]
+
+
+def test_registry_counter_is_monotonic_and_ids_unique():
+    store = InMemoryChatSessionStore()
+    registry = ChatSessionRegistry(store)
+    registry.create_session("user-1", "bob")
+    registry.create_session("user-1", "bob")
+    store.delete("bob_02")
+    assert registry.user_sessions("user-1") == ["bob_01"]
+    assert registry.create_session("user-1", "bob") == "bob_03"
+
+    # same email local-part on a different domain
+    assert registry.create_session("user-2", "bob") == "bob_02"
+    assert registry.owner("bob_02") == "user-2"
+
+
+def test_registry_follows_store_expiry_and_pagination():
+    store = InMemoryChatSessionStore(ttl_sec=60)
+    registry = ChatSessionRegistry(store)
+    for _ in range(3):
+        registry.create_session("user-1", "amy")
+    store._entries["amy_01"].last_access -= 120
+
+    assert registry.user_sessions("user-1") == ["amy_02", "amy_03"]
+    assert store.session_count() == 2
+    assert store.session_ids(offset=1, limit=5) == ["amy_03"]
+
+
+def test_incomplete_store_fails_at_construction():
+    class PartialStore(ChatSessionStore):
+        def get(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+
+@pytest.mark.asyncio
+async def test_registry_skips_ids_archived_before_a_restart(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'sessions.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(DbBase.metadata.create_all)
+    monkeypatch.setattr(chat_sessions, "AsyncSessionLocal", async_sessionmaker(engine, expire_on_commit=False))
+    async with chat_sessions.AsyncSessionLocal() as db:
+        db.add(ChatSessionArchive(session_id="bob_01", messages="[]"))
+        await db.commit()
+
+    # a restarted worker
+    store = InMemoryChatSessionStore(spill_enable=True)
+    await store.load_archive_index()
+    registry = ChatSessionRegistry(store)
+    assert registry.create_session("user-1", "bob") == "bob_02"
+    await engine.dispose()
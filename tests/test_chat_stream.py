@@ -0,0 +1,119 @@
+import sys
+import asyncio
+import pytest
+from pathlib import Path
+from typing import List, Tuple
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from app.core.chat_stream import StreamFlushPolicy, coalesce_chunks, fan_out, format_sse_event
+
+
+async def timed_chunks(items: List[Tuple[float, str]]):
+    for delay, text in items:
+        await asyncio.sleep(delay)
+        yield text
+
+
+async def collect(chunks, policy: StreamFlushPolicy) -> List[str]:
+    return [text async for text in coalesce_chunks(chunks, policy)]
+
+
+@pytest.mark.asyncio
+async def test_fast_chunks_are_coalesced_by_size():
+    chunks = timed_chunks([(0, "abcd")] * 10)
+    out = await collect(chunks, StreamFlushPolicy(max_bytes=16, max_delay_ms=1000))
+    assert out == ["abcd" * 4, "abcd" * 4, "abcd" * 2]
+
+
+@pytest.mark.asyncio
+async def test_deadline_flushes_while_upstream_is_slow():
+    chunks = timed_chunks([(0, "a"), (0, "b"), (0.2, "c")])
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    arrivals = []
+    async for text in coalesce_chunks(chunks, StreamFlushPolicy(max_bytes=1024, max_delay_ms=20)):
+        arrivals.append((text, loop.time() - start))
+
+    assert [text for text, _ in arrivals] == ["ab", "c"]
+    # "ab" must not wait for the slow third chunk
+    assert arrivals[0][1] < 0.1
+
+
+@pytest.mark.asyncio
+async def test_disabled_policy_passes_chunks_through():
+    chunks = timed_chunks([(0, "a"), (0, "b")])
+    assert await collect(chunks, StreamFlushPolicy(max_bytes=64, max_delay_ms=0)) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("policy", [StreamFlushPolicy(max_bytes=1024, max_delay_ms=20),
+                                    StreamFlushPolicy(max_bytes=64, max_delay_ms=0)])
+async def test_closing_the_coalescer_closes_the_upstream_at_once(policy):
+    closed = asyncio.Event()
+
+    async def upstream():
+        try:
+            yield "a"
+            await asyncio.sleep(10)  # the model is still generating
+            yield "b"
+        finally:
+            closed.set()  # releases the LLM slot and finishes the trace
+
+    coalesced = coalesce_chunks(upstream(), policy)
+    assert await anext(coalesced) == "a"
+    await coalesced.aclose()
+    assert closed.is_set()
+
+
+@pytest.mark.asyncio
+async def test_upstream_errors_propagate():
+    async def failing():
+        yield "a"
+        raise RuntimeError("provider failed")
+
+    with pytest.raises(RuntimeError):
+        await collect(failing(), StreamFlushPolicy())
+
+
+@pytest.mark.asyncio
+async def test_fan_out_interleaves_and_reports_errors():
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider failed")
+        yield
+
+    streams = {
+        1: timed_chunks([(0, "a1"), (0.05, "a2")]),
+        2: timed_chunks([(0.02, "b1")]),
+        3: failing(),
+    }
+    events = [(e.key, e.event, e.text) async for e in fan_out(streams)]
+    assert events == [
+        (1, "chunk", "a1"), (3, "error", "provider failed"), (2, "chunk", "b1"),
+        (2, "done", ""), (1, "chunk", "a2"), (1, "done", ""),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_fan_out_first_n_cancels_the_rest():
+    cancelled = asyncio.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+            yield "late"
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    streams = {1: slow(), 2: timed_chunks([(0.01, "fast")])}
+    events = [(e.key, e.event) async for e in fan_out(streams, first_n=1)]
+    assert events == [(2, "chunk"), (2, "done"), (1, "cancelled")]
+    assert cancelled.is_set()
+
+
+def test_sse_framing_of_multiline_data():
+    assert format_sse_event("hello") == "data: hello\n\n"
+    assert format_sse_event("line 1\n\nline 3\r\n") == "data: line 1\ndata: \ndata: line 3\ndata: \n\n"
+    assert format_sse_event("x", event="chunk", event_id="7") == "id: 7\nevent: chunk\ndata: x\n\n"
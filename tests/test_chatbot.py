@@ -0,0 +1,360 @@
+import sys
+import json
+import time
+import uuid
+import asyncio
+import pytest
+from pathlib import Path
+from typing import Any, List, Optional
+from httpx import ASGITransport, AsyncClient
+from fastapi.testclient import TestClient
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from app.app import app
+from app.core.users import current_active_user, current_websocket_user
+from app.core.chat_sessions import chat_session_store
+from app.core.chat_stream import stream_counters
+from app.core.fake_llm import FakeStreamingChatModel
+from app.core.llm_cache import llm_cache
+from app.core.llm_telemetry import llm_telemetry
+from app.core.response_cache import ask_response_cache
+from app.models.user import User
+
+
+API_BASE_URL = "http://localhost:8000/api/v1"
+SLOW_LLM_ID = 9001
+STREAM_LLM_ID = 9002
+LLM_DELAY_SEC = 0.3
+CONCURRENT_REQUESTS = 5
+
+
+class SlowFakeChatModel(BaseChatModel):
+    """Replies after a fixed delay, blocking in sync calls and yielding in async calls"""
+    delay_sec: float = LLM_DELAY_SEC
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        time.sleep(self.delay_sec)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="done"))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.delay_sec)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="done"))])
+
+
+class EchoDelayChatModel(BaseChatModel):
+    """Sleeps for the number of seconds in the prompt and echoes it, fails on 'fail'"""
+    active: int = 0
+    peak: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "echo-delay-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        raise NotImplementedError
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        text = messages[-1].content
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            if text == "fail":
+                raise RuntimeError("provider failed")
+            await asyncio.sleep(float(text))
+        finally:
+            self.active -= 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=f"echo {text}"))])
+
+
+@pytest.fixture
+def test_user():
+    user = User(id=uuid.uuid4(), email="tester@example.com", is_active=True)
+    app.dependency_overrides[current_active_user] = lambda: user
+    app.dependency_overrides[current_websocket_user] = lambda: user
+    yield user
+    app.dependency_overrides.pop(current_active_user, None)
+    app.dependency_overrides.pop(current_websocket_user, None)
+
+
+@pytest.fixture
+def slow_llm(test_user):
+    llm_cache._llm_instances[SLOW_LLM_ID] = SlowFakeChatModel()
+    yield SLOW_LLM_ID
+    llm_cache._llm_instances.pop(SLOW_LLM_ID, None)
+
+
+@pytest.fixture
+def streaming_llm(test_user):
+    def register(**params) -> int:
+        llm_cache._llm_instances[STREAM_LLM_ID] = FakeStreamingChatModel(**params)
+        return STREAM_LLM_ID
+    yield register
+    llm_cache._llm_instances.pop(STREAM_LLM_ID, None)
+
+
+async def disconnecting_stream(path: str, payload: dict, disconnect_after_chunks: int = 0,
+                               disconnect_after_sec: float = 0.2, query: str = "") -> List[bytes]:
+    """Drive the ASGI app directly, hanging up like a closed browser tab"""
+    disconnected = asyncio.Event()
+    request_sent = False
+    body_chunks: List[bytes] = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": json.dumps(payload).encode(), "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            body_chunks.append(message["body"])
+            if disconnect_after_chunks and len(body_chunks) >= disconnect_after_chunks:
+                disconnected.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},  # no disconnect listener in starlette
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": f"/api/v1{path}",
+        "raw_path": f"/api/v1{path}".encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(b"host", b"localhost"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 8000),
+    }
+    if not disconnect_after_chunks:
+        asyncio.get_running_loop().call_later(disconnect_after_sec, disconnected.set)
+    await asyncio.wait_for(app(scope, receive, send), timeout=5)
+    return body_chunks
+
+
+async def post_concurrently(path: str, payloads: List[dict]) -> float:
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url=API_BASE_URL) as ac:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(ac.post(path, json=payload) for payload in payloads))
+        elapsed = time.perf_counter() - start
+
+    for response in responses:
+        assert response.status_code == 200
+        assert response.json()["response"] == "done"
+    return elapsed
+
+
+@pytest.mark.asyncio
+async def test_ask_simple_requests_overlap(slow_llm):
+    payloads = [{"llm_id": slow_llm, "message": f"question {i}"} for i in range(CONCURRENT_REQUESTS)]
+    elapsed = await post_concurrently("/ask/simple", payloads)
+
+    # serialized calls would take CONCURRENT_REQUESTS * LLM_DELAY_SEC
+    assert elapsed < 2 * LLM_DELAY_SEC
+
+
+@pytest.mark.asyncio
+async def test_identical_cached_asks_share_one_upstream_call(slow_llm):
+    payload = {"llm_id": slow_llm, "message": "explain this error", "use_cache": True}
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url=API_BASE_URL) as ac:
+        responses = await asyncio.gather(*(ac.post("/ask/simple", json=payload) for _ in range(3)))
+        cached = await ac.post("/ask/simple", json={**payload, "message": " explain this  error"})
+
+    assert sorted(r.headers["X-Cache"] for r in responses) == ["MISS", "SHARED", "SHARED"]
+    assert cached.headers["X-Cache"] == "HIT"
+    assert cached.json()["response"] == "done"
+    ask_response_cache.purge(slow_llm)
+
+
+@pytest.mark.asyncio
+async def test_chat_simple_requests_overlap(slow_llm):
+    payloads = [
+        {"llm_id": slow_llm, "message": "hello", "session_id": f"overlap_{i:02d}"}
+        for i in range(CONCURRENT_REQUESTS)
+    ]
+    elapsed = await post_concurrently("/chat/simple", payloads)
+    assert elapsed < 2 * LLM_DELAY_SEC
+
+
+@pytest.mark.asyncio
+async def test_sessions_of_other_users_are_not_found(slow_llm, test_user):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url=API_BASE_URL) as ac:
+        session_id = (await ac.get("/chat/sessions/me")).json()["sessions"][0]["session_id"]
+        assert (await ac.get(f"/chat/history/{session_id}")).status_code == 200
+
+        other = User(id=uuid.uuid4(), email="other@example.com", is_active=True)
+        app.dependency_overrides[current_active_user] = lambda: other
+        payload = {"llm_id": slow_llm, "message": "hello", "session_id": session_id}
+        assert (await ac.get(f"/chat/history/{session_id}")).status_code == 404
+        assert (await ac.post("/chat/simple", json=payload)).status_code == 404
+        assert (await ac.post("/chat/stream", json=payload)).status_code == 404
+        assert (await ac.delete(f"/chat/sessions/{session_id}")).status_code == 404
+
+        app.dependency_overrides[current_active_user] = lambda: test_user
+        assert (await ac.get(f"/chat/history/{session_id}")).json()["message_count"] == 0
+
+
+@pytest.mark.asyncio
+async def test_disconnect_before_first_token_cancels_upstream(streaming_llm):
+    llm_id = streaming_llm(ttft_ms=30000, tokens_per_sec=0, response_tokens=10)
+    cancelled = stream_counters["cancelled"]
+    start = time.perf_counter()
+    body = await disconnecting_stream("/ask/stream", {"llm_id": llm_id, "message": "hi"})
+
+    assert body == []
+    assert time.perf_counter() - start < 2
+    assert stream_counters["cancelled"] == cancelled + 1
+
+
+@pytest.mark.asyncio
+async def test_disconnect_mid_answer_records_partial_reply(streaming_llm):
+    llm_id = streaming_llm(ttft_ms=0, tokens_per_sec=50, response_tokens=500)
+    session_id = "disconnect_01"
+    payload = {"llm_id": llm_id, "message": "tell me a story", "session_id": session_id}
+    body = await disconnecting_stream("/chat/stream", payload, disconnect_after_chunks=2)
+
+    messages = chat_session_store.peek(session_id).messages
+    assert [m.type for m in messages] == ["human", "ai"]
+    assert llm_telemetry.stats()["models"][llm_id]["cancelled"] >= 1
+    assert messages[0].content == "tell me a story"
+    assert messages[1].response_metadata["finish_reason"] == "cancelled"
+    partial = messages[1].content
+    assert partial.startswith(b"".join(body).decode())
+    assert 0 < len(partial.split()) < 500
+
+
+@pytest.mark.asyncio
+async def test_interrupted_chat_stream_resumes_from_last_event_id(streaming_llm):
+    llm_id = streaming_llm(ttft_ms=0, tokens_per_sec=50, response_tokens=30)
+    session_id = "resume_01"
+    payload = {"llm_id": llm_id, "message": "tell me a story", "session_id": session_id}
+    requests = llm_telemetry.model(llm_id).counters["requests"]
+    body = await disconnecting_stream("/chat/stream", payload, disconnect_after_chunks=2,
+                                      query="event_stream=true")
+
+    def sse_frames(text: str) -> List[List[str]]:
+        return [frame.split("\n") for frame in text.split("\n\n") if frame]
+
+    frames = sse_frames(b"".join(body).decode())
+    event_id = frames[-1][0].removeprefix("id: ")
+    received = "".join(frame[1].removeprefix("data: ") for frame in frames)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url=API_BASE_URL) as ac:
+        resumed = await ac.post("/chat/stream?event_stream=true", json=payload,
+                                headers={"Last-Event-ID": event_id})
+        expired = await ac.post("/chat/stream?event_stream=true", json=payload,
+                                headers={"Last-Event-ID": "0000-1"})
+
+    assert resumed.status_code == 200
+    assert expired.status_code == 410
+    received += "".join(frame[1].removeprefix("data: ") for frame in sse_frames(resumed.text))
+    messages = chat_session_store.peek(session_id).messages
+    assert len(messages) == 2
+    assert received == messages[1].content
+    assert len(received.split()) == 30
+    # one upstream call served both connections
+    assert llm_telemetry.model(llm_id).counters["requests"] == requests + 1
+
+
+def test_chat_socket_multiplexes_sessions_and_cancels_turns(streaming_llm):
+    llm_id = streaming_llm(ttft_ms=0, tokens_per_sec=200, response_tokens=20)
+    llm_cache._llm_instances[llm_id + 1] = FakeStreamingChatModel(ttft_ms=30000, response_tokens=5)
+
+    def request(turn_id: str, session_id: str, llm: int = llm_id) -> dict:
+        payload = {"llm_id": llm, "message": "hello", "session_id": session_id}
+        return {"type": "request", "id": turn_id, "request": payload}
+
+    try:
+        with TestClient(app).websocket_connect("/api/v1/chat/ws") as ws:
+            ws.send_json(request("a", "socket_01"))
+            ws.send_json(request("b", "socket_02"))
+            ws.send_json(request("c", "socket_01"))  # same session, still busy
+            ws.send_json(request("d", "socket_03", llm_id + 1))
+            ws.send_json({"type": "cancel", "id": "d"})
+            texts = {"a": "", "b": ""}
+            finished = {}
+            while len(finished) < 4:
+                frame = ws.receive_json()
+                if frame["type"] == "chunk":
+                    texts[frame["id"]] += frame["text"]
+                else:
+                    finished[frame["id"]] = frame.get("finish_reason", frame.get("status"))
+    finally:
+        llm_cache._llm_instances.pop(llm_id + 1, None)
+
+    assert finished == {"a": "stop", "b": "stop", "c": 409, "d": "cancelled"}
+    for turn_id, session_id in (("a", "socket_01"), ("b", "socket_02")):
+        messages = chat_session_store.peek(session_id).messages
+        assert len(messages) == 2
+        assert messages[1].content == texts[turn_id]
+        assert len(texts[turn_id].split()) == 20
+
+
+@pytest.mark.asyncio
+async def test_ask_multi_streams_tagged_events_and_cancels_slow_models(streaming_llm):
+    fast_id = streaming_llm(ttft_ms=0, tokens_per_sec=0, response_tokens=5)
+    slow_id = fast_id + 1
+    llm_cache._llm_instances[slow_id] = FakeStreamingChatModel(ttft_ms=30000, response_tokens=5)
+    payload = {"llm_ids": [slow_id, fast_id], "message": "compare", "first_n": 1}
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url=API_BASE_URL) as ac:
+            start = time.perf_counter()
+            response = await ac.post("/ask/multi", json=payload)
+            elapsed = time.perf_counter() - start
+    finally:
+        llm_cache._llm_instances.pop(slow_id, None)
+
+    assert response.status_code == 200
+    assert elapsed < 2
+    events = []
+    for frame in response.text.strip().split("\n\n"):
+        name, data = frame.split("\n", 1)
+        events.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+
+    assert {data["llm_id"] for name, data in events if name == "chunk"} == {fast_id}
+    done = [data for name, data in events if name == "done"]
+    assert [data["llm_id"] for data in done] == [fast_id]
+    assert done[0]["latency_ms"] >= done[0]["ttft_ms"] >= 0
+    assert [data["llm_id"] for name, data in events if name == "cancelled"] == [slow_id]
+    assert events[-1] == ("end", {"completed": [fast_id]})
+
+
+@pytest.mark.asyncio
+async def test_ask_batch_streams_ndjson_in_completion_order(test_user):
+    llm = EchoDelayChatModel()
+    llm_cache._llm_instances[STREAM_LLM_ID] = llm
+    payload = {"llm_id": STREAM_LLM_ID, "messages": ["0.3", "fail", "0.1", "0.2"]}
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url=API_BASE_URL) as ac:
+            response = await ac.post("/ask/batch", json=payload)
+            llm.peak = 0
+            limited = await ac.post("/ask/batch", json={
+                "llm_id": STREAM_LLM_ID, "messages": ["0.05"] * 6, "max_concurrency": 2})
+    finally:
+        llm_cache._llm_instances.pop(STREAM_LLM_ID, None)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert llm_telemetry.stats()["users"]["tester@example.com"]["requests"] >= 10
+    items = [json.loads(line) for line in response.text.splitlines()]
+    assert [item["index"] for item in items] == [1, 2, 3, 0]
+    assert items[0]["error"] == "provider failed"
+    assert items[1]["response"] == "echo 0.1"
+    assert all(item["latency_ms"] > 0 for item in items[1:])
+
+    assert sorted(json.loads(line)["index"] for line in limited.text.splitlines()) == list(range(6))
+    assert llm.peak == 2
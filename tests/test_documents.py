@@ -0,0 +1,311 @@
+import asyncio
+import io
+import sys
+import uuid
+import hashlib
+import tracemalloc
+import pytest
+import pytest_asyncio
+from PIL import Image
+from pathlib import Path
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from app.app import app
+from app.api import documents
+from app.core.config import config
+from app.core.blob_store import FileLock, blob_store, storage_stats
+from app.core.thumbnails import ThumbnailCache
+from app.core.document_index import reconcile
+from app.core.uploads import upload_receiver
+from app.core.users import current_active_user
+from app.db.async_db import DbBase, get_async_db, upgrade_documents_table
+from app.models.user import User
+
+
+API_BASE_URL = "http://localhost:8000/api/v1"
+
+
+@pytest_asyncio.fixture
+async def sessions(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'documents.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(DbBase.metadata.create_all)
+    sessions = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+
+    async def get_test_db():
+        async with sessions() as db:
+            yield db
+
+    upload_dir = tmp_path / "uploaded"
+    upload_dir.mkdir()
+    monkeypatch.setattr(documents, "UPLOAD_DIR", upload_dir)
+    monkeypatch.setattr(blob_store, "root", tmp_path / "blobs")
+    monkeypatch.setattr(blob_store, "lock", FileLock(tmp_path / "blobs" / ".lock"))
+    monkeypatch.setattr(upload_receiver, "tmp_dir", tmp_path / "upload_tmp")
+    user = User(id=uuid.uuid4(), email="tester@example.com", is_active=True)
+    app.dependency_overrides[current_active_user] = lambda: user
+    app.dependency_overrides[get_async_db] = get_test_db
+    yield sessions
+    app.dependency_overrides.pop(current_active_user, None)
+    app.dependency_overrides.pop(get_async_db, None)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_reconcile_moves_files_into_the_blob_store(sessions):
+    upload_dir = documents.UPLOAD_DIR
+    for name, text in (("a.txt", "same"), ("b.txt", "same"), ("c.txt", "other")):
+        (upload_dir / name).write_text(text)
+    async with sessions() as db:
+        counts = await reconcile(db, upload_dir, blob_store)
+        assert counts == {"added": 3, "updated": 0, "removed": 0, "orphans": 0}
+        assert list(upload_dir.iterdir()) == []
+        assert await storage_stats(db) == {"documents": 3, "blobs": 2, "logical_bytes": 13,
+                                           "stored_bytes": 9, "saved_bytes": 4, "saved_ratio": 0.308}
+
+    (upload_dir / "b.txt").write_text("replaced")
+    blob_store.remove(hashlib.sha256(b"other").hexdigest())
+    async with sessions() as db:
+        counts = await reconcile(db, upload_dir, blob_store)
+        assert counts == {"added": 0, "updated": 1, "removed": 1, "orphans": 0}
+        assert (await storage_stats(db))["blobs"] == 2
+        assert await reconcile(db, upload_dir, blob_store) == {"added": 0, "updated": 0, "removed": 0, "orphans": 0}
+
+
+@pytest.mark.asyncio
+async def test_reconcile_quarantines_unreferenced_blobs(sessions):
+    sha256 = hashlib.sha256(b"lost").hexdigest()
+    blob_store.path(sha256).parent.mkdir(parents=True)
+    blob_store.path(sha256).write_bytes(b"lost")
+    async with sessions() as db:
+        counts = await reconcile(db, documents.UPLOAD_DIR, blob_store)
+    assert counts == {"added": 0, "updated": 0, "removed": 0, "orphans": 1}
+    assert blob_store.scan() == {}
+    assert (blob_store.root / "orphaned" / sha256).read_bytes() == b"lost"
+
+
+@pytest.mark.asyncio
+async def test_file_lock_excludes_other_holders_of_the_lock_file(tmp_path):
+    # a second FileLock opens its own file description, as another worker process would
+    first, second = FileLock(tmp_path / ".lock"), FileLock(tmp_path / ".lock")
+    async with first:
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(second.__aenter__(), 0.1)
+    async with second:
+        pass
+
+
+@pytest.mark.asyncio
+async def test_documents_are_listed_from_the_index_with_stable_ids(sessions):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url=API_BASE_URL) as ac:
+        files = [("files", (f"doc{i}.txt", b"x" * (i + 1), "text/plain")) for i in range(5)]
+        uploaded = (await ac.post("/documents/upload", files=files)).json()
+        ids = [doc["id"] for doc in uploaded]
+
+        # cursor pagination walks every document once
+        pages, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            response = await ac.get("/documents", params=params)
+            pages.append([doc["id"] for doc in response.json()])
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+        assert pages == [ids[0:2], ids[2:4], ids[4:]]
+
+        await ac.patch(f"/documents/{ids[1]}", json={"is_starred": 1, "tags": "work, taxes"})
+        starred = (await ac.get("/documents", params={"starred": True, "tag": "taxes"})).json()
+        assert [doc["id"] for doc in starred] == [ids[1]]
+        by_size = (await ac.get("/documents", params={"sort": "filesize", "order": "desc"})).json()
+        assert [doc["id"] for doc in by_size] == ids[::-1]
+
+        renamed = (await ac.patch("/documents", json={"filename": "doc0.txt", "new_filename": "first.txt"})).json()
+        assert renamed["id"] == ids[0]
+        await ac.request("DELETE", "/documents", json={"filename": "doc4.txt"})
+        listed = (await ac.get("/documents")).json()
+        assert [(doc["id"], doc["filename"]) for doc in listed][::3] == [(ids[0], "first.txt"), (ids[3], "doc3.txt")]
+        assert len(listed) == 4
+        assert (await ac.get("/documents", params={"cursor": "garbage"})).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_upload_streams_hash_and_enforces_size_caps(sessions, monkeypatch):
+    monkeypatch.setattr(upload_receiver, "max_file_bytes", 1000)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url=API_BASE_URL) as ac:
+        content = b"streamed " * 100
+        uploaded = (await ac.post("/documents/upload", files=[("files", ("a.bin", content))])).json()
+        assert uploaded[0]["sha256"] == hashlib.sha256(content).hexdigest()
+        assert blob_store.path(uploaded[0]["sha256"]).read_bytes() == content
+
+        files = [("files", ("ok.bin", b"x")), ("files", ("big.bin", b"x" * 1001))]
+        assert (await ac.post("/documents/upload", files=files)).status_code == 413
+        assert len(blob_store.scan()) == 1
+        assert list(upload_receiver.tmp_dir.iterdir()) == []
+
+        monkeypatch.setattr(upload_receiver, "max_request_bytes", 100)
+        assert (await ac.post("/documents/upload", files=[("files", ("a.bin", content))])).status_code == 413
+        assert (await ac.post("/documents/upload", data={"note": "no files"})).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_identical_uploads_share_one_blob_until_the_last_delete(sessions):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url=API_BASE_URL) as ac:
+        files = [("files", ("scan.pdf", b"%PDF same")), ("files", ("scan.pdf", b"%PDF same"))]
+        uploaded = (await ac.post("/documents/upload", files=files)).json()
+        uploaded += (await ac.post("/documents/upload", files=[files[0]])).json()
+        assert [doc["filename"] for doc in uploaded] == ["scan.pdf", "scan (1).pdf", "scan (2).pdf"]
+        blob_path = blob_store.path(uploaded[0]["sha256"])
+        assert list(blob_store.scan()) == [blob_path.name]
+
+        await ac.patch("/documents", json={"filename": "scan.pdf", "new_filename": "taxes.pdf"})
+        response = await ac.get("/documents/download/taxes.pdf")
+        assert response.content == b"%PDF same"
+        assert "taxes.pdf" in response.headers["content-disposition"]
+
+        for name in ("taxes.pdf", "scan (1).pdf"):
+            assert (await ac.request("DELETE", "/documents", json={"filename": name})).status_code == 200
+        assert blob_path.exists()
+        async with sessions() as db:
+            assert (await storage_stats(db))["documents"] == 1
+        await ac.request("DELETE", "/documents", json={"filename": "scan (2).pdf"})
+        assert not blob_path.exists()
+        assert (await ac.get("/documents/view/scan (2).pdf")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_view_revalidates_with_strong_etag_and_last_modified(sessions):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url=API_BASE_URL) as ac:
+        await ac.post("/documents/upload", files=[("files", ("notes.txt", b"hello world"))])
+        response = await ac.get("/documents/view/notes.txt")
+        etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+        assert etag == f'"{hashlib.sha256(b"hello world").hexdigest()}"'
+        assert response.headers["cache-control"] == "private, no-cache"
+
+        for headers in ({"If-None-Match": f'"stale", {etag}'}, {"If-Modified-Since": last_modified}):
+            response = await ac.get("/documents/view/notes.txt", headers=headers)
+            assert response.status_code == 304 and response.content == b""
+            assert response.headers["etag"] == etag
+        # If-None-Match wins over a matching If-Modified-Since
+        headers = {"If-None-Match": '"stale"', "If-Modified-Since": last_modified}
+        assert (await ac.get("/documents/view/notes.txt", headers=headers)).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_download_serves_ranges_of_a_large_file_in_constant_memory(sessions):
+    size = 64 * 1024 * 1024
+    with open(documents.UPLOAD_DIR / "movie.mp4", "wb") as file:
+        file.seek(size - 6)
+        file.write(b"ending")  # sparse, nothing but the tail is written
+    async with sessions() as db:
+        await reconcile(db, documents.UPLOAD_DIR, blob_store)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url=API_BASE_URL) as ac:
+        tracemalloc.start()
+        response = await ac.get("/documents/download/movie.mp4", headers={"Range": f"bytes=0-3,{size - 6}-"})
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert response.status_code == 206
+        assert peak < 4 * 1024 * 1024
+        content_type = response.headers["content-type"]
+        assert content_type.startswith("multipart/byteranges")
+        boundary = content_type.split("boundary=")[1]
+        assert int(response.headers["content-length"]) == len(response.content)
+        parts = [part for part in response.content.split(f"--{boundary}".encode()) if b"Content-Range" in part]
+        assert [part.split(b"\r\n\r\n", 1)[1][:-2] for part in parts] == [b"\0" * 4, b"ending"]
+        assert f"bytes {size - 6}-{size - 1}/{size}".encode() in parts[1]
+
+        response = await ac.get("/documents/download/movie.mp4", headers={"Range": "bytes=1000-1009"})
+        assert response.status_code == 206
+        assert response.headers["content-range"] == f"bytes 1000-1009/{size}"
+        assert response.content == b"\0" * 10
+        etag = response.headers["etag"]
+
+        # the range applies only while If-Range still matches the stored content
+        headers = {"Range": "bytes=1000-1009", "If-Range": etag}
+        response = await ac.get("/documents/download/movie.mp4", headers=headers)
+        assert response.status_code == 206
+        assert response.headers["content-range"] == f"bytes 1000-1009/{size}"
+
+        headers = {"Range": "bytes=1000-1009", "If-Range": '"stale"'}
+        response = await ac.get("/documents/download/movie.mp4", headers=headers)
+        assert response.status_code == 200
+        assert int(response.headers["content-length"]) == size
+        assert "content-range" not in response.headers
+        assert response.content.endswith(b"ending")
+
+
+@pytest.mark.asyncio
+async def test_thumbnail_sizes_are_bounded_and_revalidated_without_rendering(sessions, tmp_path, monkeypatch):
+    cache = ThumbnailCache(tmp_path / "thumbnails", workers=0)
+    monkeypatch.setattr(documents, "thumbnail_cache", cache)
+    monkeypatch.setattr(config, "thumbnail_pregenerate_sizes", [])
+    image = io.BytesIO()
+    Image.new("RGB", (1600, 1200), "blue").save(image, format="JPEG")
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url=API_BASE_URL) as ac:
+        await ac.post("/documents/upload", files=[("files", ("photo.jpg", image.getvalue()))])
+        for width in (5000, 4000, 641):
+            response = await ac.get("/documents/thumbnail/photo.jpg", params={"width": width, "height": 1})
+            with Image.open(io.BytesIO(response.content)) as thumb:
+                assert thumb.size == (133, 100)  # snapped to 640x100
+        assert cache.stats()["renders"] == 1
+
+        headers = {"If-None-Match": response.headers["etag"]}
+        response = await ac.get("/documents/thumbnail/photo.jpg", params={"width": 100, "height": 100}, headers=headers)
+        assert response.status_code == 200  # another size, another ETag
+        hits = cache.stats()["memory_hits"]
+        headers = {"If-None-Match": response.headers["etag"]}
+        response = await ac.get("/documents/thumbnail/photo.jpg", params={"width": 90, "height": 100}, headers=headers)
+        assert response.status_code == 304
+        assert cache.stats()["memory_hits"] == hits and cache.stats()["renders"] == 2
+
+
+ORIGINAL_DOCUMENTS_TABLE = """
+CREATE TABLE documents (
+    id INTEGER PRIMARY KEY, filename VARCHAR NOT NULL, filepath VARCHAR NOT NULL, filesize INTEGER NOT NULL,
+    category INTEGER NOT NULL, is_starred INTEGER NOT NULL, tags VARCHAR NOT NULL, description VARCHAR NOT NULL,
+    created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL, deleted_at DATETIME,
+    created_by CHAR(32) NOT NULL, updated_by CHAR(32), deleted_by CHAR(32)
+)"""
+
+
+async def upgraded_columns(engine, ddl: str, insert: str = None) -> dict:
+    async with engine.begin() as conn:
+        await conn.execute(text(ddl))
+        if insert:
+            await conn.execute(text(insert))
+        await conn.run_sync(DbBase.metadata.create_all)
+        await conn.run_sync(upgrade_documents_table)
+        await conn.run_sync(upgrade_documents_table)  # a second start changes nothing
+        columns = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_columns("documents"))
+    return {column["name"]: column for column in columns}
+
+
+@pytest.mark.asyncio
+async def test_original_documents_table_is_upgraded_in_place(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'original.db'}")
+    columns = await upgraded_columns(engine, ORIGINAL_DOCUMENTS_TABLE)
+    assert columns["created_by"]["nullable"]
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_documents_table_without_sha256_keeps_its_rows(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'indexed.db'}")
+    ddl = ORIGINAL_DOCUMENTS_TABLE.replace("created_by CHAR(32) NOT NULL", "created_by CHAR(32)")
+    insert = ("INSERT INTO documents VALUES (1, 'a.txt', 'a.txt', 1, 0, 0, '', '', "
+              "'2026-01-01', '2026-01-01', NULL, NULL, NULL, NULL)")
+    columns = await upgraded_columns(engine, ddl, insert)
+    assert "sha256" in columns
+    async with engine.connect() as conn:
+        assert (await conn.execute(text("SELECT filename, sha256 FROM documents"))).all() == [("a.txt", None)]
+    await engine.dispose()
@@ -0,0 +1,55 @@
+import sys
+import time
+import pytest
+from pathlib import Path
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from app.core.fake_llm import FakeLlmError, FakeStreamingChatModel
+from app.core.llm_cache import LlmProviderType, llm_cache
+from app.models.llm_config import LlmConfig
+
+
+def test_llm_cache_builds_fake_provider():
+    config = LlmConfig(
+        id=1,
+        provider=LlmProviderType.LOCAL_FAKE,
+        title="Fake",
+        model_name="fake-1",
+        temperature=0,
+        api_endpoint="fake://local?model_name=ignored&ttft_ms=5&tokens_per_sec=0&response_tokens=7&seed=42",
+        api_key="",
+    )
+    llm = llm_cache._create_llm_instance(config)
+    assert isinstance(llm, FakeStreamingChatModel)
+    assert llm.model_name == "fake-1"
+    assert (llm.ttft_ms, llm.tokens_per_sec, llm.response_tokens, llm.seed) == (5, 0, 7, 42)
+
+
+def test_reply_is_deterministic_per_prompt():
+    llm = FakeStreamingChatModel(ttft_ms=0, tokens_per_sec=0, response_tokens=12, seed=7)
+    first = llm.invoke("explain this error")
+    assert first.content == llm.invoke("explain this error").content
+    assert first.content != llm.invoke("something else").content
+    assert first.usage_metadata["output_tokens"] == 12
+
+
+@pytest.mark.asyncio
+async def test_stream_honours_ttft_and_throughput():
+    llm = FakeStreamingChatModel(ttft_ms=100, tokens_per_sec=200, response_tokens=20)
+    start = time.perf_counter()
+    arrivals = []
+    async for chunk in llm.astream("hello"):
+        if chunk.content:
+            arrivals.append(time.perf_counter() - start)
+
+    assert len(arrivals) == 20
+    assert arrivals[0] >= 0.1
+    # 19 inter-token gaps at 200 tokens/sec
+    assert arrivals[-1] - arrivals[0] >= 19 / 200 * 0.9
+
+
+def test_error_rate_fails_calls():
+    llm = FakeStreamingChatModel(ttft_ms=0, tokens_per_sec=0, response_tokens=5, error_rate=1.0)
+    with pytest.raises(FakeLlmError):
+        llm.invoke("hello")
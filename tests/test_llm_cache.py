@@ -0,0 +1,191 @@
+import sys
+import json
+import uuid
+import asyncio
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from app.core.llm_cache import LlmCache, LlmProviderType
+from app.core.llm_http import llm_http_pool
+from app.db.async_db import DbBase
+from app.models.llm_config import LlmConfig
+
+
+def fake_config(llm_id: int, temperature: float = 0.0) -> LlmConfig:
+    return LlmConfig(id=llm_id, provider=LlmProviderType.LOCAL_FAKE, category=0, is_active=True,
+                     title=f"fake {llm_id}", model_name="local-fake", temperature=temperature,
+                     api_endpoint="fake://local?ttft_ms=0", api_key="")
+
+
+class FakeDb:
+    """Stands in for an AsyncSession, returns the configured rows after a delay"""
+
+    def __init__(self, configs: list, delay_sec: float = 0):
+        self.configs = configs
+        self.delay_sec = delay_sec
+        self.loads = 0
+
+    def rows(self) -> list:
+        self.loads += 1
+        return list(self.configs)
+
+    async def execute(self, query):
+        await asyncio.sleep(self.delay_sec)
+        return SimpleNamespace(
+            one=lambda: (None, len(self.configs)),  # watermark
+            scalars=lambda: SimpleNamespace(all=self.rows),
+        )
+
+
+def new_cache() -> LlmCache:
+    # LlmCache is a singleton, keep the global snapshot of other tests intact
+    cache = object.__new__(LlmCache)
+    LlmCache._initialized = False
+    cache.__init__()
+    return cache
+
+
+@pytest.fixture
+def cache():
+    return new_cache()
+
+
+@pytest.mark.asyncio
+async def test_reload_keeps_unchanged_instances_and_notifies_changed_ids(cache):
+    reloaded = []
+    cache.add_reload_listener(reloaded.append)
+    await cache.load(FakeDb([fake_config(1), fake_config(2), fake_config(3)]))
+    first = {llm_id: cache.get_llm_instance(llm_id) for llm_id in (1, 2, 3)}
+    reloaded.clear()
+
+    await cache.load(FakeDb([fake_config(1), fake_config(2, temperature=0.7), fake_config(4)]))
+    assert cache.get_llm_instance(1) is first[1]
+    assert cache.get_llm_instance(2) is not first[2]
+    assert cache.get_llm_instance(3) is None
+    assert sorted(reloaded) == [2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_readers_see_the_old_snapshot_during_a_reload(cache):
+    await cache.load(FakeDb([fake_config(1)]))
+    instance = cache.get_llm_instance(1)
+    reload = asyncio.create_task(cache.load(FakeDb([fake_config(1), fake_config(2)], delay_sec=0.05)))
+    await asyncio.sleep(0.01)
+
+    assert cache.get_llm_instance(1) is instance
+    assert cache.get_llm_config(2) is None
+    assert await reload == 2
+    assert cache.get_llm_instance(1) is instance
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reloads_are_coalesced(cache):
+    db = FakeDb([fake_config(1)], delay_sec=0.05)
+    # the first reload runs, the others queue behind it and share one more
+    counts = await asyncio.gather(*(cache.load(db) for _ in range(5)))
+
+    assert counts == [1] * 5
+    assert db.loads == 2
+
+
+@pytest.mark.asyncio
+async def test_rebuilt_instances_reuse_pooled_connections(cache):
+    connections = 0
+    completion = json.dumps({
+        "id": "fake", "object": "chat.completion", "created": 0, "model": "fake",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "pong"}, "finish_reason": "stop"}],
+    }).encode()
+
+    async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        nonlocal connections
+        connections += 1
+        try:
+            while True:  # keep-alive until the client closes
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = next(int(line.split(b":")[1]) for line in head.lower().split(b"\r\n")
+                              if line.startswith(b"content-length"))
+                await reader.readexactly(length)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n\r\n%s" % (len(completion), completion))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    server = await asyncio.start_server(serve, "127.0.0.1", 0)
+    endpoint = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/v1"
+    openai_config = lambda temperature: LlmConfig(
+        id=1, provider=LlmProviderType.OPENAI, category=0, is_active=True, title="openai",
+        model_name="fake", temperature=temperature, api_endpoint=endpoint, api_key="key")
+    try:
+        await cache.load(FakeDb([openai_config(0.0)]))
+        first = cache.get_llm_instance(1)
+        assert (await first.ainvoke("ping")).content == "pong"
+        await cache.load(FakeDb([openai_config(0.5)]))
+        assert cache.get_llm_instance(1) is not first
+        assert (await cache.get_llm_instance(1).ainvoke("ping")).content == "pong"
+        assert connections == 1
+        assert llm_http_pool.stats()["connections"] == 1
+    finally:
+        await llm_http_pool.aclose()
+        server.close()
+
+
+@pytest.mark.asyncio
+async def test_workers_pick_up_config_changes_of_other_workers(tmp_path):
+    # two workers, each with its own engine, cache and watch loop, share one SQLite file
+    url = f"sqlite+aiosqlite:///{tmp_path / 'workers.db'}"
+    engines = [create_async_engine(url) for _ in range(2)]
+    async with engines[0].begin() as conn:
+        await conn.run_sync(DbBase.metadata.create_all)
+    caches = [new_cache(), new_cache()]
+    for cache, engine in zip(caches, engines):
+        cache.session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    watchers = [asyncio.create_task(cache.watch(0.02)) for cache in caches]
+
+    async def write(worker: int, change):
+        # what the llm_configs endpoints do on the worker serving the request
+        async with caches[worker].session_factory() as db:
+            await change(db)
+            await db.commit()
+            await caches[worker].load(db)
+
+    async def seen_by(worker: int, condition) -> bool:
+        for _ in range(100):
+            if condition(caches[worker]):
+                return True
+            await asyncio.sleep(0.01)
+        return False
+
+    async def add(db):
+        llm = fake_config(1)
+        llm.id, llm.created_by = None, uuid.uuid4()
+        db.add(llm)
+
+    async def update(db):
+        llm = (await db.execute(select(LlmConfig))).scalars().one()
+        llm.temperature = 0.7
+
+    async def delete(db):
+        await db.delete((await db.execute(select(LlmConfig))).scalars().one())
+
+    try:
+        await write(0, add)
+        assert await seen_by(1, lambda cache: len(cache.get_llm_configs()) == 1)
+        llm_id = next(iter(caches[1].get_llm_configs()))
+
+        await write(1, update)
+        assert await seen_by(0, lambda cache: cache.get_llm_config(llm_id).temperature == 0.7)
+
+        await write(0, delete)
+        assert await seen_by(1, lambda cache: cache.get_llm_instance(llm_id) is None)
+    finally:
+        for watcher in watchers:
+            watcher.cancel()
+        await asyncio.gather(*watchers, return_exceptions=True)
+        for engine in engines:
+            await engine.dispose()
@@ -0,0 +1,161 @@
+import sys
+import time
+import asyncio
+import pytest
+from pathlib import Path
+from typing import Any, AsyncIterator, List, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from app.core.fake_llm import FakeStreamingChatModel
+from app.core.llm_cache import llm_cache
+from app.core.llm_failover import CircuitBreaker, FailoverChatModel, LlmHealthRegistry
+from app.core.llm_scheduler import LlmScheduler
+
+
+PRIMARY_ID = 9101
+BACKUP_ID = 9102
+PROMPT = [HumanMessage(content="hello")]
+
+
+class BrokenChatModel(BaseChatModel):
+    """Fails every call before producing a token"""
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "broken-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        self.calls += 1
+        raise ConnectionError("connection refused")
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        self.calls += 1
+        raise ConnectionError("connection refused")
+        yield
+
+
+@pytest.fixture
+def group():
+    def register(primary: BaseChatModel, backup: BaseChatModel) -> FailoverChatModel:
+        llm_cache._llm_instances[PRIMARY_ID] = primary
+        llm_cache._llm_instances[BACKUP_ID] = backup
+        return FailoverChatModel(llm_ids=[PRIMARY_ID, BACKUP_ID], hedge_default_ms=50,
+                                 hedge_min_ms=10, health=LlmHealthRegistry())
+    yield register
+    llm_cache._llm_instances.pop(PRIMARY_ID, None)
+    llm_cache._llm_instances.pop(BACKUP_ID, None)
+
+
+def test_breaker_opens_on_error_rate_and_probes_after_cooldown():
+    breaker = CircuitBreaker(window=10, min_calls=4, error_rate=0.5, open_sec=0)
+    for success in (True, False, True):
+        breaker.record(success)
+    assert breaker.allow()
+    breaker.record(False)  # 2 of 4 failed
+    assert breaker.trips == 1
+
+    # open_sec=0 goes straight to half open, only one probe is let through
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    breaker.begin_call()
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged(group):
+    backup = FakeStreamingChatModel(ttft_ms=0, tokens_per_sec=0, response_tokens=3, seed=1)
+    model = group(FakeStreamingChatModel(ttft_ms=0, tokens_per_sec=0, response_tokens=3), backup)
+    reply = await model.ainvoke(PROMPT)
+
+    primary_reply = await llm_cache.get_llm_instance(PRIMARY_ID).ainvoke(PROMPT)
+    assert reply.content == primary_reply.content
+    stats = model.health.stats()
+    assert stats[PRIMARY_ID]["ttft_samples"] == 1
+    assert stats[BACKUP_ID]["ttft_samples"] == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_first_token_is_hedged_to_backup(group):
+    backup = FakeStreamingChatModel(ttft_ms=0, tokens_per_sec=0, response_tokens=3, seed=1)
+    model = group(FakeStreamingChatModel(ttft_ms=30000, response_tokens=3), backup)
+    start = time.perf_counter()
+    chunks = [chunk.content async for chunk in model.astream(PROMPT)]
+
+    assert time.perf_counter() - start < 1
+    assert "".join(chunks) == (await backup.ainvoke(PROMPT)).content
+    # the cancelled primary is not counted as a failure
+    assert model.health.get(PRIMARY_ID).breaker.error_ratio() == 0
+    assert model.health.get(BACKUP_ID).breaker.error_ratio() == 0
+
+
+@pytest.mark.asyncio
+async def test_losing_primary_keeps_its_ttft_samples_current(group):
+    backup = FakeStreamingChatModel(ttft_ms=50, tokens_per_sec=0, response_tokens=3, seed=1)
+    model = group(FakeStreamingChatModel(ttft_ms=30000, response_tokens=3), backup)
+    primary = model.health.get(PRIMARY_ID)
+    for _ in range(20):
+        primary.record_ttft(1)  # from when the primary was fast
+    await model.ainvoke(PROMPT)
+
+    # the cancelled primary waited at least as long as the backup took
+    assert primary.stats()["ttft_samples"] == 21
+    assert primary.ttft_percentile(1.0) >= 50
+    assert model.health.get(BACKUP_ID).stats()["ttft_samples"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_primary_fails_over_and_trips_breaker(group):
+    primary = BrokenChatModel()
+    backup = FakeStreamingChatModel(ttft_ms=0, tokens_per_sec=0, response_tokens=3)
+    model = group(primary, backup)
+    for breaker in (model.health.get(PRIMARY_ID).breaker, model.health.get(BACKUP_ID).breaker):
+        breaker.min_calls = 2
+
+    for _ in range(3):
+        reply = await model.ainvoke(PROMPT)
+        assert reply.content
+    # the breaker opened after two failures, the third call skips the primary
+    assert primary.calls == 2
+    assert model.health.stats()[PRIMARY_ID]["state"] == "open"
+
+
+@pytest.mark.asyncio
+async def test_hedge_takes_and_returns_a_backup_scheduler_slot(group):
+    backup = FakeStreamingChatModel(ttft_ms=0, tokens_per_sec=0, response_tokens=3, seed=1)
+    model = group(FakeStreamingChatModel(ttft_ms=30000, response_tokens=3), backup)
+    model.scheduler = LlmScheduler(max_in_flight=1, max_queue=4)
+    backup_queue = model.scheduler.get_queue(BACKUP_ID)
+    in_flight = []
+
+    async for _ in model.astream(PROMPT):
+        in_flight.append(backup_queue.in_flight)
+    assert in_flight and set(in_flight) == {1}
+    assert backup_queue.in_flight == 0
+    assert backup_queue.stats()["admitted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_member_removed_before_the_hedge_is_skipped(group):
+    primary = FakeStreamingChatModel(ttft_ms=200, tokens_per_sec=0, response_tokens=3)
+    model = group(primary, FakeStreamingChatModel(ttft_ms=0, tokens_per_sec=0, response_tokens=3, seed=1))
+    model.hedge_default_ms = 50
+    reply = asyncio.create_task(model.ainvoke(PROMPT))
+    await asyncio.sleep(0.01)
+    llm_cache._llm_instances.pop(BACKUP_ID)  # a config reload dropped the backup
+
+    assert (await reply).content == (await primary.ainvoke(PROMPT)).content
+
+
+def test_sync_invoke_fails_over_in_turn(group):
+    backup = FakeStreamingChatModel(ttft_ms=0, tokens_per_sec=0, response_tokens=3)
+    model = group(BrokenChatModel(), backup)
+    assert model.invoke(PROMPT).content == backup.invoke(PROMPT).content
+    assert model.health.get(PRIMARY_ID).breaker.error_ratio() == 1
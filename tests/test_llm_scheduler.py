@@ -0,0 +1,82 @@
+import sys
+import asyncio
+import pytest
+from pathlib import Path
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from app.core.llm_scheduler import (
+    LlmQueueFullError,
+    LlmQueueTimeoutError,
+    LlmScheduler,
+)
+
+
+@pytest.mark.asyncio
+async def test_waiting_users_are_served_round_robin():
+    scheduler = LlmScheduler(max_in_flight=1, max_queue=10)
+    blocker = await scheduler.acquire(1, "batch-user")
+    served = []
+
+    async def request(user_key: str, name: str):
+        slot = await scheduler.acquire(1, user_key)
+        served.append(name)
+        slot.release()
+
+    # the batch user queues three requests before the interactive user arrives
+    tasks = [asyncio.create_task(request("batch-user", f"batch-{i}")) for i in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(request("chat-user", "chat-0")))
+    await asyncio.sleep(0)
+    assert scheduler.stats()[1]["queued"] == 4
+
+    blocker.release()
+    await asyncio.gather(*tasks)
+    assert served == ["batch-0", "chat-0", "batch-1", "batch-2"]
+    assert scheduler.stats()[1]["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected_with_retry_after():
+    scheduler = LlmScheduler(max_in_flight=1, max_queue=1)
+    slot = await scheduler.acquire(1, "a")
+    waiting = asyncio.create_task(scheduler.acquire(1, "b"))
+    await asyncio.sleep(0)
+
+    with pytest.raises(LlmQueueFullError) as exc_info:
+        await scheduler.acquire(1, "c")
+    assert exc_info.value.retry_after >= 1
+    assert scheduler.stats()[1]["rejected"] == 1
+
+    slot.release()
+    (await waiting).release()
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_frees_the_queue_position():
+    scheduler = LlmScheduler(max_in_flight=1, max_queue=5)
+    slot = await scheduler.acquire(1, "a")
+
+    with pytest.raises(LlmQueueTimeoutError):
+        await scheduler.acquire(1, "b", timeout=0.05)
+    stats = scheduler.stats()[1]
+    assert stats["queued"] == 0
+    assert stats["timeouts"] == 1
+
+    slot.release()
+    async with await scheduler.acquire(1, "b"):
+        assert scheduler.stats()[1]["in_flight"] == 1
+    assert scheduler.stats()[1]["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_limits_are_per_model_with_overrides():
+    scheduler = LlmScheduler(max_in_flight=2, max_in_flight_overrides={7: 1})
+    # hold the slots, an unreferenced slot is released when collected
+    slots = [await scheduler.acquire(1, "a") for _ in range(2)]
+    slots.append(await scheduler.acquire(7, "a"))
+
+    with pytest.raises(LlmQueueTimeoutError):
+        await scheduler.acquire(7, "a", timeout=0.01)
+    assert scheduler.stats()[1]["in_flight"] == 2
+    assert scheduler.stats()[7]["max_in_flight"] == 1
@@ -0,0 +1,49 @@
+import sys
+import time
+from pathlib import Path
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from app.core.llm_telemetry import Histogram, LlmTelemetry
+
+
+def test_histogram_has_fixed_buckets():
+    histogram = Histogram((10, 100, 1000))
+    for value in [5] * 50 + [50] * 45 + [500] * 4 + [5000]:
+        histogram.observe(value)
+    assert len(histogram.counts) == 4
+    assert histogram.percentile(0.50) == 10
+    assert histogram.percentile(0.95) == 100
+    assert histogram.percentile(0.99) == 1000
+    assert histogram.percentile(1.0) == 5000  # overflow bucket reports the max
+
+
+def test_traces_aggregate_per_model_and_user():
+    telemetry = LlmTelemetry()
+    trace = telemetry.start(1, "alice@example.com")
+    time.sleep(0.01)
+    for _ in range(5):
+        trace.on_chunk()
+    trace.on_usage({"input_tokens": 12, "output_tokens": 5, "total_tokens": 17})
+    trace.finish()
+    trace.finish()  # finishing twice is a no-op
+
+    failed = telemetry.start(1, "bob@example.com")
+    failed.finish("failed")
+    cancelled = telemetry.start(2, "alice@example.com")
+    cancelled.on_chunk()
+    cancelled.finish("cancelled")
+
+    stats = telemetry.stats()
+    model = stats["models"][1]
+    assert (model["requests"], model["completed"], model["failed"]) == (2, 1, 1)
+    assert model["error_rate"] == 0.5
+    assert model["ttft_ms"]["count"] == 1
+    assert model["ttft_ms"]["p50"] >= 10
+    assert model["tokens_per_sec"]["count"] == 1
+    assert model["usage"]["total_tokens"] == 17
+    assert stats["models"][2]["cancelled"] == 1
+    assert stats["models"][2]["latency_ms"]["count"] == 0
+    assert stats["users"]["alice@example.com"] == {
+        "requests": 2, "input_tokens": 12, "output_tokens": 5, "total_tokens": 17,
+    }
@@ -0,0 +1,71 @@
+import sys
+import asyncio
+import pytest
+from pathlib import Path
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from app.core.response_cache import ResponseCache, make_cache_key
+
+
+def test_key_normalizes_whitespace_only():
+    key = make_cache_key(1, "v1", "be brief", "explain  this\n error ", 0.0)
+    assert key == make_cache_key(1, "v1", "be brief", "explain this error", 0.0)
+    assert key != make_cache_key(1, "v2", "be brief", "explain this error", 0.0)
+    assert key != make_cache_key(1, "v1", "be brief", "Explain this error", 0.0)
+    assert key != make_cache_key(1, "v1", "be brief", "explain this error", 0.7)
+
+
+def test_lru_and_ttl_limits():
+    cache = ResponseCache(max_entries=2, ttl_sec=60)
+    cache.put("a", 1, "A")
+    cache.put("b", 1, "B")
+    cache.get("a")  # b becomes least recently used
+    cache.put("c", 1, "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.stats()["evictions"] == 1
+
+    expired = ResponseCache(ttl_sec=0)
+    expired.put("a", 1, "A")
+    assert expired.get("a") is None
+    assert expired.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_call():
+    cache = ResponseCache()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "reply"
+
+    results = await asyncio.gather(*(cache.get_or_compute("k", 1, compute) for _ in range(5)))
+    assert calls == 1
+    assert sorted(status for _, status in results) == ["miss"] + ["shared"] * 4
+    assert await cache.get_or_compute("k", 1, compute) == ("reply", "hit")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["shared"]) == (1, 1, 4)
+
+
+@pytest.mark.asyncio
+async def test_failures_are_not_cached_and_purge_by_llm():
+    cache = ResponseCache()
+
+    async def failing():
+        raise RuntimeError("provider down")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_compute("k", 1, failing)
+    assert cache.get("k") is None
+    assert cache.stats()["inflight"] == 0
+
+    cache.put("a", 1, "A")
+    cache.put("b", 2, "B")
+    assert cache.purge(1) == 1
+    assert cache.get("b") == "B"
+    assert cache.purge() == 1
@@ -0,0 +1,57 @@
+import sys
+import asyncio
+import pytest
+from pathlib import Path
+from typing import AsyncIterator
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from app.core.stream_resume import ReplayGapError, StreamResumeRegistry, format_event_id
+
+
+async def numbers(count: int, delay_sec: float = 0) -> AsyncIterator[str]:
+    for i in range(count):
+        await asyncio.sleep(delay_sec)
+        yield f"{i} "
+
+
+@pytest.mark.asyncio
+async def test_resume_replays_missed_chunks_then_follows_live():
+    registry = StreamResumeRegistry(grace_sec=5)
+    generation = registry.start("s1", numbers(10, delay_sec=0.01))
+
+    first = []
+    async for seq, text in generation.subscribe(0):
+        first.append(text)
+        if seq == 3:
+            break
+    resumed, after_seq = registry.resume("s1", format_event_id(generation.id, 3))
+    rest = [text async for _, text in resumed.subscribe(after_seq)]
+
+    assert resumed is generation
+    assert "".join(first + rest) == "".join(f"{i} " for i in range(10))
+    assert registry.stats()["resumed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_resume_behind_the_ring_buffer_is_a_gap():
+    registry = StreamResumeRegistry(max_events=4)
+    generation = registry.start("s1", numbers(10))
+    await asyncio.sleep(0.01)
+    assert [seq async for seq, _ in generation.subscribe(6)] == [7, 8, 9, 10]
+
+    with pytest.raises(ReplayGapError):
+        registry.resume("s1", format_event_id(generation.id, 2))
+    with pytest.raises(KeyError):
+        registry.resume("s2", format_event_id(generation.id, 6))
+
+
+@pytest.mark.asyncio
+async def test_unclaimed_generation_is_cancelled_after_grace_period():
+    registry = StreamResumeRegistry(grace_sec=0.05)
+    generation = registry.start("s1", numbers(1000, delay_sec=0.01))
+    await asyncio.sleep(0.2)
+
+    assert generation.done and generation.cancelled
+    assert 0 < generation.last_seq < 1000
+    assert registry.stats()["running"] == 0
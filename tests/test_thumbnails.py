@@ -0,0 +1,66 @@
+import io
+import os
+import sys
+import asyncio
+import pytest
+from PIL import Image
+from pathlib import Path
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from app.core.thumbnails import ThumbnailCache
+
+
+def make_image(path: Path, color: str = "red", size: tuple = (1200, 800)) -> Path:
+    Image.new("RGB", size, color).save(path, format="JPEG")
+    return path
+
+
+@pytest.mark.asyncio
+async def test_thumbnail_is_rendered_once_then_served_from_memory_and_disk(tmp_path):
+    image = make_image(tmp_path / "photo.jpg")
+    cache = ThumbnailCache(tmp_path / "thumbs", workers=0)
+    results = await asyncio.gather(*(cache.get(image, 100, 100) for _ in range(3)))
+    content, etag = results[0]
+
+    assert all(result == (content, etag) for result in results)
+    assert cache.stats()["renders"] == 1
+    assert await cache.get(image, 100, 100) == (content, etag)
+    assert cache.stats()["memory_hits"] == 1
+    with Image.open(io.BytesIO(content)) as thumb:
+        assert thumb.format == "WEBP" and thumb.size == (100, 67)
+
+    # a restarted worker finds it on disk
+    restarted = ThumbnailCache(tmp_path / "thumbs", workers=0)
+    assert await restarted.get(image, 100, 100) == (content, etag)
+    assert restarted.stats()["disk_hits"] == 1 and restarted.stats()["renders"] == 0
+
+
+@pytest.mark.asyncio
+async def test_replaced_file_gets_a_new_thumbnail(tmp_path):
+    image = make_image(tmp_path / "photo.jpg")
+    cache = ThumbnailCache(tmp_path / "thumbs", workers=0)
+    _, etag = await cache.get(image, 100, 100)
+
+    make_image(image, color="blue", size=(640, 480))
+    os.utime(image, ns=(1, 1))
+    _, new_etag = await cache.get(image, 100, 100)
+    assert new_etag != etag
+    assert cache.stats()["renders"] == 2
+
+    cache.purge("photo.jpg")
+    assert cache.stats()["memory_entries"] == 0
+    assert not any((tmp_path / "thumbs").iterdir())
+
+
+@pytest.mark.asyncio
+async def test_thumbnails_render_in_a_process_pool(tmp_path):
+    image = make_image(tmp_path / "photo.jpg")
+    cache = ThumbnailCache(tmp_path / "thumbs", workers=1)
+    try:
+        cache.pregenerate(image, [100, 320])
+        await asyncio.wait_for(asyncio.gather(*cache._background), timeout=30)
+        assert cache.stats()["renders"] == 2
+        assert len(list((tmp_path / "thumbs").rglob("*.webp"))) == 2
+    finally:
+        cache.shutdown()
@@ -0,0 +1,56 @@
+import sys
+import hashlib
+import pytest
+from pathlib import Path
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from app.core.uploads import MultipartUploadReceiver, UploadTooLargeError
+
+
+BOUNDARY = "test-boundary"
+
+
+def multipart_body(files):
+    body = b""
+    for name, content in files:
+        body += (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"files\"; "
+                 f"filename=\"{name}\"\r\nContent-Type: application/octet-stream\r\n\r\n").encode()
+        body += content + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+async def chunked(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+@pytest.mark.asyncio
+async def test_parts_split_across_chunks_are_hashed_and_placed(tmp_path):
+    receiver = MultipartUploadReceiver(tmp_path / "tmp")
+    files = [("one.txt", b"first file " * 50), ("../two.txt", b"second\r\n--file" * 30)]
+    uploads = await receiver.receive(f"multipart/form-data; boundary={BOUNDARY}",
+                                     chunked(multipart_body(files), 7), lambda name: tmp_path / name)
+    assert [(u.filename, u.size, u.sha256) for u in uploads] == [
+        (Path(name).name, len(content), hashlib.sha256(content).hexdigest()) for name, content in files
+    ]
+    assert (tmp_path / "two.txt").read_bytes() == files[1][1]
+    assert list((tmp_path / "tmp").iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_request_cap_stops_reading_and_discards_the_partial_file(tmp_path):
+    receiver = MultipartUploadReceiver(tmp_path / "tmp", max_request_bytes=300)
+    body = multipart_body([("big.bin", b"x" * 1000)])
+    read = []
+
+    async def tracked():
+        async for chunk in chunked(body, 100):
+            read.append(chunk)
+            yield chunk
+
+    with pytest.raises(UploadTooLargeError):
+        await receiver.receive(f"multipart/form-data; boundary={BOUNDARY}", tracked(), lambda name: tmp_path / name)
+    assert len(read) == 4  # the body was not read to the end
+    assert not (tmp_path / "big.bin").exists()
+    assert list((tmp_path / "tmp").iterdir()) == []